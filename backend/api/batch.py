@@ -0,0 +1,67 @@
+from urllib.parse import urlsplit
+
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+
+BATCH_PREFIX = '/api/'
+BATCH_URL_NAME = 'batch'
+# Заголовки, относящиеся к самому пакетному запросу, а не к вложенным.
+SKIPPED_META = ('HTTP_IF_', 'CONTENT_')
+
+
+def build_request(request, path):
+    """GET-запрос к path от имени пользователя пакетного запроса.
+
+    Пользователь и токен передаются через _force_auth_*: DRF берёт их
+    вместо повторной аутентификации по заголовку. Анонимный запрос
+    аутентифицируется как обычно, без обращений к базе.
+    """
+    url = urlsplit(path)
+    sub_request = HttpRequest()
+    sub_request.method = 'GET'
+    sub_request.path = sub_request.path_info = url.path
+    sub_request.META = {
+        key: value for key, value in request.META.items()
+        if not key.startswith(SKIPPED_META)
+    }
+    sub_request.META.update(
+        REQUEST_METHOD='GET', PATH_INFO=url.path, QUERY_STRING=url.query
+    )
+    sub_request.GET = QueryDict(url.query)
+    sub_request.COOKIES = request.COOKIES
+    sub_request.user = request.user
+    if request.user.is_authenticated:
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def execute(request, path):
+    """(статус, тело) ответа на вложенный GET-запрос."""
+    url = urlsplit(path)
+    if not url.path.startswith(BATCH_PREFIX) or url.netloc:
+        return status.HTTP_400_BAD_REQUEST, {
+            'detail': f'Путь должен начинаться с {BATCH_PREFIX}.'
+        }
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return status.HTTP_404_NOT_FOUND, {'detail': 'Страница не найдена.'}
+    if match.url_name == BATCH_URL_NAME:
+        return status.HTTP_400_BAD_REQUEST, {
+            'detail': 'Вложенные пакетные запросы не поддерживаются.'
+        }
+    sub_request = build_request(request, path)
+    sub_request.resolver_match = match
+    try:
+        response = match.func(sub_request, *match.args, **match.kwargs)
+    except Http404:
+        return status.HTTP_404_NOT_FOUND, {'detail': 'Страница не найдена.'}
+    if response.streaming:
+        return status.HTTP_400_BAD_REQUEST, {
+            'detail': 'Потоковые ответы не поддерживаются.'
+        }
+    if hasattr(response, 'data'):
+        return response.status_code, response.data
+    return response.status_code, response.content.decode(response.charset)
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_idempotency_cache(app_configs, **kwargs):
+    """Ключи идемпотентности должны быть видны всем процессам."""
+    backend = settings.CACHES['idempotency']['BACKEND']
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f'Кэш idempotency ({backend}) свой у каждого процесса: повтор '
+        'запроса в другом процессе выполнит запись ещё раз.',
+        hint='Задайте общий CACHE_BACKEND или оставьте DatabaseCache.',
+        id='api.E001',
+    )]
@@ -0,0 +1,21 @@
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+from foodgram.settings import RECIPE_IMAGE_MAX_SIZE
+
+from .uploads import ImageTooLarge
+
+
+class RecipeImageField(Base64ImageField):
+    """Изображение строкой base64 в JSON или файлом в multipart-запросе."""
+    max_size = RECIPE_IMAGE_MAX_SIZE
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            if data.size > self.max_size:
+                raise ImageTooLarge()
+            return serializers.ImageField.to_internal_value(self, data)
+        if isinstance(data, str) and len(data) * 3 // 4 > self.max_size:
+            raise ImageTooLarge()
+        return super().to_internal_value(data)
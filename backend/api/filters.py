@@ -14,10 +14,15 @@ class RecipesFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'Популярные'),),
+        method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',)
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering',)
 
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -31,6 +36,14 @@ class RecipesFilter(filters.FilterSet):
             return queryset.filter(in_shopping_cart__user=user)
         return queryset
 
+    def get_ordering(self, queryset, name, value):
+        # Внутреннее соединение (строка популярности есть у каждого
+        # рецепта) позволяет читать первую страницу по индексу
+        # trending_score_recipe_idx и подтягивать рецепты по ключу.
+        return queryset.filter(trending__isnull=False).order_by(
+            '-trending__score', '-trending__recipe_id'
+        )
+
 
 class IngredientSearchFilter(SearchFilter):
     search_param = 'name'
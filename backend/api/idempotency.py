@@ -0,0 +1,112 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from foodgram.settings import (IDEMPOTENCY_KEY_MAX_LENGTH,
+                               IDEMPOTENCY_LOCK_TIMEOUT)
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def get_cache_key(request, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'{request.user.pk}:{digest}'
+
+
+def encode_value(value):
+    if isinstance(value, UploadedFile):
+        digest = hashlib.sha256()
+        for chunk in value.chunks():
+            digest.update(chunk)
+        value.seek(0)
+        return digest.hexdigest()
+    return str(value)
+
+
+def get_fingerprint(request):
+    """Метод, путь и sha256 разобранного тела запроса.
+
+    Хэшируется request.data, а не сырое тело: поток multipart к этому
+    моменту может быть уже прочитан. Порядок ключей не важен, файлы
+    учитываются по содержимому.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, default=encode_value)
+    digest = hashlib.sha256(body.encode()).hexdigest()
+    return f'{request.method} {request.path} {digest}'
+
+
+def replay(stored, fingerprint):
+    stored_fingerprint, code, body = stored
+    if stored_fingerprint != fingerprint:
+        return Response(
+            {'errors': 'Ключ уже использован для другого запроса.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if code is None:
+        return Response(
+            {'errors': 'Запрос с этим ключом ещё выполняется.'},
+            status=status.HTTP_409_CONFLICT
+        )
+    response = Response(json.loads(body), status=code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(method):
+    """Повтор POST с тем же заголовком Idempotency-Key получает
+    сохранённый ответ, а сам метод не выполняется. Тот же ключ с другим
+    телом запроса получает 422.
+
+    Ответы хранятся в кэше idempotency отдельно для каждого
+    пользователя; срок и размер хранилища задаются в CACHES. Ошибки
+    сервера и исключения не сохраняются, такой запрос можно повторить.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if (
+            request.method != 'POST'
+            or not key
+            or not request.user.is_authenticated
+        ):
+            return method(self, request, *args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {'errors': 'Слишком длинный Idempotency-Key.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        cache = caches['idempotency']
+        cache_key = get_cache_key(request, key)
+        fingerprint = get_fingerprint(request)
+        if not cache.add(
+            cache_key, (fingerprint, None, None), IDEMPOTENCY_LOCK_TIMEOUT
+        ):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return replay(stored, fingerprint)
+        try:
+            response = method(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, (
+                fingerprint,
+                response.status_code,
+                JSONRenderer().render(response.data),
+            ))
+        return response
+
+    return wrapper
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.summary import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводки по авторам, исправляя расхождения.'
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write('Сводки по авторам пересчитаны.')
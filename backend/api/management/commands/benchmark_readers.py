@@ -0,0 +1,172 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.readers import IngredientReader, RecipeReader, TagReader
+from api.renderers import FastJSONRenderer
+from api.serializers import (IngredientSerializer, RecipeSerializer,
+                             TagSerializer)
+from api.views import RecipeViewSet
+from recipes.models import (Favourites, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag, TagRecipe)
+from users.models import Follow, User
+
+TAGS_PER_RECIPE = 3
+INGREDIENTS_PER_RECIPE = 5
+RECIPES_PER_AUTHOR = 10
+
+
+def seed(rows):
+    """Создаёт тестовые данные и возвращает пользователя с подписками."""
+    # bulk_create не возвращает id на SQLite, объекты перечитываются.
+    User.objects.bulk_create(
+        User(email=f'bench{number}@foodgram.test',
+             username=f'bench{number}', first_name='Замер',
+             last_name='Скорости')
+        for number in range(max(rows // RECIPES_PER_AUTHOR, 1))
+    )
+    authors = list(User.objects.filter(username__startswith='bench'))
+    Tag.objects.bulk_create(
+        Tag(name=f'bench{number}', slug=f'bench{number}',
+            color='#000000')
+        for number in range(rows)
+    )
+    tags = list(Tag.objects.filter(slug__startswith='bench'))
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'bench{number}', measurement_unit='г')
+        for number in range(rows)
+    )
+    ingredients = list(
+        Ingredient.objects.filter(name__startswith='bench')
+    )
+    Recipe.objects.bulk_create(
+        Recipe(author=authors[number % len(authors)],
+               name=f'bench{number}', text='Рецепт для замера.',
+               cooking_time=number % 100 + 1, image='bench.png')
+        for number in range(rows)
+    )
+    recipes = list(Recipe.objects.filter(name__startswith='bench'))
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe=recipe,
+                  tag=tags[(number + offset) % len(tags)])
+        for number, recipe in enumerate(recipes)
+        for offset in range(TAGS_PER_RECIPE)
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(
+            recipe=recipe,
+            ingredient=ingredients[(number + offset) % len(ingredients)],
+            amount=offset + 1
+        )
+        for number, recipe in enumerate(recipes)
+        for offset in range(INGREDIENTS_PER_RECIPE)
+    )
+    user = authors[0]
+    Favourites.objects.bulk_create(
+        Favourites(user=user, favorite_recipe=recipe)
+        for recipe in recipes[::2]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for recipe in recipes[::3]
+    )
+    Follow.objects.bulk_create(
+        Follow(user=user, author=author) for author in authors[1::2]
+    )
+    return user
+
+
+def best_time(function, repeat):
+    """Лучшее время из repeat запусков и результат последнего."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время построения списков рецептов, тегов и '
+        'ингредиентов через api.readers и через сериализаторы на '
+        'тестовых данных заданного размера. Данные создаются в '
+        'транзакции и откатываются; выводы обоих способов сверяются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[1000, 10000],
+            help='Размеры данных: число рецептов, тегов и ингредиентов.'
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.renderer = FastJSONRenderer()
+        for rows in options['rows']:
+            with transaction.atomic():
+                user = seed(rows)
+                for name, anonymous in (('аноним', True), ('автор', False)):
+                    self.compare_recipes(
+                        rows, name, None if anonymous else user,
+                        options['repeat']
+                    )
+                self.compare(rows, 'теги', TagReader, TagSerializer,
+                             Tag.objects.all(), options['repeat'])
+                self.compare(rows, 'ингредиенты', IngredientReader,
+                             IngredientSerializer, Ingredient.objects.all(),
+                             options['repeat'])
+                transaction.set_rollback(True)
+
+    def get_view(self, user):
+        request = APIRequestFactory().get('/api/recipes/')
+        if user is not None:
+            force_authenticate(request, user)
+        view = RecipeViewSet(action_map={'get': 'list'}, args=(),
+                             kwargs={}, format_kwarg=None)
+        view.request = view.initialize_request(request)
+        return view
+
+    def compare_recipes(self, rows, name, user, repeat):
+        view = self.get_view(user)
+        queryset = view.get_queryset().order_by('-pub_date')
+        context = view.get_serializer_context()
+
+        def read():
+            reader = RecipeReader(context)
+            return reader.read(reader.get_queryset(queryset))
+
+        def serialize():
+            recipes = list(queryset)
+            prefetch_related_objects(recipes, *view.get_prefetch_lookups())
+            return RecipeSerializer(recipes, many=True, context=context).data
+
+        self.report(rows, f'рецепты, {name}', read, serialize, repeat)
+
+    def compare(self, rows, name, reader_class, serializer_class, queryset,
+                repeat):
+        def read():
+            reader = reader_class({})
+            return reader.read(reader.get_queryset(queryset))
+
+        def serialize():
+            return serializer_class(queryset, many=True).data
+
+        self.report(rows, name, read, serialize, repeat)
+
+    def report(self, rows, name, read, serialize, repeat):
+        reader_time, reader_data = best_time(read, repeat)
+        serializer_time, serializer_data = best_time(serialize, repeat)
+        if (
+            self.renderer.render(reader_data)
+            != self.renderer.render(serializer_data)
+        ):
+            raise CommandError(f'{name}: вывод reader и сериализатора '
+                               'различается.')
+        self.stdout.write(
+            f'{rows} строк, {name}: сериализатор {serializer_time:.3f} с, '
+            f'reader {reader_time:.3f} с, '
+            f'ускорение ×{serializer_time / reader_time:.1f}'
+        )
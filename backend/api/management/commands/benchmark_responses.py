@@ -0,0 +1,91 @@
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.management.commands.benchmark_readers import seed
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+
+ENDPOINTS = (
+    ('рецепты', '/api/recipes/'),
+    ('рецепты, expand', '/api/recipes/?expand=author,tags,ingredients'),
+    ('ингредиенты', '/api/ingredients/'),
+)
+ENCODINGS = ('identity', 'gzip', 'br')
+
+
+def best_cpu_time(function, repeat):
+    """Лучшее процессорное время из repeat запусков и результат."""
+    times = []
+    for _ in range(repeat):
+        start = time.process_time()
+        result = function()
+        times.append(time.process_time() - start)
+    return min(times), result
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет байты и процессорное время на запрос для списков '
+        'рецептов и ингредиентов: без сжатия, с gzip и brotli, а также '
+        'рендер и разбор JSON через orjson и через стандартные классы '
+        'DRF. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[1000, 10000],
+            help='Размеры данных: число рецептов, тегов и ингредиентов.'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            with transaction.atomic():
+                client = APIClient()
+                client.force_authenticate(seed(rows))
+                for name, path in ENDPOINTS:
+                    self.measure(rows, name, client, path, options['repeat'])
+                transaction.set_rollback(True)
+
+    def measure(self, rows, name, client, path, repeat):
+        for encoding in ENCODINGS:
+            cpu, response = best_cpu_time(
+                lambda: client.get(path, HTTP_ACCEPT_ENCODING=encoding),
+                repeat
+            )
+            if response.status_code != 200:
+                raise CommandError(f'{path}: ответ {response.status_code}.')
+            self.stdout.write(
+                f'{rows} строк, {name}, {encoding}: '
+                f'{len(response.content)} байт, {cpu * 1000:.1f} мс'
+            )
+        self.compare_json(rows, name, response.data, repeat)
+
+    def compare_json(self, rows, name, data, repeat):
+        stock_render, stock = best_cpu_time(
+            lambda: JSONRenderer().render(data), repeat
+        )
+        fast_render, fast = best_cpu_time(
+            lambda: FastJSONRenderer().render(data), repeat
+        )
+        if stock != fast:
+            raise CommandError(f'{name}: вывод orjson и JSONRenderer '
+                               'различается.')
+        stock_parse, _ = best_cpu_time(
+            lambda: JSONParser().parse(BytesIO(stock)), repeat
+        )
+        fast_parse, _ = best_cpu_time(
+            lambda: FastJSONParser().parse(BytesIO(stock)), repeat
+        )
+        self.stdout.write(
+            f'{rows} строк, {name}: рендер JSONRenderer '
+            f'{stock_render * 1000:.2f} мс, orjson '
+            f'{fast_render * 1000:.2f} мс; разбор JSONParser '
+            f'{stock_parse * 1000:.2f} мс, orjson {fast_parse * 1000:.2f} мс'
+        )
@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.request import Request
+from rest_framework.throttling import SimpleRateThrottle
+
+from api.throttling import TokenBucketThrottle
+
+
+class BucketThrottle(TokenBucketThrottle):
+    scope = 'benchmark'
+    rate = '1000000/min'
+
+
+class HistoryThrottle(SimpleRateThrottle):
+    """Стандартный троттлинг DRF: список времён запросов в кэше."""
+    scope = 'benchmark'
+    rate = '1000000/min'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope, 'ident': self.get_ident(request)
+        }
+
+
+def time_checks(throttle_class, requests, repeat):
+    """Лучшее время одной проверки в микросекундах."""
+    times = []
+    for _ in range(repeat):
+        throttle_class.cache.clear()
+        start = time.perf_counter()
+        for request in requests:
+            throttle_class().allow_request(request, None)
+        times.append(time.perf_counter() - start)
+    return min(times) / len(requests) * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет стоимость одной проверки троттлинга на настроенном '
+        'кэше: GCRA из api.throttling против списка времён запросов '
+        'SimpleRateThrottle. Кэш default очищается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=10000,
+            help='Проверок за прогон.'
+        )
+        parser.add_argument(
+            '--clients', type=int, default=100,
+            help='Разных IP-адресов, между которыми делятся проверки.'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        clients = [
+            Request(factory.post(
+                '/', REMOTE_ADDR=f'10.0.{number // 256}.{number % 256}'
+            ))
+            for number in range(options['clients'])
+        ]
+        requests = [
+            clients[number % len(clients)]
+            for number in range(options['requests'])
+        ]
+        self.stdout.write(
+            f'{len(requests)} проверок от {len(clients)} клиентов, кэш '
+            f'{settings.CACHES["default"]["BACKEND"]}:'
+        )
+        for title, throttle_class in (
+            ('GCRA', BucketThrottle),
+            ('список времён', HistoryThrottle),
+        ):
+            spent = time_checks(throttle_class, requests, options['repeat'])
+            self.stdout.write(f'{title}: {spent:.1f} мкс на проверку')
+        BucketThrottle.cache.clear()
@@ -0,0 +1,92 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.filters import RecipesFilter
+from recipes.models import Recipe, TrendingScore
+from users.models import User
+
+PAGE_SIZE = 6
+
+
+def best_time(queryset, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(queryset.values_list('pk', flat=True)[:PAGE_SIZE])
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет первую страницу ?ordering=trending на каталогах '
+        'разного размера: чтение по индексу популярности против '
+        'прежней сортировки после LEFT JOIN. Данные создаются в '
+        'транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[1000, 10000, 100000],
+            help='Размеры каталога по возрастанию.'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Печатать планы запросов.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author = User.objects.create(
+                email='trending@foodgram.test', username='trending',
+                first_name='Замер', last_name='Популярности'
+            )
+            for rows in sorted(options['rows']):
+                self.seed(author, rows)
+                self.report(rows, options)
+            transaction.set_rollback(True)
+
+    def seed(self, author, rows):
+        missing = rows - Recipe.objects.count()
+        Recipe.objects.bulk_create(
+            (
+                Recipe(author=author, name=f'trending{number}',
+                       text='Рецепт для замера.', cooking_time=1,
+                       image='trending.png')
+                for number in range(missing)
+            ),
+            batch_size=1000,
+        )
+        TrendingScore.objects.bulk_create(
+            (
+                TrendingScore(recipe_id=recipe_id,
+                              score=random.uniform(0, 100))
+                for recipe_id in Recipe.objects.filter(
+                    trending__isnull=True
+                ).values_list('pk', flat=True).iterator()
+            ),
+            batch_size=1000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def report(self, rows, options):
+        indexed = RecipesFilter(
+            {'ordering': 'trending'}, Recipe.objects.all()
+        ).qs
+        joined = Recipe.objects.order_by('-trending__score', '-pub_date')
+        self.stdout.write(
+            f'{rows} рецептов: по индексу '
+            f'{best_time(indexed, options["repeat"]) * 1000:.2f} мс, '
+            f'LEFT JOIN и сортировка '
+            f'{best_time(joined, options["repeat"]) * 1000:.2f} мс'
+        )
+        if options['plans']:
+            for queryset in (indexed, joined):
+                self.stdout.write(
+                    queryset.values_list('pk')[:PAGE_SIZE].explain()
+                )
@@ -0,0 +1,195 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.urls import URLPattern, URLResolver, resolve
+from rest_framework.test import APIClient
+
+from api import urls
+from api.query_budget import QueryRecorder, find_problems, get_budget
+from recipes.models import (Favourites, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import ADMIN, USER, Follow, User
+
+SEED_USERS = 8
+SEED_RECIPES = 12
+SEED_TAGS = 3
+SEED_INGREDIENTS = 6
+
+# Варианты списков, которые маршруты без параметров не покрывают.
+EXTRA_PATHS = (
+    '/api/recipes/?is_favorited=1&is_in_shopping_cart=1',
+    '/api/recipes/?expand=author,tags,ingredients',
+    '/api/recipes/?fields=id,name,author',
+    '/api/recipes/?tags=budget0&search=budget',
+    '/api/recipes/?since=',
+    '/api/users/subscriptions/?recipes_limit=2',
+    '/api/ingredients/?name=budget',
+    '/api/tags/?since=',
+)
+
+re_group = re.compile(r'\(\?P<(\w+)>[^)]*\)|<(?:\w+:)?(\w+)>')
+
+
+def iter_routes(patterns, prefix=''):
+    """(шаблон пути, view) для всех маршрутов, кроме суффиксов формата."""
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern).lstrip('^').rstrip('$')
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern) and 'format' not in route:
+            yield route, pattern.callback
+
+
+def fill_route(route, ids):
+    """Подставляет в шаблон пути id созданных объектов."""
+    section = route.split('/', 1)[0]
+
+    def value(match):
+        name = match[1] or match[2]
+        return str(ids['recipes' if name == 'recipe_id' else section])
+
+    return '/api/' + re_group.sub(value, route).replace('\\', '').rstrip('?')
+
+
+def allows_get(view_func):
+    actions = getattr(view_func, 'actions', None)
+    if actions is not None:
+        return 'get' in actions
+    view_class = getattr(view_func, 'cls', None)
+    return view_class is not None and hasattr(view_class, 'get')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет GET-запросы ко всем маршрутам api/urls.py и основные '
+        'изменяющие запросы на тестовых данных, проверяет бюджеты запросов '
+        'к базе и повторы (N+1). '
+        'Данные создаются в транзакции и откатываются.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ids = self.seed()
+            problems = self.check_routes(ids)
+            transaction.set_rollback(True)
+        if problems:
+            raise CommandError(
+                f'Бюджеты превышены на маршрутах: {problems}.'
+            )
+
+    def seed(self):
+        users = [
+            User.objects.create(
+                email=f'budget{number}@foodgram.test',
+                username=f'budget{number}',
+                first_name='Бюджет',
+                last_name='Запросов',
+                access_level=ADMIN if number == 0 else USER,
+            )
+            for number in range(SEED_USERS)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'budget{number}', slug=f'budget{number}',
+                color=f'#00000{number}'
+            )
+            for number in range(SEED_TAGS)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'budget{number}', measurement_unit='г'
+            )
+            for number in range(SEED_INGREDIENTS)
+        ]
+        recipes = []
+        for number in range(SEED_RECIPES):
+            recipe = Recipe.objects.create(
+                author=users[number % SEED_USERS],
+                name=f'budget{number}',
+                text='Рецепт для проверки бюджетов запросов.',
+                cooking_time=number + 1,
+                image='budget.png',
+            )
+            recipe.tags.set(tags)
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=number + 1)
+                for ingredient in ingredients
+            )
+            recipes.append(recipe)
+        user = users[0]
+        for recipe in recipes[::2]:
+            Favourites.objects.create(user=user, favorite_recipe=recipe)
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        for author in users[1:]:
+            Follow.objects.create(user=user, author=author)
+        return {
+            'user': user,
+            'users': users[1].pk,
+            'recipes': recipes[1].pk,
+            'tags': tags[0].pk,
+            'ingredients': ingredients[0].pk,
+        }
+
+    def get_writes(self, ids):
+        """Изменяющие запросы: (метод, путь, данные) в порядке выполнения."""
+        recipe = f'/api/recipes/{ids["recipes"]}/'
+        author = f'/api/users/{ids["users"]}/subscribe/'
+        return (
+            ('post', recipe + 'favorite/', None),
+            ('delete', recipe + 'favorite/', None),
+            ('post', recipe + 'shopping_cart/', None),
+            ('delete', recipe + 'shopping_cart/', None),
+            ('delete', author, None),
+            ('post', author, None),
+            ('patch', recipe, {
+                'tags': [ids['tags']],
+                'ingredients': [
+                    {'id': ids['ingredients'], 'amount': 5},
+                ],
+            }),
+            ('delete', recipe, None),
+        )
+
+    def check_routes(self, ids):
+        client = APIClient()
+        client.force_authenticate(ids['user'])
+        paths = {}
+        for route, view_func in iter_routes(urls.urlpatterns):
+            if allows_get(view_func):
+                paths.setdefault(fill_route(route, ids), view_func)
+        requests = [('get', path, None) for path in paths]
+        requests += [('get', path, None) for path in EXTRA_PATHS]
+        requests += self.get_writes(ids)
+        return [
+            f'{method.upper()} {path}'
+            for method, path, data in requests
+            if not self.check_request(client, method, path, data)
+        ]
+
+    def check_request(self, client, method, path, data):
+        """Выполняет запрос; False при ошибке или превышении бюджета."""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = getattr(client, method)(path, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        request = f'{method.upper()} {path}: {response.status_code}'
+        if response.status_code >= 400:
+            # Ошибка означает, что запросы view не были выполнены.
+            self.stderr.write(f'{request}, маршрут не проверен')
+            return False
+        budget = get_budget(resolve(path.split('?')[0]).func, method)
+        if budget is None:
+            self.stdout.write(
+                f'{request}, {len(recorder.queries)} запросов, без бюджета'
+            )
+            return True
+        self.stdout.write(
+            f'{request}, {len(recorder.queries)}/{budget} запросов'
+        )
+        problems = find_problems(recorder.queries, budget)
+        for problem in problems:
+            self.stderr.write(f'  {problem}')
+        return not problems
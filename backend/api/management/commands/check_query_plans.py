@@ -0,0 +1,116 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.filters import RecipesFilter
+from recipes.models import (Favourites, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart)
+from users.models import Follow, User
+
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(?:\s*$|\s+AS)', re.M),
+}
+
+
+def hot_queries():
+    """Горячие запросы API и таблица, которую они не должны сканировать.
+
+    Значения id не важны: план зависит только от формы запроса.
+    """
+    queries = [
+        (
+            'избранное пользователя по рецепту',
+            Favourites.objects.filter(user_id=1, favorite_recipe_id=1),
+            'recipes_favourites',
+        ),
+        (
+            'рецепты в избранном пользователя',
+            Recipe.objects.filter(favorite_recipe__user=1),
+            'recipes_favourites',
+        ),
+        (
+            'список покупок пользователя',
+            ShoppingCart.objects.filter(user_id=1),
+            'recipes_shoppingcart',
+        ),
+        (
+            'подписчики автора',
+            Follow.objects.filter(author_id=1).order_by(),
+            'users_follow',
+        ),
+        (
+            'ингредиенты рецептов',
+            IngredientRecipe.objects.filter(recipe_id__in=(1, 2)),
+            'recipes_ingredientrecipe',
+        ),
+        (
+            'ингредиент в рецепте',
+            IngredientRecipe.objects.filter(recipe_id=1, ingredient_id=1),
+            'recipes_ingredientrecipe',
+        ),
+        (
+            'рецепты автора',
+            Recipe.objects.filter(author_id=1).order_by('-pub_date'),
+            'recipes_recipe',
+        ),
+        (
+            'первая страница популярных',
+            RecipesFilter(
+                {'ordering': 'trending'}, Recipe.objects.all()
+            ).qs[:10],
+            'recipes_trendingscore',
+        ),
+    ]
+    # В SQLite LIKE с ESCAPE не использует индексы, функциональные индексы
+    # для поиска есть только в PostgreSQL.
+    if connection.vendor == 'postgresql':
+        queries.append((
+            'поиск ингредиента по началу названия',
+            Ingredient.objects.filter(name__istartswith='мол'),
+            'recipes_ingredient',
+        ))
+        queries.append((
+            'поиск пользователя по началу логина',
+            User.objects.filter(username__istartswith='ив'),
+            'users_user',
+        ))
+    return queries
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет EXPLAIN горячих запросов и завершается ошибкой, '
+        'если какой-то из них снова сканирует большую таблицу целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать планы всех запросов.'
+        )
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается.'
+            )
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # На маленьких таблицах планировщик честно выбирает Seq
+                # Scan; запрещаем его, чтобы остался он только там, где
+                # подходящего индекса нет вовсе.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for title, queryset, table in hot_queries():
+                plan = queryset.explain()
+                if options['verbose_plans']:
+                    self.stdout.write(f'{title}:\n{plan}\n')
+                if table in pattern.findall(plan):
+                    failures.append(f'{title}: полное сканирование {table}')
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write('Все горячие запросы используют индексы.')
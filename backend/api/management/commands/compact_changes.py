@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.changes import compact
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из журнала изменений записи, вытесненные более новыми '
+        'записями о тех же объектах.'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Удалено записей: {compact()}.')
@@ -0,0 +1,43 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.readers import RecipeExportReader
+from foodgram.settings import EXPORT_CHUNK_SIZE
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Выгружает каталог рецептов в формате JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', help='Файл для выгрузки; по умолчанию stdout.'
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if options['output']:
+            output = open(options['output'], 'wb')
+        else:
+            output = sys.stdout.buffer
+        stream = output
+        if options['gzip']:
+            stream = gzip.GzipFile(fileobj=output, mode='wb')
+        reader = RecipeExportReader({})
+        try:
+            for line in reader.lines(
+                Recipe.objects.all(), options['chunk_size']
+            ):
+                stream.write(line)
+        finally:
+            if stream is not output:
+                stream.close()
+            if output is sys.stdout.buffer:
+                output.flush()
+            else:
+                output.close()
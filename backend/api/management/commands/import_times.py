@@ -0,0 +1,95 @@
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.settings import STARTUP_TIME_BUDGET
+
+# То же, что делает воркер gunicorn до первого запроса.
+STARTUP_SCRIPT = '''
+import time
+start = time.perf_counter()
+import foodgram.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+'''
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse(stderr):
+    """[(модуль, собственное время, накопленное), ...] в микросекундах."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            own, cumulative, _, module = match.groups()
+            rows.append((module, int(own), int(cumulative)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает загрузку приложения в чистом интерпретаторе с '
+        '-X importtime и показывает самые долгие импорты. Завершается '
+        'ошибкой, если старт дольше бюджета.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=25)
+        parser.add_argument(
+            '--sort', choices=('self', 'cumulative'), default='cumulative'
+        )
+        parser.add_argument(
+            '--packages', action='store_true',
+            help='Суммировать собственное время по пакетам верхнего уровня.'
+        )
+        parser.add_argument(
+            '--budget', type=float, default=STARTUP_TIME_BUDGET,
+            help='Допустимое время старта в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'foodgram.settings'
+            ),
+        }
+        result = subprocess.run(
+            (sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT),
+            capture_output=True, text=True, env=env,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        startup = float(result.stdout.split()[-1])
+        rows = parse(result.stderr)
+        if options['packages']:
+            totals = Counter()
+            for module, own, _ in rows:
+                totals[module.split('.')[0]] += own
+            top = [
+                (package, own, own)
+                for package, own in totals.most_common(options['limit'])
+            ]
+        else:
+            column = 1 if options['sort'] == 'self' else 2
+            top = sorted(rows, key=lambda row: -row[column])
+            top = top[:options['limit']]
+        self.stdout.write(f'{"собств., мс":>12} {"всего, мс":>10}  модуль')
+        for module, own, cumulative in top:
+            self.stdout.write(
+                f'{own / 1000:12.1f} {cumulative / 1000:10.1f}  {module}'
+            )
+        self.stdout.write(
+            f'Модулей: {len(rows)}, старт: {startup:.2f} с, '
+            f'бюджет: {options["budget"]:.2f} с.'
+        )
+        if startup > options['budget']:
+            raise CommandError(
+                f'Старт {startup:.2f} с превышает бюджет '
+                f'{options["budget"]:.2f} с.'
+            )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.dedup import find_duplicates, merge_duplicates
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart)
+from recipes.shopping_cart import rebuild as rebuild_shopping_carts
+from recipes.signals import touch_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Объединяет дубли ингредиентов: без учёта регистра, пробелов и '
+        'разницы ё/е, а с --exact только полные совпадения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exact', action='store_true')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать найденные дубли.'
+        )
+
+    def handle(self, *args, **options):
+        duplicates = find_duplicates(Ingredient, exact=options['exact'])
+        count = sum(len(group) for group in duplicates.values())
+        if options['dry_run']:
+            names = dict(Ingredient.objects.filter(
+                pk__in=list(duplicates)
+            ).values_list('pk', 'name'))
+            for survivor, group in duplicates.items():
+                self.stdout.write(f'{names[survivor]}: {len(group)}')
+            self.stdout.write(f'Дублей: {count}.')
+            return
+        with transaction.atomic():
+            recipe_ids = merge_duplicates(
+                Ingredient, IngredientRecipe, duplicates
+            )
+            touch_recipes(Recipe.objects.filter(pk__in=list(recipe_ids)))
+            rebuild_shopping_carts(set(ShoppingCart.objects.filter(
+                recipe_id__in=list(recipe_ids)
+            ).values_list('user_id', flat=True)))
+        self.stdout.write(
+            f'Удалено дублей: {count}, затронуто рецептов: '
+            f'{len(recipe_ids)}. Похожие рецепты можно пересчитать '
+            f'командой similar_recipes.'
+        )
@@ -0,0 +1,100 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Favourites, ShoppingCart
+from recipes.partitioning import get_partitions, rebuild
+
+LOOKUPS = (
+    (Favourites, 'user_id', 'favorite_recipe_id'),
+    (ShoppingCart, 'user_id', 'recipe_id'),
+)
+
+# Таблица и все её секции; для обычной таблицы pg_partition_tree пуст.
+RELATIONS = (
+    'WITH relations AS ('
+    '    SELECT %s::regclass AS relid'
+    '    UNION SELECT relid FROM pg_partition_tree(%s::regclass)'
+    ')'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Секционирует таблицы избранного и списков покупок по хешу '
+        'user_id (PostgreSQL) и показывает размеры индексов и время '
+        'выборок по пользователю и по рецепту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions', type=int,
+            help='Число секций; 0 — вернуть обычные таблицы.'
+        )
+        parser.add_argument(
+            '--samples', type=int, default=200,
+            help='Сколько выборок сделать для замера времени.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Секционирование доступно только в PostgreSQL.')
+        partitions = options['partitions']
+        if partitions is not None:
+            with transaction.atomic():
+                for model, column, _ in LOOKUPS:
+                    rebuild(
+                        connection, model._meta.db_table, column, partitions
+                    )
+        for model, user_column, recipe_column in LOOKUPS:
+            self.report(model, user_column, recipe_column, options['samples'])
+
+    def report(self, model, user_column, recipe_column, samples):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+            partitions = get_partitions(cursor, table)
+            cursor.execute(
+                f'{RELATIONS} '
+                'SELECT c.relname, sum(pg_relation_size(i.indexrelid)) '
+                'FROM relations tree '
+                'JOIN pg_index i ON i.indrelid = tree.relid '
+                'JOIN pg_class c ON c.oid = coalesce(('
+                '    SELECT inhparent FROM pg_inherits '
+                '    WHERE inhrelid = i.indexrelid'
+                '), i.indexrelid) '
+                'GROUP BY c.relname ORDER BY c.relname', [table, table]
+            )
+            index_sizes = cursor.fetchall()
+            cursor.execute(
+                f'{RELATIONS} SELECT sum(pg_table_size(relid)) '
+                'FROM relations', [table, table]
+            )
+            table_size, = cursor.fetchone()
+        self.stdout.write(
+            f'{table}: {model.objects.count()} строк, секций: '
+            f'{len(partitions)}, данные {table_size // 1024} КБ'
+        )
+        for name, size in index_sizes:
+            self.stdout.write(f'  {name}: {size // 1024} КБ')
+        for column in (user_column, recipe_column):
+            values = list(model.objects.order_by().values_list(
+                column, flat=True
+            )[:10000])
+            if not values:
+                continue
+            timings = []
+            for value in random.choices(values, k=samples):
+                started = time.perf_counter()
+                list(model.objects.filter(**{column: value}).order_by(
+                ).values_list('pk', flat=True))
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'  по {column}: среднее '
+                f'{statistics.mean(timings):.2f} мс, p95 '
+                f'{timings[int(len(timings) * 0.95) - 1]:.2f} мс'
+            )
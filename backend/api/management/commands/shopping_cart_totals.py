@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.shopping_cart import mismatched_users, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет итоги списков покупок с полным пересчётом и завершается '
+        'ошибкой при расхождении; с --fix пересчитывает расходящиеся.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true')
+
+    def handle(self, *args, **options):
+        users = mismatched_users()
+        if not users:
+            self.stdout.write('Итоги списков покупок совпадают.')
+            return
+        if not options['fix']:
+            raise CommandError(
+                f'Расхождения у пользователей: {sorted(users)}.'
+            )
+        rebuild(users)
+        self.stdout.write(f'Пересчитано пользователей: {len(users)}.')
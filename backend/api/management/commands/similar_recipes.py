@@ -0,0 +1,154 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from scipy import sparse
+
+from foodgram.settings import (SIMILAR_LSH_BANDS, SIMILAR_LSH_MIN_RECIPES,
+                               SIMILAR_MINHASH_PERMUTATIONS,
+                               SIMILAR_RECIPES_LIMIT, SIMILAR_RECIPES_METRIC)
+from recipes.models import IngredientRecipe
+from recipes.similarity import store_neighbours
+
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+PAIRS_CHUNK = 100000
+
+
+def build_matrix():
+    """Разреженная бинарная матрица рецепт × ингредиент."""
+    rows = np.array(
+        IngredientRecipe.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    recipe_ids, row = np.unique(rows[:, 0], return_inverse=True)
+    _, col = np.unique(rows[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (row, col)),
+        shape=(len(recipe_ids), col.max() + 1 if len(col) else 0),
+    )
+    matrix.data[:] = 1
+    return recipe_ids, matrix
+
+
+def scores(common, sizes_a, sizes_b, metric):
+    if metric == 'cosine':
+        return common / np.sqrt(sizes_a * sizes_b)
+    return common / (sizes_a + sizes_b - common)
+
+
+def exact_pairs(matrix):
+    """Все пары с общими ингредиентами через произведение M·Mᵀ."""
+    common = sparse.triu(matrix @ matrix.T, k=1).tocoo()
+    return common.row, common.col, common.data
+
+
+def minhash_signatures(matrix, permutations, seed=0):
+    random = np.random.RandomState(seed)
+    prime = int(MERSENNE_PRIME)
+    a = random.randint(1, prime, size=(permutations, 1)).astype(np.uint64)
+    b = random.randint(0, prime, size=(permutations, 1)).astype(np.uint64)
+    hashes = (a * matrix.indices.astype(np.uint64) + b) % MERSENNE_PRIME
+    return np.minimum.reduceat(hashes, matrix.indptr[:-1], axis=1).T
+
+
+def lsh_pairs(matrix, permutations, bands):
+    """Пары-кандидаты из совпавших корзин MinHash/LSH и их пересечение."""
+    signatures = minhash_signatures(matrix, permutations)
+    rows_per_band = permutations // bands
+    count = matrix.shape[0]
+    keys = []
+    for band in range(bands):
+        chunk = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        _, bucket = np.unique(chunk, axis=0, return_inverse=True)
+        bucket = bucket.ravel()
+        order = np.argsort(bucket, kind='stable')
+        bounds = np.flatnonzero(np.diff(bucket[order])) + 1
+        for members in np.split(order, bounds):
+            if len(members) < 2:
+                continue
+            first, second = np.triu_indices(len(members), k=1)
+            first, second = members[first], members[second]
+            keys.append(
+                np.minimum(first, second) * count
+                + np.maximum(first, second)
+            )
+    if not keys:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64)
+    keys = np.unique(np.concatenate(keys))
+    first, second = keys // count, keys % count
+    common = np.concatenate([
+        np.asarray(
+            matrix[first[start:start + PAIRS_CHUNK]].multiply(
+                matrix[second[start:start + PAIRS_CHUNK]]
+            ).sum(axis=1)
+        ).ravel()
+        for start in range(0, len(keys), PAIRS_CHUNK)
+    ])
+    return first, second, common
+
+
+def top_k(recipe_ids, first, second, values, limit):
+    """Для каждой строки оставляет limit соседей с наибольшим сходством."""
+    first, second = (
+        np.concatenate([first, second]), np.concatenate([second, first])
+    )
+    values = np.concatenate([values, values])
+    order = np.lexsort((second, -values, first))
+    first, second, values = first[order], second[order], values[order]
+    neighbours = {}
+    bounds = np.flatnonzero(np.diff(first)) + 1
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(first)]):
+        if start == end:
+            continue
+        end = min(end, start + limit)
+        neighbours[int(recipe_ids[first[start]])] = [
+            (int(recipe_ids[similar]), float(score))
+            for similar, score in zip(second[start:end], values[start:end])
+        ]
+    return neighbours
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу похожих рецептов по ингредиентам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--metric', choices=('jaccard', 'cosine'),
+            default=SIMILAR_RECIPES_METRIC,
+        )
+        parser.add_argument(
+            '--limit', type=int, default=SIMILAR_RECIPES_LIMIT
+        )
+        parser.add_argument(
+            '--lsh', action='store_true',
+            help='Использовать MinHash/LSH независимо от размера каталога.'
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids, matrix = build_matrix()
+        if not len(recipe_ids):
+            store_neighbours({})
+            return
+        use_lsh = (
+            options['lsh'] or len(recipe_ids) >= SIMILAR_LSH_MIN_RECIPES
+        )
+        if use_lsh:
+            first, second, common = lsh_pairs(
+                matrix, SIMILAR_MINHASH_PERMUTATIONS, SIMILAR_LSH_BANDS
+            )
+        else:
+            first, second, common = exact_pairs(matrix)
+        sizes = np.asarray(matrix.sum(axis=1)).ravel()
+        values = scores(
+            common, sizes[first], sizes[second], options['metric']
+        )
+        neighbours = top_k(
+            recipe_ids, first, second, values, options['limit']
+        )
+        store_neighbours(neighbours)
+        self.stdout.write(
+            f'Рецептов: {len(recipe_ids)}, '
+            f'со схожими: {len(neighbours)}, '
+            f'{"LSH" if use_lsh else "точный расчёт"}.'
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает популярность рецептов по избранному и спискам '
+        'покупок. Запускается периодически, например из cron.'
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(f'Рецептов с событиями: {count}.')
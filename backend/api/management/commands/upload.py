@@ -16,7 +16,7 @@ def load_ingredients():
                 measurement_unit=row[1],
             )
             ingredients.append(ingredient)
-        Ingredient.objects.bulk_create(ingredients)
+        Ingredient.objects.bulk_create(ingredients, ignore_conflicts=True)
     print('ingredients loaded!')
 
 
@@ -0,0 +1,170 @@
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from foodgram.settings import (COMPRESSION_BROTLI_QUALITY,
+                               COMPRESSION_MIN_SIZE, PROFILE_HEADER,
+                               PROFILE_INTERVAL, PROFILE_PARAM,
+                               SLOW_QUERY_MS)
+
+from .profiling import QueryTimer, StackSampler, get_admin
+from .query_budget import (QueryBudgetExceeded, QueryRecorder,
+                           find_problems, get_budget)
+from .slow_queries import current_request, get_view_name, log_slow_queries
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжимает ответы от COMPRESSION_MIN_SIZE байт: brotli, иначе gzip."""
+
+    def process_response(self, request, response):
+        if response.get('Content-Type') == 'application/gzip':
+            return response
+        if response.streaming:
+            return super().process_response(request, response)
+        if (
+            len(response.content) < COMPRESSION_MIN_SIZE
+            or response.has_header('Content-Encoding')
+        ):
+            return response
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or not re_accepts_brotli.search(accept_encoding):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed_content = brotli.compress(
+            response.content, quality=COMPRESSION_BROTLI_QUALITY
+        )
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Сверяет число запросов к базе во view DRF с их бюджетом.
+
+    QUERY_BUDGET_MODE=log пишет предупреждение, raise выбрасывает
+    QueryBudgetExceeded, off отключает middleware. Режим читается из
+    django.conf.settings, чтобы тесты включали его override_settings.
+    Запросы потоковых ответов выполняются после выхода из middleware и
+    не считаются.
+    """
+
+    def __init__(self, get_response):
+        if settings.QUERY_BUDGET_MODE == 'off':
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(len(recorder.queries))
+        match = request.resolver_match
+        budget = match and get_budget(match.func, request.method)
+        if budget is None:
+            return response
+        problems = find_problems(recorder.queries, budget)
+        if problems:
+            message = f'{request.method} {request.path}: ' + '; '.join(
+                problems
+            )
+            if settings.QUERY_BUDGET_MODE == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class SlowQueryMiddleware:
+    """Пишет запросы к базе дольше SLOW_QUERY_MS в журнал медленных
+    запросов вместе с view и действием; SLOW_QUERY_MS=0 отключает."""
+
+    def __init__(self, get_response):
+        if not SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_request.set((None, request.get_full_path()))
+        try:
+            with connection.execute_wrapper(log_slow_queries):
+                return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_request.set((
+            get_view_name(view_func, request.method),
+            request.get_full_path(),
+        ))
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос администратора по заголовку X-Profile или
+    параметру ?profile=.
+
+    Вместо ответа view возвращается JSON: его статус, время, SQL-запросы
+    с длительностью и стеки в формате collapsed stacks для flamegraph.
+    Остальные запросы проходят без изменений, токен проверяется только
+    при наличии заголовка или параметра.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    header = 'HTTP_' + PROFILE_HEADER.upper().replace('-', '_')
+
+    def __call__(self, request):
+        if not self.is_requested(request) or get_admin(request) is None:
+            return self.get_response(request)
+        return self.profile(request)
+
+    def is_requested(self, request):
+        # Сначала META и строка запроса как есть: request.headers и
+        # request.GET строятся лениво, для обычных запросов не нужны.
+        if request.META.get(self.header) is not None:
+            return True
+        query = request.META.get('QUERY_STRING', '')
+        return PROFILE_PARAM in query and PROFILE_PARAM in request.GET
+
+    def profile(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with StackSampler(PROFILE_INTERVAL) as sampler, \
+                connection.execute_wrapper(timer):
+            response = self.get_response(request)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        logger.info('Профилирование %s %s', request.method, request.path)
+        return JsonResponse({
+            'status': response.status_code,
+            'duration': round((time.perf_counter() - start) * 1000, 3),
+            'interval': PROFILE_INTERVAL * 1000,
+            'samples': sum(sampler.stacks.values()),
+            'sql_duration': round(
+                sum(query['duration'] for query in timer.queries), 3
+            ),
+            'queries': timer.queries,
+            'stacks': sampler.collapsed(),
+        }, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,184 @@
+import hashlib
+
+from django.core import signing
+from django.db.models import Count, Max, prefetch_related_objects
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from recipes.changes import changes_since, decode_token, encode_token
+
+
+class ConditionalGetMixin:
+    """ETag/Last-Modified по updated_at и ответ 304 до сериализации.
+
+    Last-Modified отдаётся только для одного объекта и без состояния
+    зрителя: у списка максимум updated_at не меняется, когда рецепт
+    удалён или выбыл со страницы, а подписки, избранное и список
+    покупок зрителя updated_at не сдвигают. В этих случаях проверка идёт
+    только по ETag.
+    """
+    modified_field = 'updated_at'
+
+    def get_viewer_state(self, ids):
+        """Данные зрителя, от которых зависит ответ, или None."""
+        return None
+
+    def get_validators(self, ids, *extra, many=False):
+        model = self.get_queryset().model
+        stats = model.objects.filter(pk__in=ids).aggregate(
+            count=Count('pk'),
+            last_modified=Max(self.modified_field),
+        )
+        if not stats['count']:
+            return None, None
+        last_modified = stats['last_modified']
+        viewer_state = self.get_viewer_state(ids)
+        key = ':'.join(map(str, (
+            self.request.user.pk, stats['count'],
+            last_modified.isoformat(), viewer_state, *extra, *ids
+        )))
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        if many or viewer_state is not None:
+            return etag, None
+        return etag, int(last_modified.timestamp())
+
+    def set_validators(self, response, etag, last_modified):
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_not_modified(self, etag, last_modified):
+        if etag is None:
+            return None
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            return None
+        return self.set_validators(response, etag, last_modified)
+
+
+class SparseFieldsMixin:
+    """Разбирает ?fields= и ?expand= и передаёт их в контекст сериализатора.
+
+    Без параметров отдаются все поля со вложенными объектами. Если
+    передан expand, не перечисленные в нём связи отдаются идентификаторами.
+    """
+    fields_param = 'fields'
+    expand_param = 'expand'
+
+    def _get_param_set(self, param):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def get_requested_fields(self):
+        return self._get_param_set(self.fields_param)
+
+    def get_expanded_fields(self):
+        return self._get_param_set(self.expand_param)
+
+    def is_field_requested(self, name):
+        fields = self.get_requested_fields()
+        return fields is None or name in fields
+
+    def is_field_expanded(self, name):
+        expand = self.get_expanded_fields()
+        return self.is_field_requested(name) and (
+            expand is None or name in expand
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        context['expand'] = self.get_expanded_fields()
+        return context
+
+
+class FastListMixin:
+    """list() через reader_class из api.readers вместо сериализатора."""
+    reader_class = None
+
+    def get_reader(self):
+        if self.reader_class is None:
+            return None
+        return self.reader_class(self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        reader = self.get_reader()
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+        queryset = reader.get_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.read(page))
+        return Response(reader.read(queryset))
+
+
+class DeltaSyncMixin:
+    """list() с ?since=<токен> отдаёт только изменения из журнала.
+
+    В ответе изменённые объекты, id удалённых и токен для следующего
+    запроса; пустой токен означает синхронизацию с начала. Пользователю
+    добавляются объекты с его личными изменениями: избранное, список
+    покупок. Фильтры и пагинация в этом режиме не применяются, порции
+    ограничены SYNC_PAGE_SIZE, и пока has_more, запрос надо повторять.
+    """
+    sync_param = 'since'
+    sync_kind = None
+
+    def is_sync_request(self):
+        return self.sync_param in self.request.query_params
+
+    def get_prefetch_lookups(self):
+        return ()
+
+    def read_changed(self, queryset):
+        """Представление найденных объектов и множество их id."""
+        reader = self.get_reader()
+        if reader is not None:
+            rows = reader.read(reader.get_queryset(queryset))
+            return rows, {row['id'] for row in rows}
+        instances = list(queryset)
+        prefetch_related_objects(instances, *self.get_prefetch_lookups())
+        return (
+            self.get_serializer(instances, many=True).data,
+            {instance.pk for instance in instances},
+        )
+
+    def sync(self):
+        try:
+            since = decode_token(self.request.query_params[self.sync_param])
+        except signing.SignatureExpired:
+            raise ValidationError({self.sync_param: (
+                'Токен синхронизации устарел, начните с пустого токена.'
+            )})
+        except signing.BadSignature:
+            raise ValidationError(
+                {self.sync_param: 'Недействительный токен синхронизации.'}
+            )
+        ids, last, has_more = changes_since(
+            self.sync_kind, since, user_id=self.request.user.pk
+        )
+        rows, found = self.read_changed(
+            self.get_queryset().filter(pk__in=ids)
+        )
+        return Response({
+            'results': rows,
+            'deleted': [pk for pk in ids if pk not in found],
+            'token': encode_token(last),
+            'has_more': has_more,
+        })
+
+    def list(self, request, *args, **kwargs):
+        if self.is_sync_request():
+            return self.sync()
+        return super().list(request, *args, **kwargs)
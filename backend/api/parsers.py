@@ -0,0 +1,33 @@
+import re
+from io import BytesIO
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, orjson
+
+# От 19 цифр подряд число может не уместиться в 64 бита: orjson прочитал
+# бы такое целое как float с потерей точности.
+re_long_number = re.compile(rb'\d{19}')
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson; без orjson работает как стандартный.
+
+    Тела с длинными числами разбирает JSONParser: целые шире 64 бит
+    остаются целыми.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if re_long_number.search(body):
+            return super().parse(BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,86 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def get_admin(request):
+    """Администратор запроса или None.
+
+    Middleware работает до аутентификации DRF, поэтому токен
+    проверяется здесь же; сессия админки уже разобрана Django.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        try:
+            credentials = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        if credentials is None:
+            return None
+        user = credentials[0]
+    return user if user.is_admin else None
+
+
+def frame_name(frame):
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+
+
+class StackSampler:
+    """Сэмплирующий профилировщик одного потока.
+
+    Фоновый поток раз в interval секунд снимает стек потока запроса;
+    одинаковые стеки считаются вместе в формате collapsed stacks
+    (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self):
+        return '\n'.join(
+            f'{stack} {count}' for stack, count in self.stacks.most_common()
+        )
+
+
+class QueryTimer:
+    """Обёртка для connection.execute_wrapper: SQL и время каждого запроса."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params),
+                'duration': round((time.perf_counter() - start) * 1000, 3),
+            })
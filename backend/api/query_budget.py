@@ -0,0 +1,68 @@
+import re
+from collections import Counter
+
+from rest_framework.views import APIView
+
+from foodgram.settings import QUERY_BUDGET_DEFAULT, QUERY_BUDGET_REPEATS
+
+re_placeholders = re.compile(r'%s(?:, %s)+')
+re_numbers = re.compile(r'\b\d+(?:\.\d+)?\b')
+SKIPPED_STATEMENTS = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def normalize(sql):
+    """Форма запроса: числа и списки параметров IN (%s, %s, ...)
+    сворачиваются, чтобы запросы с разными id считались одинаковыми."""
+    return re_placeholders.sub('%s', re_numbers.sub('%s', sql))
+
+
+class QueryRecorder:
+    """Обёртка для connection.execute_wrapper, запоминающая форму
+    запросов."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(SKIPPED_STATEMENTS):
+            self.queries.append(normalize(sql))
+        return execute(sql, params, many, context)
+
+
+def get_action(view_func, method):
+    """Действие вьюсета для HTTP-метода, для APIView — сам метод."""
+    actions = getattr(view_func, 'actions', None) or {}
+    return actions.get(method.lower(), method.lower())
+
+
+def get_budget(view_func, method):
+    """Бюджет запросов для view DRF; None — без проверки.
+
+    Берётся из атрибута query_budgets класса view по имени действия
+    вьюсета или HTTP-методу, иначе QUERY_BUDGET_DEFAULT.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None or not issubclass(view_class, APIView):
+        return None
+    return getattr(view_class, 'query_budgets', {}).get(
+        get_action(view_func, method), QUERY_BUDGET_DEFAULT
+    )
+
+
+def find_problems(queries, budget):
+    problems = []
+    if len(queries) > budget:
+        problems.append(
+            f'{len(queries)} запросов при бюджете {budget}'
+        )
+    if queries:
+        shape, count = Counter(queries).most_common(1)[0]
+        if count >= QUERY_BUDGET_REPEATS:
+            problems.append(
+                f'запрос повторён {count} раз, похоже на N+1: {shape}'
+            )
+    return problems
@@ -0,0 +1,201 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from django.utils import timezone
+
+from recipes.models import IngredientRecipe, Recipe, Tag
+from users.models import Follow
+
+from .renderers import FastJSONRenderer
+
+
+def is_subscribed_flag(user, author='pk'):
+    """Exists-выражение «user подписан на автора» для аннотаций."""
+    if not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(Follow.objects.filter(user=user, author=OuterRef(author)))
+
+
+def datetime_to_representation(value):
+    """То же, что serializers.DateTimeField с форматом ISO 8601."""
+    if not value:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class ValuesReader:
+    """Читает список напрямую из .values() без сериализатора.
+
+    Результат должен совпадать с выводом соответствующего сериализатора
+    байт в байт, поэтому порядок fields повторяет порядок его полей.
+    """
+    fields = ()
+
+    def __init__(self, context):
+        self.context = context
+
+    def get_queryset(self, queryset):
+        return queryset.values(*self.fields)
+
+    def read(self, rows):
+        return list(rows)
+
+
+class TagReader(ValuesReader):
+    fields = ('id', 'name', 'color', 'slug')
+
+
+class IngredientReader(ValuesReader):
+    fields = ('id', 'name', 'measurement_unit')
+
+
+class RecipeReader(ValuesReader):
+    """Аналог RecipeSerializer для списка рецептов.
+
+    Ожидает, что queryset уже аннотирован is_favorited и
+    is_in_shopping_cart, как это делает RecipeViewSet.get_queryset.
+    """
+    author_fields = ('id', 'email', 'username', 'first_name', 'last_name')
+    fields = (
+        'id', *(f'author__{name}' for name in author_fields),
+        'author_is_subscribed', 'is_favorited', 'is_in_shopping_cart',
+        'image', 'name', 'text', 'cooking_time', 'pub_date', 'updated_at',
+    )
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.request = context['request']
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def get_queryset(self, queryset):
+        return super().get_queryset(queryset.annotate(
+            author_is_subscribed=is_subscribed_flag(
+                self.request.user, 'author'
+            )
+        ))
+
+    def get_image(self, name):
+        if not name:
+            return None
+        return self.request.build_absolute_uri(self.storage.url(name))
+
+    def get_tags(self, ids):
+        tags = defaultdict(list)
+        for recipe_id, *values in Tag.objects.filter(
+            recipe__in=ids
+        ).values_list('recipe', *TagReader.fields):
+            tags[recipe_id].append(dict(zip(TagReader.fields, values)))
+        return tags
+
+    def get_ingredients(self, ids):
+        ingredients = defaultdict(list)
+        for (
+            recipe_id, ingredient_id, name, measurement_unit, amount
+        ) in IngredientRecipe.objects.filter(
+            recipe_id__in=ids
+        ).values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        ):
+            ingredients[recipe_id].append({
+                'id': ingredient_id,
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            })
+        return ingredients
+
+    def read(self, rows):
+        rows = list(rows)
+        ids = [row['id'] for row in rows]
+        tags = self.get_tags(ids)
+        ingredients = self.get_ingredients(ids)
+        author_lookups = tuple(
+            (name, f'author__{name}') for name in self.author_fields
+        )
+        return [
+            {
+                'id': row['id'],
+                'author': {
+                    **{name: row[lookup] for name, lookup in author_lookups},
+                    'is_subscribed': row['author_is_subscribed'],
+                },
+                'tags': tags[row['id']],
+                'ingredients': ingredients[row['id']],
+                'is_favorited': row['is_favorited'],
+                'is_in_shopping_cart': row['is_in_shopping_cart'],
+                'image': self.get_image(row['image']),
+                'name': row['name'],
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+                'pub_date': datetime_to_representation(row['pub_date']),
+                'updated_at': datetime_to_representation(row['updated_at']),
+            }
+            for row in rows
+        ]
+
+
+class RecipeExportReader(RecipeReader):
+    """Весь каталог рецептов в формате JSON Lines для выгрузки партнёрам.
+
+    Рецепты читаются через .iterator(chunk_size), теги и ингредиенты
+    подгружаются отдельно для каждой пачки, поэтому память не зависит
+    от размера каталога. Полей, зависящих от пользователя, здесь нет.
+    """
+    fields = (
+        'id', 'author_id', 'author__username', 'name', 'text',
+        'cooking_time', 'image', 'pub_date', 'updated_at',
+    )
+
+    def __init__(self, context):
+        self.context = context
+        self.request = context.get('request')
+        self.storage = Recipe._meta.get_field('image').storage
+        self.renderer = FastJSONRenderer()
+
+    def get_queryset(self, queryset):
+        return queryset.order_by('pk').values(*self.fields)
+
+    def get_image(self, name):
+        if not name:
+            return None
+        if self.request is None:
+            return self.storage.url(name)
+        return super().get_image(name)
+
+    def read(self, rows):
+        rows = list(rows)
+        ids = [row['id'] for row in rows]
+        tags = self.get_tags(ids)
+        ingredients = self.get_ingredients(ids)
+        return [
+            {
+                'id': row['id'],
+                'author': {
+                    'id': row['author_id'],
+                    'username': row['author__username'],
+                },
+                'name': row['name'],
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+                'image': self.get_image(row['image']),
+                'pub_date': datetime_to_representation(row['pub_date']),
+                'updated_at': datetime_to_representation(row['updated_at']),
+                'tags': tags[row['id']],
+                'ingredients': ingredients[row['id']],
+            }
+            for row in rows
+        ]
+
+    def lines(self, queryset, chunk_size):
+        rows = self.get_queryset(queryset).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            for item in self.read(chunk):
+                yield self.renderer.render(item) + b'\n'
@@ -1,13 +1,52 @@
+from functools import partial
+
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from foodgram.settings import (MIN_COOKING_TIME, MAX_COOKING_TIME,
-                               MIN_AMOUNT, MAX_AMOUNT)
-from recipes.models import (Favourites, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingCart, Tag)
+from foodgram.settings import (BATCH_MAX_REQUESTS, MIN_COOKING_TIME,
+                               MAX_COOKING_TIME, MIN_AMOUNT, MAX_AMOUNT)
+from recipes.models import (AuthorSummary, Favourites, Ingredient,
+                            IngredientRecipe, Recipe, ShoppingCart, Tag)
+from recipes.shopping_cart import change_recipe, recipe_amounts
+from recipes.storage import IMAGE_CONTENT_TYPES
+from recipes.tasks import update_similar_recipes
 from users.models import Follow, User
 
+from .fields import RecipeImageField
+
+
+class SparseFieldsSerializerMixin:
+    """Оставляет поля из context['fields'] и сворачивает связи.
+
+    Связи из collapsed_fields, не перечисленные в context['expand'],
+    заменяются на поля с идентификаторами. Действует только на верхнем
+    уровне, вложенные сериализаторы отдаются целиком.
+    """
+    collapsed_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        is_top_level = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer)
+            and self.parent.parent is None
+        )
+        if not is_top_level:
+            return fields
+        requested = self.context.get('fields')
+        expand = self.context.get('expand')
+        if requested is not None:
+            fields = {
+                name: field for name, field in fields.items()
+                if name in requested
+            }
+        if expand is not None:
+            for name, field_factory in self.collapsed_fields.items():
+                if name in fields and name not in expand:
+                    fields[name] = field_factory()
+        return fields
+
 
 class UserFoodCreateSerializer(serializers.ModelSerializer):
 
@@ -42,6 +81,8 @@ class UserFoodSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -57,7 +98,8 @@ class RecipeFollowSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'cooking_time', 'image')
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(SparseFieldsSerializerMixin,
+                       serializers.ModelSerializer):
     email = serializers.CharField(
         read_only=True,
         source='author.email'
@@ -82,6 +124,12 @@ class FollowSerializer(serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
 
+    collapsed_fields = {
+        'recipes': partial(
+            serializers.SerializerMethodField, method_name='get_recipe_ids'
+        ),
+    }
+
     class Meta:
         model = Follow
         fields = ('email', 'id', 'username', 'first_name',
@@ -89,6 +137,8 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, author):
         user = self.context.get('request').user
+        if author.user_id == user.pk:
+            return True
         return not user.is_anonymous and Follow.objects.filter(
             user=user, author=author.author).exists()
 
@@ -107,8 +157,8 @@ class FollowSerializer(serializers.ModelSerializer):
             )
         return data
 
-    def get_recipes(self, obj):
-        queryset = obj.user.recipes.all()
+    def get_limited_recipes(self, obj):
+        queryset = obj.author.recipes.all()
         limit = self.context['request'].query_params.get('recipes_limit')
         if limit:
             try:
@@ -116,11 +166,21 @@ class FollowSerializer(serializers.ModelSerializer):
                 queryset = queryset[:limit]
             except ValueError:
                 pass
-        serializer = RecipeFollowSerializer(queryset, many=True)
+        return queryset
+
+    def get_recipes(self, obj):
+        serializer = RecipeFollowSerializer(
+            self.get_limited_recipes(obj), many=True
+        )
         return serializer.data
 
+    def get_recipe_ids(self, obj):
+        return [recipe.id for recipe in self.get_limited_recipes(obj)]
+
     def get_recipes_count(self, obj):
-        return obj.user.recipes.count()
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.author.recipes.count()
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -148,7 +208,8 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsSerializerMixin,
+                       serializers.ModelSerializer):
     author = UserFoodSerializer(read_only=True)
     tags = TagSerializer(
         many=True,
@@ -162,12 +223,25 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    collapsed_fields = {
+        'author': partial(
+            serializers.PrimaryKeyRelatedField, read_only=True
+        ),
+        'tags': partial(
+            serializers.PrimaryKeyRelatedField, many=True, read_only=True
+        ),
+        'ingredients': partial(
+            serializers.PrimaryKeyRelatedField, many=True, read_only=True
+        ),
+    }
 
     class Meta:
         model = Recipe
         fields = '__all__'
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return obj.favorite_recipe.filter(
             user=user,
@@ -175,6 +249,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return obj.in_shopping_cart.filter(
             user=user,
@@ -183,8 +259,9 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class IngredientRecipeWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    # Ингредиенты загружаются одним запросом в
+    # RecipeWriteSerializer.validate_ingredients.
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=MIN_AMOUNT,
         max_value=MAX_AMOUNT)
@@ -197,11 +274,9 @@ class IngredientRecipeWriteSerializer(serializers.ModelSerializer):
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    tags = serializers.ListField(
-        child=serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all())
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientRecipeWriteSerializer(many=True, write_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
     cooking_time = serializers.IntegerField(
         min_value=MIN_COOKING_TIME,
         max_value=MAX_COOKING_TIME
@@ -219,6 +294,32 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         )
         exclude = ('pub_date',)
 
+    def validate_tags(self, value):
+        found = set(Tag.objects.filter(pk__in=value).values_list(
+            'pk', flat=True
+        ))
+        missing = [pk for pk in value if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {missing}.'
+            )
+        return value
+
+    def validate_ingredients(self, value):
+        ingredients = Ingredient.objects.in_bulk(
+            [item['id'] for item in value]
+        )
+        missing = [
+            item['id'] for item in value if item['id'] not in ingredients
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {missing}.'
+            )
+        return [
+            {**item, 'id': ingredients[item['id']]} for item in value
+        ]
+
     def add_ingredient(self, ingredients, recipe):
         recipe.ingredients.clear()
         ingredients_list = []
@@ -231,14 +332,17 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 ))
         IngredientRecipe.objects.bulk_create(ingredients_list)
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.add_ingredient(ingredients, recipe)
+        update_similar_recipes.delay(recipe.pk)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -250,7 +354,10 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             instance.cooking_time
         )
         instance.save()
+        old_amounts = recipe_amounts(instance.pk)
         self.add_ingredient(ingredients, instance)
+        change_recipe(instance.pk, old_amounts)
+        update_similar_recipes.delay(instance.pk)
         instance.tags.set(tags)
         return instance
 
@@ -275,7 +382,7 @@ class FavouritesSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Favourites
-        fields = ('id', 'name', 'image', 'coocking_time',)
+        fields = ('id', 'name', 'image', 'cooking_time',)
 
     def validate(self, recipe):
         if recipe.favorite_recipe.exists():
@@ -305,7 +412,7 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ShoppingCart
-        fields = ('id', 'name', 'image', 'coocking_time')
+        fields = ('id', 'name', 'image', 'cooking_time')
 
     def validate(self, recipe):
         if recipe.in_shopping_cart.exists():
@@ -313,3 +420,42 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
                 'Ингредиент уже в списке покупок!'
             )
         return recipe
+
+
+class AuthorSummarySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='author_id', read_only=True)
+    top_tags = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AuthorSummary
+        fields = ('id', 'followers_count', 'recipes_count',
+                  'favorites_count', 'top_tags')
+
+    def get_top_tags(self, obj):
+        tags = Tag.objects.in_bulk([tag_id for tag_id, _ in obj.top_tags])
+        return [
+            {**TagSerializer(tags[tag_id]).data, 'recipes_count': count}
+            for tag_id, count in obj.top_tags
+            if tag_id in tags
+        ]
+
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=('GET',), default='GET')
+    path = serializers.CharField(max_length=2048)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=BatchItemSerializer(),
+        allow_empty=False,
+        max_length=BATCH_MAX_REQUESTS
+    )
+
+
+class DirectUploadSerializer(serializers.Serializer):
+    content_type = serializers.ChoiceField(choices=IMAGE_CONTENT_TYPES)
+
+
+class DirectUploadFinalizeSerializer(serializers.Serializer):
+    upload = serializers.CharField(max_length=255)
@@ -0,0 +1,232 @@
+import hashlib
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from foodgram.settings import (SLOW_QUERY_EXPLAIN_RATE, SLOW_QUERY_LOG_SIZE,
+                               SLOW_QUERY_MS, SLOW_QUERY_OTHER_VIEWS,
+                               SLOW_QUERY_VIEWS_LIMIT)
+
+from .query_budget import get_action, normalize
+
+SLOT_KEY = 'slot:{}'
+NEXT_SLOT_KEY = 'next_slot'
+EXPLAIN_SAVEPOINT = 'slow_query_explain'
+
+# (view, путь запроса), в котором выполняются запросы к базе.
+current_request = ContextVar('current_request', default=(None, None))
+
+logger = logging.getLogger(__name__)
+
+
+def get_view_name(view_func, method):
+    """RecipeViewSet.list для view DRF, иначе модуль и имя функции."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    return f'{view_class.__name__}.{get_action(view_func, method)}'
+
+
+def explain(connection, sql, params):
+    """План EXPLAIN (ANALYZE, BUFFERS); сделанные запросом изменения
+    откатываются.
+
+    Используется отдельный курсор драйвера: курсор Django снова прошёл
+    бы через обёртку, а результат исходного запроса ещё не прочитан.
+    """
+    in_transaction = connection.in_atomic_block
+    with connection.connection.cursor() as cursor:
+        if in_transaction:
+            cursor.execute(f'SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        try:
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+        finally:
+            if in_transaction:
+                cursor.execute(f'ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}')
+                cursor.execute(f'RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}')
+
+
+def can_explain(connection, sql, many):
+    # EXPLAIN ANALYZE выполняет запрос: изменяющие запросы не трогаем.
+    return (
+        connection.vendor == 'postgresql'
+        and not many
+        and sql.lstrip()[:6].upper() == 'SELECT'
+        and random.random() < SLOW_QUERY_EXPLAIN_RATE
+    )
+
+
+def increment(cache, key, delta=1):
+    cache.add(key, 0)
+    return cache.incr(key, delta)
+
+
+def get_meta_key(prefix):
+    return f'{prefix.split(":")[0]}:meta'
+
+
+def get_counter_keys(prefix, views):
+    return [
+        f'{prefix}:count', f'{prefix}:total',
+        *(f'{prefix}:view:{view}' for view in views),
+    ]
+
+
+def forget(cache, prefixes):
+    """Удаляет ключи вытесненных записей журнала.
+
+    Описание формы удаляется, только если оно ещё относится к этой
+    записи, а не к её более поздней регистрации.
+    """
+    metas = cache.get_many([get_meta_key(prefix) for prefix in prefixes])
+    keys = []
+    for prefix in prefixes:
+        meta = metas.get(get_meta_key(prefix))
+        views = [SLOW_QUERY_OTHER_VIEWS]
+        if meta is not None and meta['prefix'] == prefix:
+            keys.append(get_meta_key(prefix))
+            views += meta['views']
+        keys += get_counter_keys(prefix, views)
+    cache.delete_many(keys)
+
+
+def register(cache, key, fingerprint):
+    """Отдаёт форме запроса следующую ячейку журнала.
+
+    Ячейки идут по кругу, поэтому сверх SLOW_QUERY_LOG_SIZE вытесняются
+    самые давно появившиеся формы вместе со своими ключами. Номер
+    регистрации входит в префикс счётчиков, так что вытесненная и
+    вернувшаяся форма считается с нуля.
+    """
+    number = increment(cache, NEXT_SLOT_KEY)
+    slot_key = SLOT_KEY.format(number % SLOW_QUERY_LOG_SIZE)
+    evicted = cache.get(slot_key)
+    if evicted is not None:
+        forget(cache, [evicted])
+    prefix = f'{key}:{number}'
+    cache.set(slot_key, prefix)
+    return {
+        'sql': fingerprint,
+        'prefix': prefix,
+        'slot': number % SLOW_QUERY_LOG_SIZE,
+        'max': 0,
+        'views': [],
+        'explain': None,
+    }
+
+
+def record(fingerprint, duration, plan):
+    """Добавляет запрос в журнал кэша slow_queries.
+
+    У каждой формы запроса свои ключи. Число запросов, их суммарное
+    время и число по view растут через cache.incr и не теряются при
+    одновременной записи из разных процессов. Максимум, последний
+    запрос, план и список view перезаписываются целиком, при гонке
+    остаётся последняя запись. Отдельно считаются первые
+    SLOW_QUERY_VIEWS_LIMIT view, остальные — вместе.
+    """
+    cache = caches['slow_queries']
+    key = hashlib.sha1(fingerprint.encode()).hexdigest()
+    meta = cache.get(f'{key}:meta')
+    if (
+        meta is None
+        or cache.get(SLOT_KEY.format(meta['slot'])) != meta['prefix']
+    ):
+        meta = register(cache, key, fingerprint)
+    view, path = current_request.get()
+    view = view or '-'
+    if view not in meta['views']:
+        if len(meta['views']) < SLOW_QUERY_VIEWS_LIMIT:
+            meta['views'].append(view)
+        else:
+            view = SLOW_QUERY_OTHER_VIEWS
+    prefix = meta['prefix']
+    increment(cache, f'{prefix}:count')
+    increment(cache, f'{prefix}:total', round(duration * 1000))
+    increment(cache, f'{prefix}:view:{view}')
+    meta['max'] = max(meta['max'], duration)
+    meta['last_request'] = path
+    meta['last_seen'] = timezone.now().isoformat()
+    if plan is not None:
+        meta['explain'] = plan
+    cache.set(f'{key}:meta', meta)
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper: запросы дольше
+    SLOW_QUERY_MS попадают в журнал, часть из них — с планом."""
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - start) * 1000
+    if duration < SLOW_QUERY_MS:
+        return result
+    connection = context['connection']
+    plan = None
+    if can_explain(connection, sql, many):
+        try:
+            plan = explain(connection, sql, params)
+        except connection.Database.Error as error:
+            logger.warning('Не удалось получить план запроса: %s', error)
+    view, path = current_request.get()
+    logger.warning('Медленный запрос %.1f мс в %s (%s): %s',
+                   duration, view, path, sql)
+    record(normalize(sql), round(duration, 3), plan)
+    return result
+
+
+def get_slots(cache):
+    return cache.get_many([
+        SLOT_KEY.format(slot) for slot in range(SLOW_QUERY_LOG_SIZE)
+    ])
+
+
+def get_entries():
+    """Журнал медленных запросов, самые затратные по сумме — первыми."""
+    cache = caches['slow_queries']
+    prefixes = set(get_slots(cache).values())
+    metas = [
+        meta for meta in cache.get_many([
+            get_meta_key(prefix) for prefix in prefixes
+        ]).values()
+        if meta['prefix'] in prefixes
+    ]
+    counters = cache.get_many([
+        counter_key
+        for meta in metas
+        for counter_key in get_counter_keys(
+            meta['prefix'], [*meta['views'], SLOW_QUERY_OTHER_VIEWS]
+        )
+    ])
+    entries = []
+    for meta in metas:
+        prefix = meta.pop('prefix')
+        del meta['slot']
+        count = counters.get(f'{prefix}:count')
+        if not count:
+            continue
+        total = counters.get(f'{prefix}:total', 0) / 1000
+        views = {
+            view: counters.get(f'{prefix}:view:{view}', 0)
+            for view in [*meta['views'], SLOW_QUERY_OTHER_VIEWS]
+        }
+        entries.append(dict(
+            meta,
+            count=count,
+            total=round(total, 3),
+            average=round(total / count, 3),
+            views={view: number for view, number in views.items() if number},
+        ))
+    return sorted(entries, key=lambda entry: entry['total'], reverse=True)
+
+
+def clear():
+    """Очищает журнал вместе с ключами всех записей."""
+    cache = caches['slow_queries']
+    slots = get_slots(cache)
+    forget(cache, list(slots.values()))
+    cache.delete_many(list(slots))
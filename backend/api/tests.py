@@ -0,0 +1,1104 @@
+import base64
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from uuid import UUID
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from foodgram.settings import BATCH_MAX_REQUESTS
+from recipes.models import (Favourites, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingCartTotal, Tag)
+from recipes.shopping_cart import mismatched_users, recompute, stored
+from recipes.storage import hashed_name
+from users.models import ADMIN, Follow, User
+
+from . import slow_queries
+from .checks import check_idempotency_cache
+from .fields import RecipeImageField
+from .management.commands.check_query_plans import SEQ_SCAN
+from .middleware import ProfilingMiddleware
+from .parsers import FastJSONParser
+from .query_budget import QueryBudgetExceeded
+from .readers import RecipeExportReader
+from .renderers import FastJSONRenderer
+from .serializers import IngredientSerializer, TagSerializer
+from .throttling import TokenBucketThrottle
+from .uploads import ImageTooLarge, LimitedTemporaryFileUploadHandler
+from .views import RecipeViewSet
+
+RECIPE_FIELDS = (
+    'id,author,tags,ingredients,is_favorited,is_in_shopping_cart,image,'
+    'name,text,cooking_time,pub_date,updated_at'
+)
+
+
+def create_user(username):
+    return User.objects.create(
+        email=f'{username}@foodgram.test', username=username,
+        first_name='Имя', last_name='Фамилия'
+    )
+
+
+class ReaderTests(TestCase):
+    """Списки из api.readers совпадают с выводом сериализаторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        authors = [create_user(f'author{number}') for number in range(3)]
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}',
+                               color=f'#00000{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(4)
+        ]
+        for number in range(6):
+            recipe = Recipe.objects.create(
+                author=authors[number % 3], name=f'Рецепт {number}',
+                text='Текст рецепта', cooking_time=number + 1,
+                image=f'recipe{number}.png' if number else ''
+            )
+            recipe.tags.set(tags[:number % 3 + 1])
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=number + 1)
+                for ingredient in ingredients[:number % 4 + 1]
+            )
+            if number % 2:
+                Favourites.objects.create(user=cls.user,
+                                          favorite_recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Follow.objects.create(user=cls.user, author=authors[1])
+
+    def get_clients(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        return {'anonymous': APIClient(), 'authenticated': authenticated}
+
+    def test_recipe_list(self):
+        for name, client in self.get_clients().items():
+            with self.subTest(client=name):
+                reader = client.get('/api/recipes/')
+                for query in (
+                    f'?fields={RECIPE_FIELDS}',
+                    '?expand=author,tags,ingredients',
+                ):
+                    serializer = client.get('/api/recipes/' + query)
+                    self.assertEqual(reader.status_code, 200)
+                    self.assertEqual(reader.content, serializer.content)
+
+    def test_recipe_list_matches_retrieve(self):
+        for name, client in self.get_clients().items():
+            with self.subTest(client=name):
+                for item in client.get('/api/recipes/').json()['results']:
+                    detail = client.get(f'/api/recipes/{item["id"]}/')
+                    self.assertEqual(item, detail.json())
+
+    def test_tag_list(self):
+        for name, client in self.get_clients().items():
+            with self.subTest(client=name):
+                self.assertEqual(
+                    client.get('/api/tags/').json(),
+                    json.loads(json.dumps(
+                        TagSerializer(Tag.objects.all(), many=True).data
+                    ))
+                )
+
+    def test_ingredient_list(self):
+        for name, client in self.get_clients().items():
+            with self.subTest(client=name):
+                self.assertEqual(
+                    client.get('/api/ingredients/').json(),
+                    json.loads(json.dumps(IngredientSerializer(
+                        Ingredient.objects.all(), many=True
+                    ).data))
+                )
+
+
+class RendererTests(TestCase):
+    """FastJSONRenderer и FastJSONParser против JSONRenderer и JSONParser."""
+
+    def render(self, renderer_class, data):
+        return renderer_class().render(data, 'application/json')
+
+    def assert_same(self, data):
+        self.assertEqual(self.render(FastJSONRenderer, data),
+                         self.render(JSONRenderer, data))
+
+    def test_payloads(self):
+        user = create_user('reader')
+        recipe = Recipe.objects.create(
+            author=user, name='Рецепт \u2028 «в кавычках»', text='"\\\n',
+            cooking_time=5, image='recipe.png'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        payloads = {
+            'list': client.get('/api/recipes/?expand=author').data,
+            'detail': client.get(f'/api/recipes/{recipe.pk}/').data,
+            'errors': client.post('/api/recipes/', {}, format='json').data,
+            'types': {
+                'datetime': recipe.pub_date,
+                'date': date(2026, 1, 31),
+                'decimal': Decimal('1.50'),
+                'lazy': gettext_lazy('Текст'),
+                'uuid': UUID(int=1),
+                'tuple': (1, 2.5, None, True),
+                1: 'ключ-число',
+                'float': [0.1, 1 / 3, -2.0, 1e-3, 123.456],
+                'int': [0, -1, 2 ** 63 - 1, -2 ** 63],
+                'nested': [{'a': [[], {}]}],
+            },
+            'empty': {},
+            'string': 'строка',
+        }
+        for name, data in payloads.items():
+            with self.subTest(payload=name):
+                self.assert_same(data)
+
+    def test_wide_integers(self):
+        for value in (2 ** 64, -2 ** 63 - 1, 10 ** 30):
+            with self.subTest(value=value):
+                self.assert_same({'value': value, 'list': [value]})
+                body = self.render(FastJSONRenderer, {'value': value})
+                self.assertEqual(
+                    FastJSONParser().parse(BytesIO(body)), {'value': value}
+                )
+
+    def test_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), -float('inf'),
+                      Decimal('NaN')):
+            data = {'id': None, 'results': [{'score': value}]}
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    self.render(FastJSONRenderer, data)
+                with mock.patch.object(FastJSONRenderer, 'strict', False), \
+                        mock.patch.object(JSONRenderer, 'strict', False):
+                    self.assert_same(data)
+
+    def test_parser_rejects_non_finite(self):
+        for body in (b'{"score": NaN}', b'[Infinity]', b'{"a": }'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    FastJSONParser().parse(BytesIO(body))
+                with self.assertRaises(ParseError):
+                    JSONParser().parse(BytesIO(body))
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=5, image='recipe.png'
+            )
+            for number in range(8)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_has_no_last_modified(self):
+        response = self.client.get('/api/recipes/')
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_list_after_delete(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        Recipe.objects.filter(pk=self.recipes[-1].pk).delete()
+        for headers in (
+            {'HTTP_IF_NONE_MATCH': etag},
+            {'HTTP_IF_MODIFIED_SINCE': http_date()},
+        ):
+            with self.subTest(headers=headers):
+                response = self.client.get('/api/recipes/', **headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn(
+                    self.recipes[-1].pk,
+                    [item['id'] for item in response.json()['results']]
+                )
+
+    def test_follow_changes_etag(self):
+        path = f'/api/recipes/{self.recipes[0].pk}/'
+        response = self.client.get(path)
+        self.assertNotIn('Last-Modified', response)
+        updated_at = Recipe.objects.get(pk=self.recipes[0].pk).updated_at
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['author']['is_subscribed'])
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[0].pk).updated_at, updated_at
+        )
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_toggles_change_only_own_etag(self):
+        path = f'/api/recipes/{self.recipes[-1].pk}/'
+        other = APIClient()
+        other.force_authenticate(self.author)
+        updated_at = Recipe.objects.get(pk=self.recipes[-1].pk).updated_at
+        for action, field in (('favorite', 'is_favorited'),
+                              ('shopping_cart', 'is_in_shopping_cart')):
+            with self.subTest(action=action):
+                etag = self.client.get(path)['ETag']
+                other_etag = other.get(path)['ETag']
+                response = self.client.post(f'{path}{action}/')
+                self.assertEqual(response.status_code, 201)
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.json()[field])
+                self.assertEqual(
+                    other.get(path, HTTP_IF_NONE_MATCH=other_etag)
+                    .status_code, 304
+                )
+                list_etag = self.client.get('/api/recipes/')['ETag']
+                self.client.delete(f'{path}{action}/')
+                self.assertEqual(self.client.get(
+                    '/api/recipes/', HTTP_IF_NONE_MATCH=list_etag
+                ).status_code, 200)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[-1].pk).updated_at, updated_at
+        )
+
+    def test_unrequested_flags_do_not_change_etag(self):
+        path = f'/api/recipes/{self.recipes[0].pk}/?fields=id,name'
+        response = self.client.get(path)
+        self.assertIn('Last-Modified', response)
+        Favourites.objects.create(user=self.user,
+                                  favorite_recipe=self.recipes[0])
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_anonymous_detail_has_last_modified(self):
+        response = APIClient().get(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertIn('Last-Modified', response)
+
+
+class SyncTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('recipes.changes.SYNC_SETTLE_SECONDS', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reader = create_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes = [
+                Recipe.objects.create(
+                    author=create_user(f'author{number}'),
+                    name=f'Рецепт {number}', text='Текст', cooking_time=5,
+                    image='recipe.png'
+                )
+                for number in range(2)
+            ]
+
+    def sync(self, client, token, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.get('/api/recipes/', {'since': token}, **extra)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_full_then_delta(self):
+        data = self.sync(self.client, '')
+        self.assertEqual({item['id'] for item in data['results']},
+                         {recipe.pk for recipe in self.recipes})
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self.sync(self.client, data['token'])['results'], [])
+        deleted = self.recipes[0].pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].delete()
+        delta = self.sync(self.client, data['token'])
+        self.assertEqual(delta['results'], [])
+        self.assertEqual(delta['deleted'], [deleted])
+
+    def test_toggles_reach_only_their_user(self):
+        token = self.sync(self.client, '')['token']
+        recipe = self.recipes[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            for action in ('favorite', 'shopping_cart'):
+                response = self.client.post(
+                    f'/api/recipes/{recipe.pk}/{action}/'
+                )
+                self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.sync(APIClient(), token)['results'], [])
+        other = APIClient()
+        other.force_authenticate(create_user('other'))
+        self.assertEqual(self.sync(other, token)['results'], [])
+        results = self.sync(self.client, token)['results']
+        self.assertEqual([item['id'] for item in results], [recipe.pk])
+        self.assertTrue(results[0]['is_favorited'])
+        self.assertTrue(results[0]['is_in_shopping_cart'])
+
+    def test_invalid_token(self):
+        token = self.sync(self.client, '')['token']
+        for bad in (token[:-1] + ('A' if token[-1] != 'A' else 'B'),
+                    'garbage'):
+            with self.subTest(token=bad):
+                response = self.client.get('/api/recipes/', {'since': bad})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Недействительный', response.json()['since'])
+        with mock.patch('recipes.changes.SYNC_TOKEN_MAX_AGE', -1):
+            response = self.client.get('/api/recipes/', {'since': token})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('устарел', response.json()['since'])
+
+    def test_settle_window_and_compaction(self):
+        token = self.sync(self.client, '')['token']
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('Новое имя', 'Ещё имя'):
+                self.recipes[1].name = name
+                self.recipes[1].save()
+        with mock.patch('recipes.changes.SYNC_SETTLE_SECONDS', 60):
+            delta = self.sync(self.client, token)
+        self.assertEqual(delta['results'], [])
+        self.assertEqual(delta['token'], token)
+        call_command('compact_changes', stdout=StringIO())
+        delta = self.sync(self.client, token)
+        self.assertEqual([item['name'] for item in delta['results']],
+                         ['Ещё имя'])
+
+
+class ShoppingCartTotalTests(TestCase):
+    """Итоги списков покупок после правок совпадают с пересчётом."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.buyers = [create_user(f'buyer{number}') for number in range(2)]
+        self.tag = Tag.objects.create(name='Тег', slug='tag',
+                                      color='#000000')
+        self.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+        self.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'Рецепт {number}',
+                text='Текст рецепта', cooking_time=1
+            )
+            recipe.tags.set([self.tag])
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=(number + 1) * 10 + index)
+                for index, ingredient in enumerate(
+                    self.ingredients[number:number + 2]
+                )
+            )
+            self.recipes.append(recipe)
+
+    def get_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assertTotalsConsistent(self):
+        self.assertEqual(stored(), recompute())
+        self.assertEqual(mismatched_users(), set())
+        output = StringIO()
+        call_command('shopping_cart_totals', stdout=output)
+        self.assertIn('Итоги списков покупок совпадают.', output.getvalue())
+
+    def toggle(self, user, recipe, method, expected):
+        response = getattr(self.get_client(user), method)(
+            f'/api/recipes/{recipe.pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, expected)
+
+    def test_add_remove_and_change_amounts(self):
+        first, second = self.buyers
+        for user, recipe in ((first, self.recipes[0]),
+                             (first, self.recipes[1]),
+                             (second, self.recipes[1])):
+            self.toggle(user, recipe, 'post', 201)
+            self.assertTotalsConsistent()
+        # Общий ингредиент обоих рецептов суммируется в одну строку.
+        self.assertEqual(
+            stored([first.pk])[first.pk, self.ingredients[1].pk], 11 + 20
+        )
+        response = self.get_client(self.author).patch(
+            f'/api/recipes/{self.recipes[1].pk}/', {
+                'tags': [self.tag.pk],
+                'ingredients': [
+                    {'id': self.ingredients[0].pk, 'amount': 5},
+                    {'id': self.ingredients[2].pk, 'amount': 7},
+                ],
+            }, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTotalsConsistent()
+        self.toggle(first, self.recipes[0], 'delete', 204)
+        self.assertTotalsConsistent()
+        self.assertEqual(stored([first.pk]), {
+            (first.pk, self.ingredients[0].pk): 5,
+            (first.pk, self.ingredients[2].pk): 7,
+        })
+        self.recipes[1].delete()
+        self.assertTotalsConsistent()
+        self.assertEqual(stored(), {})
+
+    def test_command_reports_and_fixes_mismatch(self):
+        user = self.buyers[0]
+        self.toggle(user, self.recipes[0], 'post', 201)
+        ShoppingCartTotal.objects.filter(user=user).update(amount=1)
+        self.assertEqual(mismatched_users(), {user.pk})
+        with self.assertRaisesMessage(CommandError, str(user.pk)):
+            call_command('shopping_cart_totals', stdout=StringIO())
+        output = StringIO()
+        call_command('shopping_cart_totals', '--fix', stdout=output)
+        self.assertIn('Пересчитано пользователей: 1.', output.getvalue())
+        self.assertTotalsConsistent()
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('batch')
+        self.token = Token.objects.create(user=self.user)
+        self.tag = Tag.objects.create(name='Тег', slug='tag',
+                                      color='#000000')
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.user, name=f'Рецепт {number}',
+                text='Текст рецепта', cooking_time=1
+            )
+            for number in range(2)
+        ]
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[0])
+        self.client = APIClient()
+
+    def batch(self, *paths):
+        return self.client.post('/api/batch/', {
+            'requests': [{'path': path} for path in paths]
+        }, format='json')
+
+    def results(self, *paths):
+        response = self.batch(*paths)
+        self.assertEqual(response.status_code, 200)
+        return [
+            (item['path'], item['status'])
+            for item in response.json()['responses']
+        ]
+
+    def test_per_item_status_codes(self):
+        paths = (
+            '/api/tags/',
+            f'/api/recipes/{self.recipes[0].pk}/',
+            '/api/recipes/0/',
+            '/api/missing/',
+            '/api/recipes/download_shopping_cart/',
+            '/api/tags/',
+        )
+        self.assertEqual(self.results(*paths), list(zip(
+            paths, (200, 200, 404, 404, 401, 200)
+        )))
+        body = self.batch('/api/tags/').json()['responses'][0]['body']
+        self.assertEqual(body, self.client.get('/api/tags/').json())
+
+    def test_same_path_runs_once(self):
+        with mock.patch('api.views.execute',
+                        return_value=(200, {})) as execute:
+            self.batch('/api/tags/', '/api/tags/', '/api/ingredients/')
+        self.assertEqual(
+            [call.args[1] for call in execute.call_args_list],
+            ['/api/tags/', '/api/ingredients/']
+        )
+
+    def test_user_is_passed_to_sub_requests(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        with mock.patch.object(
+            TokenAuthentication, 'authenticate_credentials',
+            autospec=True,
+            side_effect=TokenAuthentication.authenticate_credentials
+        ) as authenticate:
+            response = self.batch(
+                '/api/users/me/', '/api/recipes/?is_in_shopping_cart=1'
+            )
+        # Токен проверяется один раз, для самого пакетного запроса.
+        self.assertEqual(authenticate.call_count, 1)
+        me, cart = response.json()['responses']
+        self.assertEqual((me['status'], me['body']['id']),
+                         (200, self.user.pk))
+        self.assertEqual(
+            [recipe['id'] for recipe in cart['body']['results']],
+            [self.recipes[0].pk]
+        )
+
+    def test_anonymous_sub_requests(self):
+        response = self.batch('/api/recipes/?is_in_shopping_cart=1')
+        cart, = response.json()['responses']
+        self.assertEqual(cart['status'], 200)
+        self.assertEqual(cart['body']['count'], 2)
+
+    def test_bad_sub_requests(self):
+        paths = (
+            '/admin/',
+            'http://example.com/api/tags/',
+            '/api/batch/',
+            '/api/recipes/export/',
+        )
+        # Выгрузка доступна только администратору и отдаётся потоком.
+        self.user.access_level = ADMIN
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        for path, code in self.results(*paths):
+            with self.subTest(path=path):
+                self.assertEqual(code, 400)
+
+    def test_invalid_batch(self):
+        for data in (
+            {},
+            {'requests': []},
+            {'requests': [{'path': '/api/tags/', 'method': 'POST'}]},
+            {'requests': [{}]},
+        ):
+            with self.subTest(data=data):
+                response = self.client.post('/api/batch/', data,
+                                            format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('requests', response.json())
+
+    def test_size_limit(self):
+        paths = [f'/api/tags/?page={number}'
+                 for number in range(BATCH_MAX_REQUESTS)]
+        self.assertEqual(len(self.results(*paths)), BATCH_MAX_REQUESTS)
+        response = self.batch(*paths, '/api/tags/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('requests', response.json())
+
+
+class MinuteThrottle(TokenBucketThrottle):
+    scope = 'test'
+    rate = '4/min'
+
+
+class ThrottledView(APIView):
+    permission_classes = ()
+    throttle_classes = (MinuteThrottle,)
+
+    def get(self, request):
+        return Response({})
+
+
+class ThrottleTests(TestCase):
+    """GCRA: 4 запроса в минуту, интервал 15 с, ведро на 4 запроса."""
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        patcher = mock.patch.object(MinuteThrottle, 'timer',
+                                    lambda throttle: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.user = create_user('reader')
+
+    def check(self, user=None, address='127.0.0.1'):
+        request = Request(self.factory.get('/', REMOTE_ADDR=address))
+        request.user = user or self.user
+        throttle = MinuteThrottle()
+        return throttle.allow_request(request, None), throttle.wait()
+
+    def test_burst(self):
+        for _ in range(4):
+            self.assertEqual(self.check(), (True, None))
+        self.assertEqual(self.check(), (False, 15.0))
+        self.now += 5
+        self.assertEqual(self.check(), (False, 10.0))
+
+    def test_steady_rate_refill(self):
+        for _ in range(4):
+            self.check()
+        for _ in range(10):
+            self.now += 15
+            self.assertEqual(self.check(), (True, None))
+            self.assertEqual(self.check(), (False, 15.0))
+        self.now += 60
+        for _ in range(4):
+            self.assertEqual(self.check(), (True, None))
+        self.assertFalse(self.check()[0])
+
+    def test_rejected_requests_do_not_drain_bucket(self):
+        for _ in range(4):
+            self.check()
+        for _ in range(20):
+            self.assertFalse(self.check()[0])
+        self.now += 15
+        self.assertTrue(self.check()[0])
+
+    def test_buckets_are_per_client(self):
+        other = create_user('other')
+        for _ in range(4):
+            self.check()
+        self.assertTrue(self.check(other)[0])
+        anonymous = AnonymousUser()
+        for _ in range(4):
+            self.assertTrue(self.check(anonymous, '10.0.0.1')[0])
+        self.assertFalse(self.check(anonymous, '10.0.0.1')[0])
+        self.assertTrue(self.check(anonymous, '10.0.0.2')[0])
+
+    def test_retry_after(self):
+        view = ThrottledView.as_view()
+        for _ in range(4):
+            self.assertEqual(view(self.factory.get('/')).status_code, 200)
+        self.now += 0.5
+        response = view(self.factory.get('/'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '15')
+
+
+class IdempotencyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast',
+                                     color='#E26C2D')
+        cls.ingredient = Ingredient.objects.create(name='Соль',
+                                                   measurement_unit='г')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        caches['idempotency'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        image = BytesIO()
+        Image.new('RGB', (2, 2), '#E26C2D').save(image, 'PNG')
+        self.recipe = {
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 5}],
+            'image': 'data:image/png;base64,'
+            + base64.b64encode(image.getvalue()).decode(),
+            'name': 'Рецепт',
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+
+    def post(self, data):
+        return self.client.post('/api/recipes/', data, format='json',
+                                HTTP_IDEMPOTENCY_KEY='create-recipe')
+
+    def test_same_body_is_replayed(self):
+        first = self.post(self.recipe)
+        second = self.post(dict(reversed(self.recipe.items())))
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_other_body_is_rejected(self):
+        self.assertEqual(self.post(self.recipe).status_code, 201)
+        response = self.post({**self.recipe, 'name': 'Другой рецепт'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+
+class UploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast',
+                                     color='#E26C2D')
+        cls.ingredient = Ingredient.objects.create(name='Соль',
+                                                   measurement_unit='г')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        image = BytesIO()
+        # Шум не сжимается: PNG 32×32 больше килобайта.
+        Image.frombytes('RGB', (32, 32), os.urandom(32 * 32 * 3)).save(
+            image, 'PNG'
+        )
+        self.png = image.getvalue()
+
+    def post(self, image, **data):
+        return self.client.post('/api/recipes/', {
+            'tags': [self.tag.pk],
+            'ingredients[0]id': self.ingredient.pk,
+            'ingredients[0]amount': 5,
+            'image': image,
+            'name': 'Рецепт',
+            'text': 'Текст',
+            'cooking_time': 10,
+            **data,
+        }, format='multipart')
+
+    def limit(self, owner, size):
+        patcher = mock.patch.object(owner, 'max_size', size)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_multipart_upload(self):
+        response = self.post(SimpleUploadedFile('photo.PNG', self.png))
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.image.name,
+                         hashed_name([self.png], '.png'))
+        self.assertEqual(recipe.image.read(), self.png)
+        self.assertEqual(
+            list(recipe.recipe_ingredients.values_list('amount', flat=True)),
+            [5]
+        )
+
+    def test_too_large_upload(self):
+        # Тело обрывает обработчик загрузки, до сериализатора не доходит.
+        self.limit(LimitedTemporaryFileUploadHandler, len(self.png) - 1)
+        response = self.post(SimpleUploadedFile('photo.png', self.png))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['detail'],
+                         ImageTooLarge.default_detail)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_too_large_base64(self):
+        self.limit(RecipeImageField, len(self.png) - 1)
+        response = self.client.post('/api/recipes/', {
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 5}],
+            'image': 'data:image/png;base64,'
+            + base64.b64encode(self.png).decode(),
+            'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_not_an_image(self):
+        for name, content in (('photo.png', b'<?php echo 1; ?>'),
+                              ('photo.png', b'')):
+            with self.subTest(content=content):
+                response = self.post(SimpleUploadedFile(name, content))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.json())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_handler_stops_at_limit(self):
+        handler = LimitedTemporaryFileUploadHandler()
+        handler.max_size = 10
+        handler.new_file('image', 'photo.png', 'image/png', 100)
+        path = handler.file.temporary_file_path()
+        handler.receive_data_chunk(b'x' * 10, 0)
+        with self.assertRaises(ImageTooLarge):
+            handler.receive_data_chunk(b'x', 10)
+        self.assertFalse(os.path.exists(path))
+
+    def test_field_checks_uploaded_size(self):
+        field = RecipeImageField()
+        field.max_size = 10
+        with self.assertRaises(ImageTooLarge):
+            field.to_internal_value(SimpleUploadedFile('photo.png', b'x' * 11))
+        with self.assertRaises(ImageTooLarge):
+            field.to_internal_value('A' * 16)
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user('admin')
+        cls.admin.access_level = ADMIN
+        cls.admin.save()
+        cls.user = create_user('reader')
+        tag = Tag.objects.create(name='Завтрак', slug='breakfast',
+                                 color='#E26C2D')
+        ingredient = Ingredient.objects.create(name='Соль',
+                                               measurement_unit='г')
+        for number in range(5):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {number}', text='Текст',
+                cooking_time=number + 1, image=f'recipe{number}.png'
+            )
+            recipe.tags.set([tag])
+            IngredientRecipe.objects.create(recipe=recipe,
+                                            ingredient=ingredient,
+                                            amount=number + 1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def parse(self, content):
+        return [json.loads(line) for line in content.splitlines()]
+
+    def assert_catalog(self, items):
+        self.assertEqual([item['id'] for item in items],
+                         list(Recipe.objects.order_by('pk').values_list(
+                             'pk', flat=True)))
+        self.assertEqual(items[0]['author'], {
+            'id': self.user.pk, 'username': 'reader'
+        })
+        self.assertEqual(items[0]['tags'][0]['slug'], 'breakfast')
+        self.assertEqual(items[0]['ingredients'][0]['amount'], 1)
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'recipes.jsonl')
+        call_command('export_recipes', '--output', path, '--chunk-size', '2')
+        with open(path, 'rb') as output:
+            content = output.read()
+        self.assertTrue(content.endswith(b'\n'))
+        self.assert_catalog(self.parse(content))
+        call_command('export_recipes', '--output', path + '.gz', '--gzip')
+        with gzip.open(path + '.gz', 'rb') as output:
+            self.assertEqual(output.read(), content)
+
+    def test_view_streams_in_chunks(self):
+        read = RecipeExportReader.read
+        with mock.patch('api.views.EXPORT_CHUNK_SIZE', 2), \
+                mock.patch.object(RecipeExportReader, 'read', autospec=True,
+                                  side_effect=read) as reader:
+            response = self.client.get('/api/recipes/export/')
+            self.assertTrue(response.streaming)
+            self.assertEqual(reader.call_count, 0)
+            lines = iter(response.streaming_content)
+            next(lines)
+            self.assertEqual(reader.call_count, 1)
+            content = b''.join(lines)
+        self.assertEqual([len(call.args[1]) for call in reader.call_args_list],
+                         [2, 2, 1])
+        self.assertEqual(len(content.splitlines()), 4)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.jsonl', response['Content-Disposition'])
+
+    def test_view_gzip(self):
+        plain = b''.join(
+            self.client.get('/api/recipes/export/').streaming_content
+        )
+        response = self.client.get('/api/recipes/export/?compress=gzip',
+                                   HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('recipes.jsonl.gz', response['Content-Disposition'])
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), plain
+        )
+        self.assert_catalog(self.parse(plain))
+
+    def test_permissions(self):
+        user = APIClient()
+        user.force_authenticate(self.user)
+        for client, status in ((APIClient(), 401), (user, 403)):
+            with self.subTest(status=status):
+                response = client.get('/api/recipes/export/')
+                self.assertEqual(response.status_code, status)
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class QueryBudgetTests(TestCase):
+    """Все маршруты api/urls.py укладываются в бюджеты запросов.
+
+    Команда check_query_budgets падает на превышении бюджета, повторах
+    (N+1) и ответах с ошибкой, middleware в режиме raise — на превышении
+    внутри запроса.
+    """
+
+    def test_all_routes_within_budget(self):
+        output = StringIO()
+        call_command('check_query_budgets', stdout=output, stderr=output)
+        self.assertIn('/api/recipes/', output.getvalue())
+
+    def test_overrun_raises(self):
+        with mock.patch.object(RecipeViewSet, 'query_budgets',
+                               {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                call_command('check_query_budgets', stdout=StringIO(),
+                             stderr=StringIO())
+
+
+@skipUnless(connection.vendor in SEQ_SCAN, 'EXPLAIN не поддерживается')
+class QueryPlanTests(TestCase):
+
+    def test_hot_queries_use_indexes(self):
+        output = StringIO()
+        call_command('check_query_plans', stdout=output)
+        self.assertIn('используют индексы', output.getvalue())
+
+    def test_full_scan_fails(self):
+        queries = [(
+            'рецепты по тексту',
+            Recipe.objects.filter(text='Текст').order_by(),
+            'recipes_recipe',
+        )]
+        with mock.patch(
+            'api.management.commands.check_query_plans.hot_queries',
+            return_value=queries
+        ):
+            with self.assertRaisesMessage(
+                CommandError, 'рецепты по тексту: полное сканирование'
+            ):
+                call_command('check_query_plans', stdout=StringIO())
+
+
+class IdempotencyCacheCheckTests(TestCase):
+
+    def caches(self, backend):
+        return {**settings.CACHES, 'idempotency': {'BACKEND': backend}}
+
+    def test_database_cache_is_default(self):
+        self.assertEqual(
+            settings.CACHES['idempotency']['BACKEND'],
+            'django.core.cache.backends.db.DatabaseCache'
+        )
+        self.assertEqual(check_idempotency_cache(None), [])
+
+    def test_process_local_cache_is_rejected(self):
+        locmem = 'django.core.cache.backends.locmem.LocMemCache'
+        with override_settings(DEBUG=False, CACHES=self.caches(locmem)):
+            self.assertEqual(
+                [error.id for error in check_idempotency_cache(None)],
+                ['api.E001']
+            )
+        with override_settings(DEBUG=True, CACHES=self.caches(locmem)):
+            self.assertEqual(check_idempotency_cache(None), [])
+
+
+class SlowQueryLogTests(TestCase):
+
+    def setUp(self):
+        caches['slow_queries'].clear()
+
+    def record(self, sql, duration, view='RecipeViewSet.list'):
+        token = slow_queries.current_request.set((view, '/api/recipes/'))
+        self.addCleanup(slow_queries.current_request.reset, token)
+        slow_queries.record(sql, duration, None)
+
+    def test_counts_per_query_and_view(self):
+        self.record('SELECT 1', 150.5)
+        self.record('SELECT 1', 250.25, 'RecipeViewSet.retrieve')
+        self.record('SELECT 2', 120)
+        first, second = slow_queries.get_entries()
+        self.assertEqual(
+            (first['sql'], first['count'], first['total'], first['max'],
+             first['average']),
+            ('SELECT 1', 2, 400.75, 250.25, 200.375)
+        )
+        self.assertEqual(first['views'], {'RecipeViewSet.list': 1,
+                                          'RecipeViewSet.retrieve': 1})
+        self.assertEqual((second['sql'], second['count']), ('SELECT 2', 1))
+
+    @mock.patch('api.slow_queries.SLOW_QUERY_LOG_SIZE', 2)
+    def test_oldest_query_is_evicted(self):
+        for sql in ('SELECT 1', 'SELECT 2', 'SELECT 1', 'SELECT 3'):
+            self.record(sql, 100)
+        self.assertEqual(
+            sorted(entry['sql'] for entry in slow_queries.get_entries()),
+            ['SELECT 2', 'SELECT 3']
+        )
+        self.record('SELECT 1', 100)
+        entries = {entry['sql']: entry for entry in slow_queries.get_entries()}
+        self.assertEqual(sorted(entries), ['SELECT 1', 'SELECT 3'])
+        self.assertEqual(entries['SELECT 1']['count'], 1)
+
+    def test_more_queries_than_fit(self):
+        cache = caches['slow_queries']
+        size = slow_queries.SLOW_QUERY_LOG_SIZE
+        for number in range(size + 50):
+            self.record(f'SELECT {number}', 100)
+        keys = len(cache._cache)
+        for number in range(size + 50, 2 * size + 100):
+            self.record(f'SELECT {number}', 100)
+        self.assertEqual(
+            sorted(entry['sql'] for entry in slow_queries.get_entries()),
+            sorted(f'SELECT {number}'
+                   for number in range(size + 100, 2 * size + 100))
+        )
+        # Ключи вытесненных записей удаляются, кэш не растёт и не
+        # вытесняет живые записи.
+        self.assertEqual(len(cache._cache), keys)
+        self.assertLess(keys, cache._max_entries)
+
+    @mock.patch('api.slow_queries.SLOW_QUERY_VIEWS_LIMIT', 2)
+    def test_views_limit(self):
+        for view in ('A.list', 'B.list', 'C.list', 'D.list', 'A.list'):
+            self.record('SELECT 1', 100, view)
+        self.assertEqual(slow_queries.get_entries()[0]['views'],
+                         {'A.list': 2, 'B.list': 1, '...': 2})
+
+    def test_clear(self):
+        self.record('SELECT 1', 100)
+        slow_queries.clear()
+        self.assertEqual(slow_queries.get_entries(), [])
+        self.assertEqual(len(caches['slow_queries']._cache), 1)
+        self.record('SELECT 1', 100)
+        self.assertEqual(slow_queries.get_entries()[0]['count'], 1)
+
+
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user('admin')
+        cls.admin.is_superuser = True
+        cls.admin.save()
+
+    def test_plain_request_skips_parsing(self):
+        middleware = ProfilingMiddleware(lambda request: None)
+        for query in ('', 'page=2', 'profiled=1'):
+            with self.subTest(query=query):
+                request = RequestFactory().get('/api/recipes/?' + query)
+                self.assertFalse(middleware.is_requested(request))
+                self.assertNotIn('headers', request.__dict__)
+                if 'profile' not in query:
+                    self.assertNotIn('GET', request.__dict__)
+        request = RequestFactory().get('/api/recipes/?page=2&profile')
+        self.assertTrue(middleware.is_requested(request))
+        request = RequestFactory().get('/api/recipes/', HTTP_X_PROFILE='1')
+        self.assertTrue(middleware.is_requested(request))
+
+    def test_profile_for_admin_only(self):
+        client = APIClient()
+        response = client.get('/api/tags/', HTTP_X_PROFILE='1')
+        self.assertIsInstance(response.json(), list)
+        client.force_login(self.admin)
+        profile = client.get('/api/tags/', HTTP_X_PROFILE='1').json()
+        self.assertEqual(profile['status'], 200)
+        self.assertIn('stacks', profile)
@@ -0,0 +1,95 @@
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+from foodgram.settings import IMAGE_UPLOAD_THROTTLE_MIN_SIZE
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Token bucket на атомарных операциях кэша (алгоритм GCRA).
+
+    В кэше хранится одно число: теоретическое время прихода следующего
+    запроса (TAT) в миллисекундах. Каждый запрос атомарно увеличивает его
+    на интервал num/period; запрос отклоняется, если TAT ушёл вперёд
+    больше чем на ёмкость ведра. Гонка возможна только при сбросе
+    простаивавшего ведра и пропускает не больше одного лишнего запроса.
+    """
+    cache_format = 'throttle_bucket_%(scope)s_%(ident)s'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def applies_to(self, request, view):
+        return True
+
+    def allow_request(self, request, view):
+        if self.rate is None or not self.applies_to(request, view):
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        interval = self.duration * 1000 // self.num_requests
+        capacity = self.duration * 1000
+        timeout = self.duration + 1
+        now = int(self.timer() * 1000)
+        if self.cache.add(key, now + interval, timeout):
+            return True
+        try:
+            tat = self.cache.incr(key, interval)
+        except ValueError:
+            self.cache.set(key, now + interval, timeout)
+            return True
+        if tat - interval < now:
+            self.cache.set(key, now + interval, timeout)
+            return True
+        if tat - now > capacity:
+            self.cache.decr(key, interval)
+            self.wait_seconds = (tat - now - capacity) / 1000
+            return False
+        self.cache.touch(key, timeout)
+        return True
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+class RecipeWriteThrottle(TokenBucketThrottle):
+    scope = 'recipe_write'
+
+    def applies_to(self, request, view):
+        return request.method not in SAFE_METHODS
+
+
+class ImageUploadThrottle(TokenBucketThrottle):
+    """Крупные тела запросов на запись рецепта считаются загрузкой фото."""
+    scope = 'image_upload'
+
+    def applies_to(self, request, view):
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        return (
+            request.method not in SAFE_METHODS
+            and length >= IMAGE_UPLOAD_THROTTLE_MIN_SIZE
+        )
+
+
+class ToggleThrottle(TokenBucketThrottle):
+    scope = 'toggle'
+
+
+class DownloadThrottle(TokenBucketThrottle):
+    scope = 'download'
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope, 'ident': self.get_ident(request)
+        }
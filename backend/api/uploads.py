@@ -0,0 +1,28 @@
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from foodgram.settings import RECIPE_IMAGE_MAX_SIZE
+
+
+class ImageTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = (
+        f'Изображение больше {RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)} МБ.'
+    )
+    default_code = 'image_too_large'
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файлы multipart-запроса сразу во временный файл на диске.
+
+    Загрузка обрывается, как только файл превысил RECIPE_IMAGE_MAX_SIZE,
+    не дожидаясь конца тела запроса.
+    """
+    max_size = RECIPE_IMAGE_MAX_SIZE
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.upload_interrupted()
+            raise ImageTooLarge()
+        return super().receive_data_chunk(raw_data, start)
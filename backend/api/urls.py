@@ -1,9 +1,13 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
+from djoser.views import TokenCreateView
 from rest_framework.routers import DefaultRouter
 
-from .views import (FavouriteViewSet, IngredientViewSet,
-                    RecipeViewSet, ShoppingCartViewSet,
-                    ShoppingListDownload, TagViewSet, UsersViewSet,)
+from .batch import BATCH_URL_NAME
+from .throttling import LoginThrottle
+from .views import (BatchView, EventTicketView, FavouriteViewSet,
+                    IngredientViewSet, RecipeExport, RecipeViewSet,
+                    ShoppingCartViewSet, ShoppingListDownload,
+                    SlowQueriesView, TagViewSet, UsersViewSet,)
 
 router = DefaultRouter()
 
@@ -24,11 +28,19 @@ router.register(
 
 
 urlpatterns = [
+    re_path(
+        r'^auth/token/login/?$',
+        TokenCreateView.as_view(throttle_classes=(LoginThrottle,))
+    ),
     path('auth/', include('djoser.urls.authtoken')),
     path(
         'recipes/download_shopping_cart/',
         ShoppingListDownload.as_view()
     ),
+    path('recipes/export/', RecipeExport.as_view()),
+    path('batch/', BatchView.as_view(), name=BATCH_URL_NAME),
+    path('slow-queries/', SlowQueriesView.as_view()),
+    path('events/ticket/', EventTicketView.as_view()),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
 ]
@@ -1,36 +1,70 @@
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, OuterRef, Prefetch,
+                              Value, prefetch_related_objects)
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.text import compress_sequence
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer
 from djoser.views import UserViewSet
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.filters import SearchFilter
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from recipes.models import (Favourites, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingCart, Tag,)
+from events.tickets import issue_ticket
+from foodgram.settings import EXPORT_CHUNK_SIZE
+from recipes.models import (INGREDIENT, RECIPE, TAG, AuthorSummary,
+                            Favourites, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingCartTotal, SimilarRecipe,
+                            Tag,)
+from recipes.storage import DirectUploadError
+from recipes.summary import rebuild as rebuild_summaries
 from users.models import Follow, User
 from users.validators import validate_username
 
+from . import slow_queries
+from .batch import execute
 from .filters import IngredientSearchFilter, RecipesFilter
+from .idempotency import idempotent
+from .mixins import (ConditionalGetMixin, DeltaSyncMixin, FastListMixin,
+                     SparseFieldsMixin)
 from .pagination import RecipesFollowsPagination
 from .permissions import (AdminPermission, CurrentUserPermission,
                           ReadOnlyPermission,)
-from .serializers import (FavouritesSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeSerializer,
+from .readers import (IngredientReader, RecipeExportReader, RecipeReader,
+                      TagReader, is_subscribed_flag)
+from .serializers import (AuthorSummarySerializer, BatchSerializer,
+                          DirectUploadFinalizeSerializer,
+                          DirectUploadSerializer, FavouritesSerializer,
+                          FollowSerializer, IngredientSerializer,
+                          RecipeFollowSerializer, RecipeSerializer,
                           RecipeWriteSerializer, ShoppingCartSerializer,
                           TagSerializer, UserFoodCreateSerializer,
                           UserFoodSerializer)
+from .throttling import (DownloadThrottle, ImageUploadThrottle,
+                         RecipeWriteThrottle, ToggleThrottle)
+from .uploads import LimitedTemporaryFileUploadHandler
 
 
-class UsersViewSet(UserViewSet):
+class UsersViewSet(SparseFieldsMixin, UserViewSet):
     pagination_class = RecipesFollowsPagination
     queryset = User.objects.all()
     permission_classes = (
         AdminPermission | ReadOnlyPermission,
     )
+    filter_backends = (SearchFilter,)
+    search_fields = ('^username', '^first_name', '^last_name')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in SAFE_METHODS:
+            queryset = queryset.annotate(
+                is_subscribed=is_subscribed_flag(self.request.user)
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -65,7 +99,9 @@ class UsersViewSet(UserViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=('post',), detail=True,
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            throttle_classes=(ToggleThrottle,))
+    @idempotent
     def subscribe(self, request, id=None):
         return self.__get_add_delete_follow(request, id)
 
@@ -73,38 +109,80 @@ class UsersViewSet(UserViewSet):
     def delete_subscribe(self, request, id=None):
         return self.__get_add_delete_follow(request, id)
 
+    @action(methods=('get',), detail=True,
+            permission_classes=(permissions.AllowAny,))
+    def summary(self, request, id=None):
+        author = get_object_or_404(User, id=id)
+        summary = AuthorSummary.objects.filter(author=author).first()
+        if summary is None:
+            rebuild_summaries([author.pk])
+            summary = AuthorSummary.objects.get(author=author)
+        return Response(AuthorSummarySerializer(summary).data)
+
     @action(methods=('get',), detail=False,
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(user=user).select_related(
+            'author'
+        ).order_by('author__username')
+        if self.is_field_requested('recipes_count'):
+            queryset = queryset.annotate(
+                recipes_count=Count('author__recipes')
+            )
+        if self.is_field_requested('recipes'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'author__recipes',
+                queryset=Recipe.objects.only(
+                    'id', 'name', 'cooking_time', 'image', 'author_id'
+                )
+            ))
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
-            pages, many=True, context={'request': request}
+            pages, many=True, context=self.get_serializer_context()
         )
         return self.get_paginated_response(serializer.data)
 
 
 class TagViewSet(
+    DeltaSyncMixin,
+    FastListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
 ):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    sync_kind = TAG
+    reader_class = TagReader
     permission_classes = (AdminPermission | ReadOnlyPermission,)
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(DeltaSyncMixin, FastListMixin,
+                        viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    sync_kind = INGREDIENT
+    reader_class = IngredientReader
     permission_classes = (AdminPermission | ReadOnlyPermission,)
     filter_backends = (IngredientSearchFilter,)
     search_fields = ('^name',)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SparseFieldsMixin, ConditionalGetMixin, DeltaSyncMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
+    sync_kind = RECIPE
+    reader_class = RecipeReader
+    throttle_classes = (RecipeWriteThrottle, ImageUploadThrottle)
+    # Запись тянет сигналы: журнал изменений, счётчики авторов, тренды,
+    # итоги списков покупок. Остальное — в QUERY_BUDGET_DEFAULT.
+    query_budgets = {
+        'create': 25,
+        'update': 26,
+        'partial_update': 26,
+        'destroy': 18,
+    }
     permission_classes = (
         AdminPermission | CurrentUserPermission | ReadOnlyPermission,
     )
@@ -112,11 +190,129 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipesFilter
 
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [LimitedTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
         return RecipeWriteSerializer
 
+    def annotate_user_flag(self, queryset, name, model, recipe_field):
+        user = self.request.user
+        if not user.is_authenticated:
+            flag = Value(False, output_field=BooleanField())
+        else:
+            flag = Exists(model.objects.filter(
+                user=user, **{recipe_field: OuterRef('pk')}
+            ))
+        return queryset.annotate(**{name: flag})
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        if self.is_field_requested('is_favorited'):
+            queryset = self.annotate_user_flag(
+                queryset, 'is_favorited', Favourites, 'favorite_recipe'
+            )
+        if self.is_field_requested('is_in_shopping_cart'):
+            queryset = self.annotate_user_flag(
+                queryset, 'is_in_shopping_cart', ShoppingCart, 'recipe'
+            )
+        return queryset
+
+    def get_prefetch_lookups(self):
+        lookups = []
+        if self.is_field_expanded('author'):
+            lookups.append(Prefetch('author', queryset=User.objects.annotate(
+                is_subscribed=is_subscribed_flag(self.request.user)
+            )))
+        if self.is_field_requested('tags'):
+            lookups.append('tags')
+        if self.is_field_expanded('ingredients'):
+            lookups.append(Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ))
+        elif self.is_field_requested('ingredients'):
+            lookups.append('ingredients')
+        return lookups
+
+    def get_viewer_state(self, ids):
+        # is_subscribed, is_favorited и is_in_shopping_cart зависят от
+        # зрителя, а его подписки и клики updated_at рецепта не сдвигают.
+        user = self.request.user
+        if not user.is_authenticated:
+            return None
+        queryset = Recipe.objects.filter(pk__in=ids).order_by('pk')
+        flags = []
+        if self.is_field_expanded('author'):
+            queryset = queryset.annotate(
+                is_subscribed=is_subscribed_flag(user, 'author')
+            )
+            flags.append('is_subscribed')
+        if self.is_field_requested('is_favorited'):
+            queryset = self.annotate_user_flag(
+                queryset, 'is_favorited', Favourites, 'favorite_recipe'
+            )
+            flags.append('is_favorited')
+        if self.is_field_requested('is_in_shopping_cart'):
+            queryset = self.annotate_user_flag(
+                queryset, 'is_in_shopping_cart', ShoppingCart, 'recipe'
+            )
+            flags.append('is_in_shopping_cart')
+        if not flags:
+            return None
+        return list(queryset.values_list('pk', *flags))
+
+    def get_reader(self):
+        if (
+            self.get_requested_fields() is not None
+            or self.get_expanded_fields() is not None
+        ):
+            return None
+        return self.reader_class(self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        if self.is_sync_request():
+            return self.sync()
+        queryset = self.filter_queryset(self.get_queryset())
+        reader = self.get_reader()
+        if reader is not None:
+            queryset = reader.get_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if reader is not None:
+            ids = [row['id'] for row in page]
+        else:
+            ids = [recipe.pk for recipe in page]
+        etag, last_modified = self.get_validators(
+            ids, self.paginator.page.paginator.count, many=True
+        )
+        not_modified = self.get_not_modified(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        if reader is not None:
+            data = reader.read(page)
+        else:
+            prefetch_related_objects(page, *self.get_prefetch_lookups())
+            data = self.get_serializer(page, many=True).data
+        response = self.get_paginated_response(data)
+        return self.set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_validators([instance.pk])
+        not_modified = self.get_not_modified(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        prefetch_related_objects([instance], *self.get_prefetch_lookups())
+        serializer = self.get_serializer(instance)
+        response = Response(serializer.data)
+        return self.set_validators(response, etag, last_modified)
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -149,6 +345,70 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_image_storage(self):
+        storage = Recipe._meta.get_field('image').storage
+        if not hasattr(storage, 'create_upload'):
+            return None
+        return storage
+
+    @action(methods=('post',), detail=False,
+            permission_classes=(IsAuthenticated,))
+    def uploads(self, request):
+        """Presigned POST для загрузки изображения напрямую в S3."""
+        storage = self.get_image_storage()
+        if storage is None:
+            return Response(
+                {'errors': 'Прямая загрузка изображений не настроена.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = DirectUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            storage.create_upload(
+                request.user.pk, serializer.validated_data['content_type']
+            ),
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(methods=('post',), detail=True)
+    def image(self, request, pk=None):
+        """Делает загруженный напрямую файл изображением рецепта."""
+        recipe = self.get_object()
+        storage = self.get_image_storage()
+        if storage is None:
+            return Response(
+                {'errors': 'Прямая загрузка изображений не настроена.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = DirectUploadFinalizeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            recipe.image = storage.finalize_upload(
+                request.user.pk, serializer.validated_data['upload']
+            )
+        except DirectUploadError as error:
+            return Response(
+                {'errors': str(error)}, status=status.HTTP_400_BAD_REQUEST
+            )
+        recipe.save()
+        serializer = RecipeSerializer(
+            instance=recipe, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(methods=('get',), detail=True)
+    def similar(self, request, pk=None):
+        recipe = self.get_object()
+        similar_recipes = SimilarRecipe.objects.filter(
+            recipe=recipe
+        ).select_related('similar')
+        serializer = RecipeFollowSerializer(
+            [item.similar for item in similar_recipes],
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
+
 
 class FavouriteViewSet(
     mixins.CreateModelMixin,
@@ -157,6 +417,7 @@ class FavouriteViewSet(
 ):
     permission_classes = [IsAuthenticated]
     serializer_class = FavouritesSerializer
+    throttle_classes = (ToggleThrottle,)
 
     def get_queryset(self, obj):
         user = self.context.get('request').user
@@ -167,14 +428,24 @@ class FavouriteViewSet(
         context['recipe_id'] = self.kwargs.get('recipe_id')
         return context
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         recipe_id = self.kwargs.get('recipe_id')
         favorite_recipe = get_object_or_404(Recipe, id=recipe_id)
-        Favourites.objects.create(
+        if Favourites.objects.filter(
+            user=request.user, favorite_recipe=favorite_recipe
+        ).exists():
+            return Response(
+                {'errors': 'Рецепт уже в избранном.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        favourite = Favourites.objects.create(
             user=request.user,
             favorite_recipe=favorite_recipe
         )
-        serializer = FavouritesSerializer(favorite_recipe)
+        serializer = FavouritesSerializer(
+            favourite, context=self.get_serializer_context()
+        )
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
@@ -193,21 +464,35 @@ class ShoppingCartViewSet(
 ):
     permission_classes = [permissions.IsAuthenticated]
     queryset = ShoppingCart.objects.all()
+    throttle_classes = (ToggleThrottle,)
+    query_budgets = {'create': 12}
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['recipe_id'] = self.kwargs.get('recipe_id')
         return context
 
+    @idempotent
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         recipe_id = self.kwargs.get('recipe_id')
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        ShoppingCart.objects.create(
+        if ShoppingCart.objects.filter(
+            user=request.user, recipe=recipe
+        ).exists():
+            return Response(
+                {'errors': 'Рецепт уже в списке покупок.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        shopping_cart = ShoppingCart.objects.create(
             user=request.user,
             recipe=recipe)
-        serializer = ShoppingCartSerializer(recipe)
+        serializer = ShoppingCartSerializer(
+            shopping_cart, context=self.get_serializer_context()
+        )
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, *args, **kwargs):
         recipe_id = self.kwargs.get('recipe_id')
         recipe = get_object_or_404(Recipe, id=recipe_id)
@@ -219,9 +504,14 @@ class ShoppingCartViewSet(
 
 class ShoppingListDownload(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = (DownloadThrottle,)
 
     def get_queryset(self):
-        return self.request.user.shopping_cart.all()
+        return ShoppingCartTotal.objects.filter(
+            user=self.request.user
+        ).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
 
     def get(self, request):
         response = HttpResponse(content_type='text/plain')
@@ -231,21 +521,84 @@ class ShoppingListDownload(APIView):
         return self._create_shopping_list(self.get_queryset(), response)
 
     def _create_shopping_list(self, queryset, response):
-        ingredients_and_amount = {}
         response.write('Список продуктов:\n')
-        for item in queryset:
-            ingredients_recipe = IngredientRecipe.objects.filter(
-                recipe=item.recipe
-            )
-            for row in ingredients_recipe:
-                ingredient = row.ingredient
-                amount = row.amount
-                if ingredient in ingredients_and_amount:
-                    ingredients_and_amount[ingredient] += amount
-                else:
-                    ingredients_and_amount[ingredient] = amount
-        for ingredient, amount in ingredients_and_amount.items():
-            response.write(f'\n{ingredient.name}')
-            response.write((f' ({ingredient.measurement_unit})'))
+        for name, measurement_unit, amount in queryset:
+            response.write(f'\n{name}')
+            response.write((f' ({measurement_unit})'))
             response.write(f' - {amount}')
         return response
+
+
+class RecipeExport(APIView):
+    """Потоковая выгрузка каталога в JSON Lines; ?compress=gzip — в .gz."""
+    permission_classes = (AdminPermission,)
+    throttle_classes = (DownloadThrottle,)
+
+    def get(self, request):
+        reader = RecipeExportReader({'request': request})
+        lines = reader.lines(Recipe.objects.all(), EXPORT_CHUNK_SIZE)
+        if request.query_params.get('compress') == 'gzip':
+            response = StreamingHttpResponse(
+                compress_sequence(lines), content_type='application/gzip'
+            )
+            filename = 'recipes.jsonl.gz'
+        else:
+            response = StreamingHttpResponse(
+                lines, content_type='application/x-ndjson'
+            )
+            filename = 'recipes.jsonl'
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"'
+        )
+        return response
+
+
+class BatchView(APIView):
+    """Несколько GET-запросов к API за один запрос.
+
+    Вложенные запросы выполняются по очереди от имени того же
+    пользователя, без повторной аутентификации и middleware; одинаковые
+    пути выполняются один раз.
+    """
+    permission_classes = (permissions.AllowAny,)
+    # Запросы вложенных view складываются, общий бюджет не имеет смысла.
+    query_budgets = {'post': None}
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = {}
+        responses = []
+        for item in serializer.validated_data['requests']:
+            path = item['path']
+            if path not in results:
+                results[path] = execute(request, path)
+            code, body = results[path]
+            responses.append({'path': path, 'status': code, 'body': body})
+        return Response({'responses': responses})
+
+
+class EventTicketView(APIView):
+    """Одноразовый билет на поток /api/events/?ticket= для EventSource."""
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        return Response(
+            {'ticket': issue_ticket(request.user.pk)},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class SlowQueriesView(APIView):
+    """Журнал медленных запросов к базе по формам запросов.
+
+    DELETE очищает журнал. С locmem у каждого процесса свой журнал.
+    """
+    permission_classes = (AdminPermission,)
+
+    def get(self, request):
+        return Response(slow_queries.get_entries())
+
+    def delete(self, request):
+        slow_queries.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from foodgram.settings import (EVENTS_BROKER, EVENTS_CHANNEL,
+                               EVENTS_RECONNECT_DELAY,
+                               EVENTS_RECONNECT_MAX_DELAY)
+
+logger = logging.getLogger(__name__)
+
+# Событие пользователя -> (список рецептов, добавить или убрать).
+WATCH_EVENTS = {
+    'cart_added': ('cart', True),
+    'cart_removed': ('cart', False),
+    'favorited': ('favorites', True),
+    'unfavorited': ('favorites', False),
+}
+
+
+class Hub:
+    """Очереди открытых SSE-соединений процесса по id пользователя.
+
+    Соединение — это asyncio.Queue и одна корутина, поэтому тысячи
+    простаивающих подписчиков почти ничего не стоят. dispatch можно
+    вызывать из любого потока.
+
+    Для событий о рецепте хранятся списки покупок и избранное
+    подключённых пользователей: они загружаются при подключении и
+    обновляются их же событиями, поэтому отправителю не нужно искать
+    получателей в базе.
+    """
+
+    def __init__(self):
+        self.queues = defaultdict(set)
+        self.watched = {}
+        self.watchers = defaultdict(set)
+        self.loop = None
+
+    def subscribe(self, user_id):
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        self.queues[user_id].add(queue)
+        self.watched.setdefault(user_id, {'cart': set(), 'favorites': set()})
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.queues.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.queues[user_id]
+                for recipes in self.watched.pop(user_id).values():
+                    for recipe_id in recipes:
+                        self._update_watcher(user_id, recipe_id)
+
+    def watch(self, user_id, watched):
+        """Добавляет загруженные из базы рецепты {список: id} пользователя."""
+        for name, recipes in watched.items():
+            self.watched[user_id][name].update(recipes)
+            for recipe_id in recipes:
+                self._update_watcher(user_id, recipe_id)
+
+    def _update_watcher(self, user_id, recipe_id):
+        watched = self.watched.get(user_id, {})
+        if any(recipe_id in recipes for recipes in watched.values()):
+            self.watchers[recipe_id].add(user_id)
+            return
+        users = self.watchers.get(recipe_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.watchers[recipe_id]
+
+    def _deliver(self, user_id, event):
+        if user_id in self.watched and event['type'] in WATCH_EVENTS:
+            name, add = WATCH_EVENTS[event['type']]
+            recipes = self.watched[user_id][name]
+            if add:
+                recipes.add(event['recipe'])
+            else:
+                recipes.discard(event['recipe'])
+            self._update_watcher(user_id, event['recipe'])
+        for queue in self.queues.get(user_id, ()):
+            queue.put_nowait(event)
+
+    def _deliver_recipe(self, recipe_id, author_id, event):
+        for user_id in self.watchers.get(recipe_id, set()) | {author_id}:
+            self._deliver(user_id, event)
+
+    def _call(self, callback, *args):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def dispatch(self, user_id, event):
+        if self.loop is None or user_id not in self.queues:
+            return
+        self._call(self._deliver, user_id, event)
+
+    def dispatch_recipe(self, recipe_id, author_id, event):
+        """Событие автору рецепта и тем, у кого он в списках."""
+        if self.loop is None or not self.queues:
+            return
+        self._call(self._deliver_recipe, recipe_id, author_id, event)
+
+
+hub = Hub()
+
+
+class LocalBroker:
+    """Доставка внутри процесса: для разработки и одного ASGI-процесса."""
+
+    def publish(self, user_ids, event):
+        for user_id in user_ids:
+            hub.dispatch(user_id, event)
+
+    def publish_recipe(self, recipe_id, author_id, event):
+        hub.dispatch_recipe(recipe_id, author_id, event)
+
+    def start(self):
+        pass
+
+
+class PostgresBroker:
+    """Доставка между процессами через LISTEN/NOTIFY PostgreSQL.
+
+    Каждое событие — один NOTIFY с JSON до 8000 байт, поэтому события
+    содержат только id. Слушатель — отдельное соединение psycopg2,
+    которое читается из цикла событий через add_reader. Потерянное
+    соединение восстанавливается с паузами от EVENTS_RECONNECT_DELAY до
+    EVENTS_RECONNECT_MAX_DELAY; события за время разрыва теряются.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.listener = None
+        self.fileno = None
+        self.delay = EVENTS_RECONNECT_DELAY
+
+    def notify(self, message):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)',
+                           (EVENTS_CHANNEL, json.dumps(message)))
+
+    def publish(self, user_ids, event):
+        self.notify({'users': list(user_ids), 'event': event})
+
+    def publish_recipe(self, recipe_id, author_id, event):
+        self.notify({'recipe': recipe_id, 'author': author_id,
+                     'event': event})
+
+    def start(self):
+        with self.lock:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.get_running_loop()
+        self.connect()
+
+    def connect(self):
+        import psycopg2
+
+        try:
+            listener = psycopg2.connect(**connection.get_connection_params())
+            listener.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+            )
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {EVENTS_CHANNEL}')
+        except psycopg2.Error:
+            logger.warning(
+                'Не удалось подключиться для LISTEN, повтор через %s с',
+                self.delay, exc_info=True
+            )
+            self.loop.call_later(self.delay, self.connect)
+            self.delay = min(self.delay * 2, EVENTS_RECONNECT_MAX_DELAY)
+            return
+        self.listener = listener
+        self.fileno = listener.fileno()
+        self.delay = EVENTS_RECONNECT_DELAY
+        self.loop.add_reader(self.fileno, self.receive)
+
+    def disconnect(self):
+        import psycopg2
+
+        # fileno() закрытого соединения недоступен, поэтому он сохранён.
+        self.loop.remove_reader(self.fileno)
+        try:
+            self.listener.close()
+        except psycopg2.Error:
+            pass
+        self.listener = self.fileno = None
+
+    def receive(self):
+        import psycopg2
+
+        try:
+            self.listener.poll()
+        except psycopg2.Error:
+            logger.warning('Соединение LISTEN потеряно', exc_info=True)
+            self.disconnect()
+            self.connect()
+            return
+        while self.listener.notifies:
+            notify = self.listener.notifies.pop(0)
+            try:
+                message = json.loads(notify.payload)
+            except ValueError:
+                logger.warning('Некорректное событие: %s', notify.payload)
+                continue
+            if 'recipe' in message:
+                hub.dispatch_recipe(message['recipe'], message['author'],
+                                    message['event'])
+                continue
+            for user_id in message['users']:
+                hub.dispatch(user_id, message['event'])
+
+
+broker = PostgresBroker() if EVENTS_BROKER == 'postgres' else LocalBroker()
+
+
+def publish(user_ids, event_type, **data):
+    """Отправляет событие пользователям после коммита транзакции."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    event = {'type': event_type, **data}
+    transaction.on_commit(lambda: broker.publish(user_ids, event))
+
+
+def publish_recipe(recipe, event_type):
+    """Отправляет событие о рецепте после коммита транзакции.
+
+    Получателей — автора и тех, у кого рецепт в списке покупок или
+    избранном, — находит Hub процесса потока, запросов к базе нет.
+    """
+    event = {'type': event_type, 'recipe': recipe.pk}
+    recipe_id, author_id = recipe.pk, recipe.author_id
+    transaction.on_commit(
+        lambda: broker.publish_recipe(recipe_id, author_id, event)
+    )
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Favourites, Recipe, ShoppingCart
+
+from .broker import publish, publish_recipe
+
+
+@receiver(post_save, sender=ShoppingCart)
+def publish_cart_added(sender, instance, created, **kwargs):
+    if created:
+        publish([instance.user_id], 'cart_added', recipe=instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def publish_cart_removed(sender, instance, **kwargs):
+    publish([instance.user_id], 'cart_removed', recipe=instance.recipe_id)
+
+
+@receiver(post_save, sender=Favourites)
+def publish_favorited(sender, instance, created, **kwargs):
+    if created:
+        publish([instance.user_id], 'favorited',
+                recipe=instance.favorite_recipe_id)
+
+
+@receiver(post_delete, sender=Favourites)
+def publish_unfavorited(sender, instance, **kwargs):
+    publish([instance.user_id], 'unfavorited',
+            recipe=instance.favorite_recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def publish_recipe_updated(sender, instance, created, **kwargs):
+    if not created:
+        publish_recipe(instance, 'recipe_updated')
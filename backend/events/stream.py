@@ -0,0 +1,136 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from rest_framework.authtoken.models import Token
+
+from foodgram.settings import EVENTS_KEEPALIVE
+from recipes.models import Favourites, ShoppingCart
+from users.models import User
+
+from .broker import broker, hub
+from .tickets import redeem_ticket
+
+
+def get_token(scope):
+    """Токен из заголовка Authorization: Token <key>."""
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin-1').partition(' ')
+            if keyword == 'Token' and key:
+                return key.strip()
+    return None
+
+
+def get_ticket(scope):
+    """Одноразовый билет из ?ticket= для EventSource."""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return (query.get('ticket') or [None])[0]
+
+
+def authenticate(scope):
+    """id активного пользователя по токену или билету, иначе None."""
+    key = get_token(scope)
+    if key:
+        return Token.objects.filter(
+            key=key, user__is_active=True
+        ).values_list('user_id', flat=True).first()
+    ticket = get_ticket(scope)
+    if ticket:
+        user_id = redeem_ticket(ticket)
+        if (
+            user_id is not None
+            and User.objects.filter(pk=user_id, is_active=True).exists()
+        ):
+            return user_id
+    return None
+
+
+@sync_to_async
+def get_watched(user_id):
+    return {
+        'cart': set(ShoppingCart.objects.filter(
+            user_id=user_id
+        ).values_list('recipe_id', flat=True)),
+        'favorites': set(Favourites.objects.filter(
+            user_id=user_id
+        ).values_list('favorite_recipe_id', flat=True)),
+    }
+
+
+def format_event(event):
+    return (
+        f'event: {event["type"]}\n'
+        f'data: {json.dumps(event, separators=(",", ":"))}\n\n'
+    ).encode()
+
+
+async def respond(send, status, body=b''):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def events_app(scope, receive, send):
+    """ASGI-приложение /api/events/: поток событий текущего пользователя.
+
+    Обходит Django: в 3.2 StreamingHttpResponse под ASGI итерируется
+    синхронно и держал бы цикл событий.
+    """
+    user_id = await sync_to_async(authenticate)(scope)
+    if user_id is None:
+        await respond(send, 401, json.dumps(
+            {'detail': 'Учетные данные не были предоставлены.'}
+        ).encode())
+        return
+    broker.start()
+    queue = hub.subscribe(user_id)
+    try:
+        # Списки загружаются после подписки, чтобы не пропустить их
+        # изменения между запросом и подпиской.
+        hub.watch(user_id, await get_watched(user_id))
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': b'retry: 3000\n\n',
+            'more_body': True,
+        })
+        disconnect = asyncio.ensure_future(wait_disconnect(receive))
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                (get, disconnect), timeout=EVENTS_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                get.cancel()
+                break
+            if get in done:
+                body = format_event(get.result())
+            else:
+                get.cancel()
+                body = b': keepalive\n\n'
+            await send({
+                'type': 'http.response.body',
+                'body': body,
+                'more_body': True,
+            })
+    finally:
+        hub.unsubscribe(user_id, queue)
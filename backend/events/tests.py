@@ -0,0 +1,178 @@
+import asyncio
+import time
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import User
+
+from .broker import Hub, PostgresBroker, hub
+from .signals import publish_recipe_updated
+from .stream import authenticate
+from .tickets import issue_ticket, redeem_ticket
+
+
+def create_user(username):
+    return User.objects.create(
+        email=f'{username}@foodgram.test', username=username,
+        first_name='Имя', last_name='Фамилия'
+    )
+
+
+def run(loop, coroutine):
+    return loop.run_until_complete(coroutine)
+
+
+class TicketTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('reader')
+
+    def get_user_id(self, query):
+        return authenticate({'headers': [], 'query_string': query.encode()})
+
+    def test_ticket_is_single_use(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ticket = client.post('/api/events/ticket/').json()['ticket']
+        self.assertEqual(self.get_user_id(f'ticket={ticket}'), self.user.pk)
+        self.assertIsNone(self.get_user_id(f'ticket={ticket}'))
+
+    def test_expired_or_forged_ticket(self):
+        ticket = issue_ticket(self.user.pk)
+        with mock.patch('events.tickets.EVENTS_TICKET_MAX_AGE', -1):
+            self.assertIsNone(redeem_ticket(ticket))
+        self.assertIsNone(redeem_ticket(ticket + 'x'))
+        self.assertIsNone(redeem_ticket('token'))
+
+    def test_token_in_query_is_ignored(self):
+        token = Token.objects.create(user=self.user)
+        self.assertIsNone(self.get_user_id(f'token={token.key}'))
+
+    def test_anonymous_cannot_get_ticket(self):
+        self.assertEqual(
+            APIClient().post('/api/events/ticket/').status_code, 401
+        )
+
+
+class HubTests(TestCase):
+
+    def setUp(self):
+        self.hub = Hub()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    async def subscribe(self, user_id, watched):
+        queue = self.hub.subscribe(user_id)
+        self.hub.watch(user_id, watched)
+        return queue
+
+    def drain(self, queue):
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait()['type'])
+        return events
+
+    async def scenario(self):
+        queue = await self.subscribe(1, {'cart': {10}, 'favorites': set()})
+        other = await self.subscribe(2, {'cart': set(), 'favorites': set()})
+        self.hub.dispatch_recipe(10, 3, {'type': 'recipe_updated'})
+        self.hub.dispatch(1, {'type': 'favorited', 'recipe': 11})
+        self.hub.dispatch_recipe(11, 3, {'type': 'recipe_updated'})
+        self.hub.dispatch(1, {'type': 'cart_removed', 'recipe': 10})
+        self.hub.dispatch_recipe(10, 2, {'type': 'recipe_updated'})
+        return queue, other
+
+    def test_recipe_events_follow_user_lists(self):
+        queue, other = run(self.loop, self.scenario())
+        self.assertEqual(self.drain(queue), [
+            'recipe_updated', 'favorited', 'recipe_updated', 'cart_removed'
+        ])
+        self.assertEqual(self.drain(other), ['recipe_updated'])
+        self.hub.unsubscribe(1, queue)
+        self.hub.unsubscribe(2, other)
+        self.assertEqual(dict(self.hub.watchers), {})
+
+    def test_recipe_update_needs_no_queries(self):
+        recipe = Recipe.objects.create(
+            author=create_user('author'), name='Рецепт', text='Текст',
+            cooking_time=5, image='recipe.png'
+        )
+        with mock.patch.object(hub, 'dispatch_recipe') as dispatch:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertNumQueries(0):
+                    publish_recipe_updated(Recipe, recipe, created=False)
+        dispatch.assert_called_once_with(
+            recipe.pk, recipe.author_id,
+            {'type': 'recipe_updated', 'recipe': recipe.pk}
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY')
+class PostgresBrokerTests(TransactionTestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.broker = PostgresBroker()
+        self.addCleanup(self.close)
+
+    def close(self):
+        if self.broker.listener is not None:
+            self.broker.disconnect()
+        self.loop.close()
+
+    async def start(self):
+        self.broker.start()
+        return hub.subscribe(1)
+
+    async def wait(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                raise AssertionError('Не дождались условия')
+            await asyncio.sleep(0.01)
+
+    def receive(self, queue):
+        self.broker.publish([1], {'type': 'ping'})
+        return run(self.loop, asyncio.wait_for(queue.get(), 5))
+
+    def test_reconnects_after_connection_loss(self):
+        queue = run(self.loop, self.start())
+        self.addCleanup(hub.unsubscribe, 1, queue)
+        pid = self.broker.listener.get_backend_pid()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', (pid,))
+        with self.assertLogs('events.broker', 'WARNING'):
+            run(self.loop, self.wait(
+                lambda: self.broker.listener is not None
+                and self.broker.listener.get_backend_pid() != pid
+            ))
+        self.assertEqual(self.receive(queue), {'type': 'ping'})
+
+    def test_retries_with_backoff(self):
+        import psycopg2
+
+        connect = psycopg2.connect
+        with mock.patch('events.broker.EVENTS_RECONNECT_DELAY', 0.01), \
+                mock.patch('events.broker.EVENTS_RECONNECT_MAX_DELAY', 0.04):
+            self.broker.delay = 0.01
+            with mock.patch('psycopg2.connect',
+                            side_effect=psycopg2.OperationalError) as failed, \
+                    self.assertLogs('events.broker', 'WARNING'):
+                queue = run(self.loop, self.start())
+                self.addCleanup(hub.unsubscribe, 1, queue)
+                run(self.loop, self.wait(lambda: failed.call_count >= 4))
+            self.assertIsNone(self.broker.listener)
+            self.assertEqual(self.broker.delay, 0.04)
+            with mock.patch('psycopg2.connect', side_effect=connect):
+                run(self.loop, self.wait(
+                    lambda: self.broker.listener is not None
+                ))
+        self.assertEqual(self.broker.delay, 0.01)
+        self.assertEqual(self.receive(queue), {'type': 'ping'})
@@ -0,0 +1,37 @@
+import secrets
+
+from django.core import signing
+from django.core.cache import cache
+
+from foodgram.settings import EVENTS_TICKET_MAX_AGE
+
+TICKET_SALT = 'events.ticket'
+
+
+def issue_ticket(user_id):
+    """Одноразовый билет на поток событий для ?ticket=.
+
+    EventSource не передаёт заголовок Authorization, а постоянный токен
+    в адресе оседает в журналах прокси и истории браузера.
+    """
+    return signing.dumps(
+        [user_id, secrets.token_urlsafe(16)], salt=TICKET_SALT
+    )
+
+
+def redeem_ticket(ticket):
+    """id пользователя по билету; None для просроченного, поддельного
+    или уже использованного.
+
+    Повторное использование отсекает cache.add, поэтому процессам нужен
+    общий кэш (CACHE_BACKEND, CACHE_LOCATION).
+    """
+    try:
+        user_id, nonce = signing.loads(
+            ticket, salt=TICKET_SALT, max_age=EVENTS_TICKET_MAX_AGE
+        )
+    except (signing.BadSignature, ValueError):
+        return None
+    if not cache.add(f'events_ticket:{nonce}', True, EVENTS_TICKET_MAX_AGE):
+        return None
+    return user_id
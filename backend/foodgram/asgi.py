@@ -0,0 +1,26 @@
+"""
+ASGI config for foodgram project.
+
+Поток событий /api/events/ обслуживается отдельным ASGI-приложением,
+всё остальное — Django.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+django_application = get_asgi_application()
+
+from events.stream import events_app  # noqa: E402
+
+EVENTS_PATH = '/api/events/'
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].rstrip('/') == (
+        EVENTS_PATH.rstrip('/')
+    ):
+        return await events_app(scope, receive, send)
+    return await django_application(scope, receive, send)
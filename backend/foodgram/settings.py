@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from datetime import datetime, timezone
 
 from dotenv import load_dotenv
 
@@ -27,7 +28,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = os.getenv('SECRET_KEY', default='key')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', default='False') == 'True'
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', default='*')
 
@@ -49,16 +50,22 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'tasks.apps.TasksConfig',
+    'events.apps.EventsConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.QueryBudgetMiddleware',
+    'api.middleware.SlowQueryMiddleware',
+    'api.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -96,6 +103,43 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    # Ответы на запросы с Idempotency-Key. Повтор может попасть в другой
+    # процесс gunicorn, поэтому кэш общий: по умолчанию таблица в базе
+    # (её создаёт миграция api), иначе Redis или Memcached из
+    # CACHE_BACKEND. Без DEBUG кэш процесса не допускает проверка api.E001.
+    'idempotency': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='idempotency_cache'),
+        'KEY_PREFIX': 'idempotency',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Журнал медленных запросов (api/slow_queries.py): ключи по формам
+    # запросов, MAX_ENTRIES задаётся ниже по SLOW_QUERY_LOG_SIZE.
+    'slow_queries': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='slow_queries'),
+        'KEY_PREFIX': 'slow_queries',
+        'TIMEOUT': None,
+    },
+}
+
 AUTH_USER_MODEL = 'users.User'
 
 # Password validation
@@ -140,13 +184,49 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# С USE_S3=True медиафайлы хранятся в S3-совместимом хранилище, а
+# AWS_S3_CUSTOM_DOMAIN задаёт домен CDN для ссылок на них.
+USE_S3 = os.getenv('USE_S3', default='False') == 'True'
+if USE_S3:
+    DEFAULT_FILE_STORAGE = 'recipes.s3.S3ContentAddressedStorage'
+else:
+    DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME', default='')
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL')
+AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME')
+AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
+AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
+AWS_S3_CUSTOM_DOMAIN = os.getenv('AWS_S3_CUSTOM_DOMAIN')
+AWS_DEFAULT_ACL = None
+AWS_QUERYSTRING_AUTH = False
+# Имена файлов зависят от содержимого, поэтому файлы не меняются.
+AWS_S3_OBJECT_PARAMETERS = {
+    'CacheControl': 'public, max-age=31536000, immutable',
+}
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'recipe_write': '30/min',
+        'image_upload': '30/hour',
+        'toggle': '120/min',
+        'download': '10/min',
+        'login': '10/min',
+    },
 }
 
 DJOSER = {
@@ -173,3 +253,84 @@ MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 32000
 MIN_AMOUNT = 1
 MAX_AMOUNT = 32000
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_RECIPES_METRIC = 'jaccard'
+SIMILAR_LSH_MIN_RECIPES = 5000
+SIMILAR_MINHASH_PERMUTATIONS = 128
+SIMILAR_LSH_BANDS = 32
+# Веса событий отсчитываются от TRENDING_EPOCH. Очки хранятся как
+# логарифм и растут линейно, поэтому эпоху переносить не нужно; если
+# перенести, команда trending_scores пересчитает всё заново.
+TRENDING_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_SHOPPING_CART_WEIGHT = 2.0
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+IMAGE_UPLOAD_THROTTLE_MIN_SIZE = 64 * 1024
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+# Задачи выполняются пулом потоков в процессе веб-сервера сразу после
+# коммита; команда run_tasks подбирает повторы и задачи упавших процессов.
+TASKS_RUN_IN_PROCESS = os.getenv(
+    'TASKS_RUN_IN_PROCESS', default='True'
+) == 'True'
+TASKS_THREADS = int(os.getenv('TASKS_THREADS', default=2))
+TASKS_MAX_ATTEMPTS = 3
+TASKS_RETRY_DELAY = 30
+TASKS_STALE_TIMEOUT = 600
+TASKS_POLL_INTERVAL = 2
+EXPORT_CHUNK_SIZE = 500
+AUTHOR_TOP_TAGS_LIMIT = 3
+STARTUP_TIME_BUDGET = 2.0
+# local — события доставляются внутри процесса (разработка, один
+# ASGI-процесс); postgres — через LISTEN/NOTIFY между процессами.
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', default='local')
+EVENTS_CHANNEL = 'foodgram_events'
+EVENTS_KEEPALIVE = 15
+EVENTS_TICKET_MAX_AGE = 30
+# Паузы между попытками восстановить соединение LISTEN: удваиваются от
+# первой до последней.
+EVENTS_RECONNECT_DELAY = 1
+EVENTS_RECONNECT_MAX_DELAY = 30
+# Свежие записи журнала изменений отдаются с задержкой: транзакция с
+# меньшим id может закоммититься позже, и клиент пропустил бы её.
+SYNC_SETTLE_SECONDS = 2
+SYNC_PAGE_SIZE = 500
+# Срок токена синхронизации в секундах: после него клиент получает 400
+# и синхронизируется с начала, а не догоняет журнал за месяцы.
+SYNC_TOKEN_MAX_AGE = 30 * 24 * 60 * 60
+BATCH_MAX_REQUESTS = 20
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+# Незавершённые прямые загрузки стоит удалять правилом жизненного цикла
+# бакета для этого префикса.
+S3_UPLOAD_PREFIX = 'uploads/'
+S3_UPLOAD_EXPIRES = 600
+# Проверка бюджетов запросов во view: off, log или raise. По умолчанию
+# включена только при DEBUG; команда check_query_budgets работает всегда.
+QUERY_BUDGET_MODE = os.getenv(
+    'QUERY_BUDGET_MODE', default='log' if DEBUG else 'off'
+)
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGET_REPEATS = 4
+# Профилирование запроса администратором: заголовок или параметр
+# включают сэмплирование стека с интервалом PROFILE_INTERVAL секунд.
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+PROFILE_INTERVAL = 0.002
+# Журнал медленных запросов: порог в мс (0 — выключен), доля запросов
+# SELECT с EXPLAIN (ANALYZE, BUFFERS) на PostgreSQL и размер журнала.
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', default=100))
+SLOW_QUERY_EXPLAIN_RATE = float(
+    os.getenv('SLOW_QUERY_EXPLAIN_RATE', default=0.1)
+)
+SLOW_QUERY_LOG_SIZE = 200
+# Число view, учитываемых отдельно у одной формы запроса; остальные
+# считаются вместе под именем SLOW_QUERY_OTHER_VIEWS.
+SLOW_QUERY_VIEWS_LIMIT = 10
+SLOW_QUERY_OTHER_VIEWS = '...'
+# На форму: ячейка, описание, число, сумма и счётчики view; locmem не
+# должен вытеснять живые записи журнала.
+CACHES['slow_queries']['OPTIONS'] = {
+    'MAX_ENTRIES': SLOW_QUERY_LOG_SIZE * (SLOW_QUERY_VIEWS_LIMIT + 5) + 10,
+}
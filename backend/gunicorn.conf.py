@@ -0,0 +1,52 @@
+"""Конфигурация gunicorn; подхватывается из рабочего каталога /app.
+
+Число процессов и потоков по умолчанию считается от числа CPU и
+переопределяется переменными окружения GUNICORN_*.
+"""
+import gc
+import multiprocessing
+import os
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', default='0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', default=cpu_count * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', default=4))
+
+# Django и все приложения импортируются один раз в мастере, воркеры
+# получают их через fork и делят страницы памяти (copy-on-write).
+preload_app = True
+
+# Перезапуск воркеров ограничивает рост памяти; jitter не даёт всем
+# воркерам перезапуститься одновременно.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+graceful_timeout = 30
+keepalive = 5
+# Heartbeat воркеров в памяти, а не на диске контейнера.
+worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+
+
+def when_ready(server):
+    # URLconf и views иначе импортируются лениво первым запросом
+    # каждого воркера.
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    # Объекты, созданные при импорте, уходят из-под сборщика мусора:
+    # иначе его проходы в воркерах трогают их заголовки и копируют
+    # общие страницы памяти.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Соединения с базой, открытые в мастере при импорте, не должны
+    # использоваться сразу несколькими процессами.
+    from django.db import connections
+
+    connections.close_all()
@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.core import signing
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from foodgram.settings import (SYNC_PAGE_SIZE, SYNC_SETTLE_SECONDS,
+                               SYNC_TOKEN_MAX_AGE)
+
+from .models import FAVORITE, RECIPE, SHOPPING_CART, Change
+
+TOKEN_SALT = 'recipes.changes'
+# Личные изменения, которые синхронизация объектов отдаёт их владельцу.
+USER_KINDS = {RECIPE: (FAVORITE, SHOPPING_CART)}
+
+
+class PendingChanges:
+    """Изменения текущей транзакции без повторов.
+
+    Записи из откаченной точки сохранения остаются: лишняя запись в
+    журнале лишь заставит клиента перечитать объект.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.flushed = False
+
+    def add(self, kind, ids, user_id=None):
+        for pk in ids:
+            self.keys[kind, pk, user_id] = None
+
+    def flush(self):
+        self.flushed = True
+        Change.objects.bulk_create(
+            Change(kind=kind, object_id=pk, user_id=user_id)
+            for kind, pk, user_id in self.keys
+        )
+
+
+def get_pending(connection):
+    """Буфер транзакции; новый, если прежний уже записан или откачен."""
+    pending = getattr(connection, 'pending_changes', None)
+    if pending is None or pending.flushed or not any(
+        entry[1] == pending.flush for entry in connection.run_on_commit
+    ):
+        pending = PendingChanges()
+        connection.pending_changes = pending
+        transaction.on_commit(pending.flush)
+    return pending
+
+
+def unlogged(kind, ids):
+    """Оставляет id, которых ещё нет в журнале текущей транзакции."""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return list(ids)
+    keys = get_pending(connection).keys
+    return [pk for pk in ids if (kind, pk, None) not in keys]
+
+
+def log(kind, ids, user_id=None):
+    """Пишет изменения в журнал после коммита: откаты туда не попадают.
+
+    Внутри транзакции записи копятся и пишутся одним запросом. С user_id
+    изменение личное и видно только этому пользователю.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        Change.objects.bulk_create(
+            Change(kind=kind, object_id=pk, user_id=user_id) for pk in ids
+        )
+        return
+    get_pending(connection).add(kind, ids, user_id)
+
+
+def encode_token(change_id):
+    return signing.dumps(change_id, salt=TOKEN_SALT)
+
+
+def decode_token(token):
+    """id последнего полученного изменения; пустой токен — с начала.
+
+    Поддельный токен вызывает signing.BadSignature, токен старше
+    SYNC_TOKEN_MAX_AGE — её подкласс signing.SignatureExpired.
+    """
+    if not token:
+        return 0
+    return signing.loads(token, salt=TOKEN_SALT, max_age=SYNC_TOKEN_MAX_AGE)
+
+
+def changes_since(kind, since, limit=SYNC_PAGE_SIZE, user_id=None):
+    """Объекты, изменённые после изменения since, по порядку изменений.
+
+    Пользователю user_id добавляются его личные изменения из USER_KINDS:
+    общий и личный журналы — одна таблица, поэтому токен у них общий.
+    Несколько записей об одном объекте сворачиваются в одну. Возвращает
+    (id объектов, id последнего отданного изменения, есть ли ещё).
+    """
+    condition = Q(kind=kind, user=None)
+    if user_id is not None and kind in USER_KINDS:
+        condition |= Q(kind__in=USER_KINDS[kind], user_id=user_id)
+    rows = list(Change.objects.filter(
+        condition,
+        pk__gt=since,
+        created__lte=timezone.now() - timedelta(seconds=SYNC_SETTLE_SECONDS),
+    ).values('object_id').annotate(last=Max('pk')).order_by(
+        'last'
+    ).values_list('object_id', 'last')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1][1] if rows else since
+    return [object_id for object_id, _ in rows], last, has_more
+
+
+def compact():
+    """Удаляет записи, после которых есть более новые о том же объекте.
+
+    Клиент с любым токеном всё равно получит более новую запись, а с
+    пустым токеном — все существующие объекты и удалённые.
+    """
+    latest = Change.objects.order_by().values(
+        'kind', 'object_id', 'user'
+    ).annotate(last=Max('pk')).values('last')
+    return Change.objects.exclude(pk__in=latest).delete()[0]
@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+from django.db.models import Case, Value, When
+
+from foodgram.settings import MAX_AMOUNT
+
+MERGE_BATCH_SIZE = 500
+
+
+def normalize(value):
+    """Название без учёта регистра, лишних пробелов и разницы ё/е."""
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+def find_duplicates(ingredient_model, exact=False):
+    """Группы дублей: {id сохраняемого ингредиента: [id дублей]}.
+
+    Сохраняется ингредиент с наименьшим id. Модели передаются
+    аргументами, чтобы функцию можно было вызвать из миграции.
+    """
+    groups = defaultdict(list)
+    for pk, name, unit in ingredient_model.objects.order_by('pk').values_list(
+        'pk', 'name', 'measurement_unit'
+    ):
+        key = (name, unit) if exact else (normalize(name), normalize(unit))
+        groups[key].append(pk)
+    return {ids[0]: ids[1:] for ids in groups.values() if len(ids) > 1}
+
+
+def merge_duplicates(ingredient_model, ingredient_recipe_model, duplicates):
+    """Переносит рецепты на сохраняемые ингредиенты и удаляет дубли.
+
+    Если в рецепте оказалось несколько строк одного ингредиента,
+    остаётся одна с суммарным количеством. Возвращает id затронутых
+    рецептов.
+    """
+    survivor_of = {
+        duplicate: survivor
+        for survivor, group in duplicates.items()
+        for duplicate in group
+    }
+    if not survivor_of:
+        return set()
+    recipe_ids = set(ingredient_recipe_model.objects.filter(
+        ingredient_id__in=list(survivor_of)
+    ).values_list('recipe_id', flat=True))
+    merged = defaultdict(list)
+    for pk, recipe_id, ingredient_id, amount in (
+        ingredient_recipe_model.objects.filter(
+            recipe_id__in=list(recipe_ids),
+            ingredient_id__in=[*duplicates, *survivor_of],
+        ).order_by('pk').values_list(
+            'pk', 'recipe_id', 'ingredient_id', 'amount'
+        )
+    ):
+        target = survivor_of.get(ingredient_id, ingredient_id)
+        merged[recipe_id, target].append((pk, amount))
+    amounts, redundant = {}, []
+    for rows in merged.values():
+        if len(rows) > 1:
+            amounts[rows[0][0]] = min(
+                sum(amount for _, amount in rows), MAX_AMOUNT
+            )
+            redundant.extend(pk for pk, _ in rows[1:])
+    ingredient_recipe_model.objects.filter(pk__in=redundant).delete()
+    if amounts:
+        ingredient_recipe_model.objects.filter(pk__in=list(amounts)).update(
+            amount=Case(*(When(pk=pk, then=Value(amount))
+                          for pk, amount in amounts.items()))
+        )
+    items = list(survivor_of.items())
+    for start in range(0, len(items), MERGE_BATCH_SIZE):
+        batch = dict(items[start:start + MERGE_BATCH_SIZE])
+        ingredient_recipe_model.objects.filter(
+            ingredient_id__in=list(batch)
+        ).update(ingredient_id=Case(
+            *(When(ingredient_id=duplicate, then=Value(survivor))
+              for duplicate, survivor in batch.items())
+        ))
+    ingredient_model.objects.filter(pk__in=list(survivor_of)).delete()
+    return recipe_ids
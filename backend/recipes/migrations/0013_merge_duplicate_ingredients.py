@@ -0,0 +1,79 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Case, Value, When
+
+# Копия логики recipes.dedup на момент миграции: последующие правки
+# модуля не должны менять уже применённую миграцию.
+MAX_AMOUNT = 32000
+MERGE_BATCH_SIZE = 500
+
+
+def find_exact_duplicates(Ingredient):
+    groups = defaultdict(list)
+    for pk, name, unit in Ingredient.objects.order_by('pk').values_list(
+        'pk', 'name', 'measurement_unit'
+    ):
+        groups[name, unit].append(pk)
+    return {ids[0]: ids[1:] for ids in groups.values() if len(ids) > 1}
+
+
+def merge_exact_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    duplicates = find_exact_duplicates(Ingredient)
+    survivor_of = {
+        duplicate: survivor
+        for survivor, group in duplicates.items()
+        for duplicate in group
+    }
+    if not survivor_of:
+        return
+    recipe_ids = set(IngredientRecipe.objects.filter(
+        ingredient_id__in=list(survivor_of)
+    ).values_list('recipe_id', flat=True))
+    merged = defaultdict(list)
+    for pk, recipe_id, ingredient_id, amount in (
+        IngredientRecipe.objects.filter(
+            recipe_id__in=list(recipe_ids),
+            ingredient_id__in=[*duplicates, *survivor_of],
+        ).order_by('pk').values_list(
+            'pk', 'recipe_id', 'ingredient_id', 'amount'
+        )
+    ):
+        target = survivor_of.get(ingredient_id, ingredient_id)
+        merged[recipe_id, target].append((pk, amount))
+    amounts, redundant = {}, []
+    for rows in merged.values():
+        if len(rows) > 1:
+            amounts[rows[0][0]] = min(
+                sum(amount for _, amount in rows), MAX_AMOUNT
+            )
+            redundant.extend(pk for pk, _ in rows[1:])
+    IngredientRecipe.objects.filter(pk__in=redundant).delete()
+    if amounts:
+        IngredientRecipe.objects.filter(pk__in=list(amounts)).update(
+            amount=Case(*(When(pk=pk, then=Value(amount))
+                          for pk, amount in amounts.items()))
+        )
+    items = list(survivor_of.items())
+    for start in range(0, len(items), MERGE_BATCH_SIZE):
+        batch = dict(items[start:start + MERGE_BATCH_SIZE])
+        IngredientRecipe.objects.filter(
+            ingredient_id__in=list(batch)
+        ).update(ingredient_id=Case(
+            *(When(ingredient_id=duplicate, then=Value(survivor))
+              for duplicate, survivor in batch.items())
+        ))
+    Ingredient.objects.filter(pk__in=list(survivor_of)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_index_audit'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_exact_duplicates, migrations.RunPython.noop),
+    ]
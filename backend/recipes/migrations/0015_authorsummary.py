@@ -0,0 +1,76 @@
+# Generated by Django 3.2.15 on 2026-10-19 10:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+TOP_TAGS_LIMIT = 3
+
+
+def counts(queryset, field):
+    return dict(
+        queryset.order_by().values(field).annotate(
+            count=Count('pk')
+        ).values_list(field, 'count')
+    )
+
+
+def create_author_summaries(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favourites = apps.get_model('recipes', 'Favourites')
+    TagRecipe = apps.get_model('recipes', 'TagRecipe')
+    AuthorSummary = apps.get_model('recipes', 'AuthorSummary')
+    followers = counts(Follow.objects.all(), 'author_id')
+    recipes = counts(Recipe.objects.all(), 'author_id')
+    favorites = counts(
+        Favourites.objects.all(), 'favorite_recipe__author_id'
+    )
+    tags = {}
+    for author_id, tag_id, count in TagRecipe.objects.order_by().values_list(
+        'recipe__author_id', 'tag_id'
+    ).annotate(count=Count('pk')):
+        tags.setdefault(author_id, []).append([tag_id, count])
+    AuthorSummary.objects.bulk_create(
+        (
+            AuthorSummary(
+                author_id=author_id,
+                followers_count=followers.get(author_id, 0),
+                recipes_count=recipes.get(author_id, 0),
+                favorites_count=favorites.get(author_id, 0),
+                top_tags=sorted(
+                    tags.get(author_id, []),
+                    key=lambda item: (-item[1], item[0])
+                )[:TOP_TAGS_LIMIT],
+            )
+            for author_id in User.objects.values_list('pk', flat=True)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_search_indexes'),
+        ('recipes', '0014_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorSummary',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='users.user', verbose_name='Автор')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='Рецептов')),
+                ('favorites_count', models.PositiveIntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('top_tags', models.JSONField(default=list, verbose_name='Популярные теги')),
+            ],
+            options={
+                'verbose_name': 'Сводка по автору',
+                'verbose_name_plural': 'Сводки по авторам',
+            },
+        ),
+        migrations.RunPython(create_author_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.15 on 2026-10-19 10:21
+
+from django.db import migrations, models
+
+
+def log_existing_objects(apps, schema_editor):
+    # Синхронизация с пустым токеном должна вернуть весь каталог.
+    Change = apps.get_model('recipes', 'Change')
+    for kind, model_name in (
+        ('tag', 'Tag'), ('ingredient', 'Ingredient'), ('recipe', 'Recipe')
+    ):
+        model = apps.get_model('recipes', model_name)
+        Change.objects.bulk_create(
+            (
+                Change(kind=kind, object_id=pk)
+                for pk in model.objects.order_by('pk').values_list(
+                    'pk', flat=True
+                ).iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('tag', 'Тег'), ('ingredient', 'Ингредиент'), ('recipe', 'Рецепт')], max_length=16, verbose_name='Тип объекта')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id объекта')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['kind', 'id'], name='change_kind_id_idx'),
+        ),
+        migrations.RunPython(log_existing_objects, migrations.RunPython.noop),
+    ]
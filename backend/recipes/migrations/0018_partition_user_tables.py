@@ -0,0 +1,110 @@
+import re
+
+from django.db import migrations
+
+MODELS = ('Favourites', 'ShoppingCart')
+
+# Копия нужной для отката части recipes.partitioning на момент миграции:
+# последующие правки модуля не должны менять уже применённую миграцию.
+re_on_only = re.compile(r' ON ONLY ')
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT relkind FROM pg_class WHERE oid = %s::regclass', [table]
+    )
+    return cursor.fetchone()[0] == 'p'
+
+
+def unpartition(connection, table, pk='id'):
+    """Пересоздаёт секционированную table обычной таблицей.
+
+    Ограничения и индексы переносятся, первичный ключ снова состоит из
+    одного pk.
+    """
+    quote = connection.ops.quote_name
+    old = f'{table}_old'
+    with connection.cursor() as cursor:
+        # Отложенные проверки внешних ключей от записей этой транзакции
+        # не дали бы удалить старую таблицу.
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(
+            'SELECT conname, contype, pg_get_constraintdef(oid) '
+            'FROM pg_constraint WHERE conrelid = %s::regclass '
+            "AND coninhcount = 0 AND contype <> 'n' "
+            'ORDER BY contype DESC, conname', [table]
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            'SELECT index.relname, pg_get_indexdef(i.indexrelid) '
+            'FROM pg_index i '
+            'JOIN pg_class index ON index.oid = i.indexrelid '
+            'WHERE i.indrelid = %s::regclass AND NOT EXISTS ('
+            '    SELECT 1 FROM pg_constraint c '
+            '    WHERE c.conrelid = i.indrelid AND c.conindid = i.indexrelid'
+            ') ORDER BY 1', [table]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, pk])
+        sequence, = cursor.fetchone()
+        cursor.execute(
+            'SELECT inhrelid::regclass::text FROM pg_inherits '
+            'WHERE inhparent = %s::regclass ORDER BY 1', [table]
+        )
+        for partition, in cursor.fetchall():
+            cursor.execute(
+                f'ALTER TABLE {quote(partition)} '
+                f'RENAME TO {quote(partition + "_old")}'
+            )
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} '
+            f'(LIKE {quote(old)} INCLUDING DEFAULTS)'
+        )
+        cursor.execute(
+            f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}'
+        )
+        if sequence:
+            cursor.execute(
+                f'ALTER SEQUENCE {sequence} '
+                f'OWNED BY {quote(table)}.{quote(pk)}'
+            )
+        cursor.execute(f'DROP TABLE {quote(old)}')
+        for name, kind, definition in constraints:
+            if kind == 'p':
+                definition = f'PRIMARY KEY ({quote(pk)})'
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} '
+                f'ADD CONSTRAINT {quote(name)} {definition}'
+            )
+        for name, definition in indexes:
+            # У секционированной таблицы индекс описан как ON ONLY.
+            cursor.execute(re_on_only.sub(' ON ', definition, count=1))
+
+
+def unpartition_user_tables(apps, schema_editor):
+    # Вперёд схема не меняется: секционирует таблицы команда
+    # partition_user_tables. Откат возвращает обычные таблицы, чтобы
+    # предыдущие миграции видели ту схему, которую создали.
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    for name in MODELS:
+        table = apps.get_model('recipes', name)._meta.db_table
+        with connection.cursor() as cursor:
+            partitioned = is_partitioned(cursor, table)
+        if partitioned:
+            unpartition(connection, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_change'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, unpartition_user_tables
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.15 on 2026-10-19 10:55
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Exp, Ln
+
+NO_TRENDING_SCORE = -1e9
+
+
+def scores_to_log(apps, schema_editor):
+    # Суммы весов растут экспоненциально, хранится их логарифм.
+    TrendingScore = apps.get_model('recipes', 'TrendingScore')
+    TrendingScore.objects.update(score=Case(
+        When(score__gt=0, then=Ln(F('score'))),
+        default=Value(NO_TRENDING_SCORE),
+    ))
+
+
+def scores_from_log(apps, schema_editor):
+    TrendingScore = apps.get_model('recipes', 'TrendingScore')
+    TrendingScore.objects.update(score=Case(
+        When(score__gt=NO_TRENDING_SCORE, then=Exp(F('score'))),
+        default=Value(0.0),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_partition_user_tables'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='trendingscore',
+            options={'ordering': ('-score', '-recipe_id'), 'verbose_name': 'Популярность рецепта', 'verbose_name_plural': 'Популярность рецептов'},
+        ),
+        migrations.RemoveIndex(
+            model_name='trendingscore',
+            name='trending_score_idx',
+        ),
+        migrations.AlterField(
+            model_name='trendingscore',
+            name='score',
+            field=models.FloatField(default=-1000000000.0, verbose_name='Популярность'),
+        ),
+        migrations.RunPython(scores_to_log, scores_from_log),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['-score', '-recipe'], name='trending_score_recipe_idx'),
+        ),
+    ]
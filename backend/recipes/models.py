@@ -5,6 +5,17 @@ from foodgram.settings import (MAX_AMOUNT, MAX_COOKING_TIME, MAX_LENGHT,
                                MAX_LENGHT_COLOR, MIN_AMOUNT, MIN_COOKING_TIME,)
 from users.models import User
 
+TAG = 'tag'
+INGREDIENT = 'ingredient'
+RECIPE = 'recipe'
+# Личные изменения: рецепт добавлен или убран из избранного или списка
+# покупок пользователя. В общий журнал рецептов не попадают.
+FAVORITE = 'favorite'
+SHOPPING_CART = 'shopping_cart'
+# Популярность рецепта без событий: вместо логарифма нулевой суммы весов
+# (-inf) конечное число, меньшее любого реального значения.
+NO_TRENDING_SCORE = -1e9
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -49,6 +60,12 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('name',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient',
+            ),
+        )
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -98,9 +115,20 @@ class Recipe(models.Model):
         db_index=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -118,6 +146,7 @@ class IngredientRecipe(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='recipe_ingredients',
         verbose_name='Рецепт',
     )
@@ -128,6 +157,12 @@ class IngredientRecipe(models.Model):
 
     class Meta:
         ordering = ('ingredient',)
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredient'),
+                name='ingredient_recipe_idx',
+            ),
+        )
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
 
@@ -157,24 +192,36 @@ class Favourites(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Автор рецепта',
         related_name='favorite_recipe',
     )
     favorite_recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='favorite_recipe',
         verbose_name='Избранный рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
-        ordering = ('favorite_recipe',)
+        ordering = ('-created',)
         constraints = [
             models.UniqueConstraint(
                 fields=('favorite_recipe', 'user'),
                 name='unique_favorite_recipe',
             ),
         ]
+        indexes = (
+            models.Index(
+                fields=('user', 'favorite_recipe'),
+                name='favourites_user_recipe_idx',
+            ),
+        )
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
 
@@ -189,6 +236,7 @@ class ShoppingCart(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='shopping_cart',
         verbose_name='Пользователь'
     )
@@ -198,9 +246,13 @@ class ShoppingCart(models.Model):
         related_name='in_shopping_cart',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
-        ordering = ('recipe',)
+        ordering = ('-created',)
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'recipe'),
@@ -211,3 +263,187 @@ class ShoppingCart(models.Model):
 
     def str(self):
         return f'{self.recipe.name} в списке покупок {self.user.username}'
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='shopping_cart_totals',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    class Meta:
+        ordering = ('ingredient__name',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_total',
+            ),
+        )
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+
+    def __str__(self):
+        return f'{self.ingredient.name} {self.amount} у {self.user.username}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        ordering = ('-score',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx',
+            ),
+        )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.similar.name} похож на {self.recipe.name}'
+
+
+class TrendingScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        default=NO_TRENDING_SCORE,
+        verbose_name='Популярность'
+    )
+
+    class Meta:
+        ordering = ('-score', '-recipe_id')
+        # Первая страница популярных читается по индексу без сортировки.
+        indexes = (
+            models.Index(
+                fields=('-score', '-recipe'),
+                name='trending_score_recipe_idx',
+            ),
+        )
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+    def __str__(self):
+        return f'{self.recipe.name}: {self.score}'
+
+
+class AuthorSummary(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary',
+        verbose_name='Автор'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков'
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Рецептов'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в избранное'
+    )
+    top_tags = models.JSONField(
+        default=list,
+        verbose_name='Популярные теги'
+    )
+
+    class Meta:
+        verbose_name = 'Сводка по автору'
+        verbose_name_plural = 'Сводки по авторам'
+
+    def __str__(self):
+        return f'Сводка по автору {self.author.username}'
+
+
+class Change(models.Model):
+    KINDS = (
+        (TAG, 'Тег'),
+        (INGREDIENT, 'Ингредиент'),
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+    )
+    kind = models.CharField(
+        max_length=16,
+        choices=KINDS,
+        verbose_name='Тип объекта'
+    )
+    object_id = models.PositiveIntegerField(
+        verbose_name='id объекта'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='changes',
+        verbose_name='Пользователь личного изменения'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время изменения'
+    )
+
+    class Meta:
+        ordering = ('id',)
+        indexes = (
+            models.Index(
+                fields=('kind', 'id'),
+                name='change_kind_id_idx',
+            ),
+            # Личные изменения пользователя и каскадное удаление.
+            models.Index(
+                fields=('user', 'kind', 'id'),
+                name='change_user_kind_id_idx',
+            ),
+        )
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,118 @@
+"""Секционирование таблиц PostgreSQL по хешу столбца.
+
+Таблица пересоздаётся под тем же именем с теми же столбцами,
+ограничениями и индексами, поэтому запросы Django не меняются.
+Первичный ключ секционированной таблицы дополняется столбцом
+секционирования: PostgreSQL требует его во всех уникальных ключах.
+"""
+import re
+
+re_on_only = re.compile(r' ON ONLY ')
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT relkind FROM pg_class WHERE oid = %s::regclass', [table]
+    )
+    return cursor.fetchone()[0] == 'p'
+
+
+def get_partitions(cursor, table):
+    cursor.execute(
+        'SELECT inhrelid::regclass::text FROM pg_inherits '
+        'WHERE inhparent = %s::regclass ORDER BY 1', [table]
+    )
+    return [name for name, in cursor.fetchall()]
+
+
+def get_constraints(cursor, table):
+    cursor.execute(
+        'SELECT conname, contype, pg_get_constraintdef(oid) '
+        'FROM pg_constraint WHERE conrelid = %s::regclass '
+        "AND coninhcount = 0 AND contype <> 'n' "
+        'ORDER BY contype DESC, conname', [table]
+    )
+    return cursor.fetchall()
+
+
+def get_indexes(cursor, table):
+    """Индексы, не созданные под ограничения.
+
+    Для секционированной таблицы pg_get_indexdef даёт ON ONLY <таблица>:
+    такой индекс не создаётся в секциях и остаётся невалидным, поэтому
+    ONLY убирается.
+    """
+    cursor.execute(
+        'SELECT index.relname, pg_get_indexdef(i.indexrelid) '
+        'FROM pg_index i JOIN pg_class index ON index.oid = i.indexrelid '
+        'WHERE i.indrelid = %s::regclass AND NOT EXISTS ('
+        '    SELECT 1 FROM pg_constraint c '
+        '    WHERE c.conrelid = i.indrelid AND c.conindid = i.indexrelid'
+        ') ORDER BY 1', [table]
+    )
+    return [
+        (name, re_on_only.sub(' ON ', definition, count=1))
+        for name, definition in cursor.fetchall()
+    ]
+
+
+def rebuild(connection, table, column=None, partitions=0, pk='id'):
+    """Пересоздаёт table секционированной на partitions частей по column.
+
+    С partitions=0 возвращает обычную таблицу. Данные копируются, так
+    что на время работы таблица заблокирована.
+    """
+    quote = connection.ops.quote_name
+    old = f'{table}_old'
+    with connection.cursor() as cursor:
+        # Отложенные проверки внешних ключей от записей этой транзакции
+        # не дали бы удалить старую таблицу.
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        constraints = get_constraints(cursor, table)
+        indexes = get_indexes(cursor, table)
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, pk])
+        sequence, = cursor.fetchone()
+        for partition in get_partitions(cursor, table):
+            cursor.execute(
+                f'ALTER TABLE {quote(partition)} '
+                f'RENAME TO {quote(partition + "_old")}'
+            )
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        if partitions:
+            cursor.execute(
+                f'CREATE TABLE {quote(table)} '
+                f'(LIKE {quote(old)} INCLUDING DEFAULTS) '
+                f'PARTITION BY HASH ({quote(column)})'
+            )
+            for remainder in range(partitions):
+                cursor.execute(
+                    f'CREATE TABLE {quote(f"{table}_p{remainder}")} '
+                    f'PARTITION OF {quote(table)} FOR VALUES WITH '
+                    f'(MODULUS {partitions}, REMAINDER {remainder})'
+                )
+        else:
+            cursor.execute(
+                f'CREATE TABLE {quote(table)} '
+                f'(LIKE {quote(old)} INCLUDING DEFAULTS)'
+            )
+        cursor.execute(
+            f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}'
+        )
+        if sequence:
+            cursor.execute(
+                f'ALTER SEQUENCE {sequence} '
+                f'OWNED BY {quote(table)}.{quote(pk)}'
+            )
+        cursor.execute(f'DROP TABLE {quote(old)}')
+        for name, kind, definition in constraints:
+            if kind == 'p':
+                columns = (pk, column) if partitions else (pk,)
+                definition = 'PRIMARY KEY ({})'.format(
+                    ', '.join(map(quote, columns))
+                )
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} '
+                f'ADD CONSTRAINT {quote(name)} {definition}'
+            )
+        for name, definition in indexes:
+            cursor.execute(definition)
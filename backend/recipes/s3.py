@@ -0,0 +1,100 @@
+import uuid
+from io import BytesIO
+from itertools import chain
+
+from botocore.exceptions import ClientError
+from PIL import Image, UnidentifiedImageError
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from foodgram.settings import (RECIPE_IMAGE_MAX_SIZE, S3_UPLOAD_EXPIRES,
+                               S3_UPLOAD_PREFIX)
+
+from .storage import ContentAddressedMixin, DirectUploadError, hashed_name
+
+IMAGE_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+}
+# Формат и размеры Pillow определяет по заголовку файла.
+IMAGE_HEADER_SIZE = 64 * 1024
+
+
+class S3ContentAddressedStorage(ContentAddressedMixin, S3Boto3Storage):
+    """Медиафайлы в S3-совместимом хранилище.
+
+    Кроме обычного save() выдаёт presigned POST для загрузки напрямую
+    из клиента и переносит загруженный объект под постоянное имя.
+    """
+
+    def create_upload(self, user_id, content_type):
+        name = f'{S3_UPLOAD_PREFIX}{user_id}/{uuid.uuid4().hex}'
+        post = self.bucket.meta.client.generate_presigned_post(
+            self.bucket_name,
+            self._normalize_name(name),
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, RECIPE_IMAGE_MAX_SIZE],
+            ],
+            ExpiresIn=S3_UPLOAD_EXPIRES,
+        )
+        return {'upload': name, 'url': post['url'], 'fields': post['fields']}
+
+    def get_upload_name(self, response):
+        """Постоянное имя загрузки из ответа GET или DirectUploadError."""
+        body = response['Body']
+        try:
+            if response['ContentLength'] > RECIPE_IMAGE_MAX_SIZE:
+                raise DirectUploadError('Изображение слишком большое.')
+            header = body.read(IMAGE_HEADER_SIZE)
+            try:
+                image_format = Image.open(BytesIO(header)).format
+            except UnidentifiedImageError:
+                image_format = None
+            if image_format not in IMAGE_EXTENSIONS:
+                raise DirectUploadError(
+                    'Загруженный файл не является изображением.'
+                )
+            return hashed_name(
+                chain((header,), body.iter_chunks(IMAGE_HEADER_SIZE)),
+                IMAGE_EXTENSIONS[image_format]
+            )
+        finally:
+            body.close()
+
+    def finalize_upload(self, user_id, name):
+        """Проверяет загрузку и копирует её под имя из sha256 содержимого.
+
+        Имя то же, что дал бы save() (ContentAddressedMixin), поэтому
+        одно изображение хранится один раз, как бы оно ни было загружено,
+        и файлы можно кэшировать в CDN бессрочно. Объект читается одним
+        потоковым GET; слишком большой отклоняется до чтения тела.
+        Возвращает новое имя.
+        """
+        prefix = f'{S3_UPLOAD_PREFIX}{user_id}/'
+        if not name.startswith(prefix) or '/' in name[len(prefix):]:
+            raise DirectUploadError('Загрузка не найдена.')
+        upload = self.bucket.Object(self._normalize_name(name))
+        try:
+            response = upload.get()
+        except ClientError:
+            raise DirectUploadError('Загрузка не найдена.')
+        try:
+            new_name = self.get_upload_name(response)
+        except DirectUploadError:
+            upload.delete()
+            raise
+        if not self.exists(new_name):
+            self.bucket.Object(self._normalize_name(new_name)).copy_from(
+                CopySource={'Bucket': self.bucket_name, 'Key': upload.key},
+                # Объект могли перезаписать после чтения: копируется
+                # только проверенное содержимое.
+                CopySourceIfMatch=response['ETag'],
+                ContentType=response['ContentType'],
+                MetadataDirective='REPLACE',
+                **self.get_object_parameters(new_name),
+            )
+        upload.delete()
+        return new_name
@@ -0,0 +1,133 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from .models import IngredientRecipe, ShoppingCart, ShoppingCartTotal
+
+
+def recipe_amounts(recipe_id):
+    """{id ингредиента: количество} для одного рецепта."""
+    return Counter(dict(
+        IngredientRecipe.objects.filter(recipe_id=recipe_id).order_by(
+        ).values('ingredient_id').annotate(
+            total=Sum('amount')
+        ).values_list('ingredient_id', 'total')
+    ))
+
+
+def apply(user_ids, deltas):
+    """Прибавляет deltas к итогам списков покупок пользователей.
+
+    Недостающие строки сначала вставляются с нулём (ignore_conflicts),
+    потом все меняются одним UPDATE с F(), поэтому параллельные
+    добавления не теряют друг друга.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    totals = ShoppingCartTotal.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=list(deltas)
+    )
+    with transaction.atomic():
+        ShoppingCartTotal.objects.bulk_create(
+            (
+                ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, delta in deltas.items() if delta > 0
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        totals.update(amount=F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()),
+            default=Value(0),
+        ))
+        totals.filter(amount__lte=0).delete()
+
+
+def add_recipe(user_id, recipe_id):
+    apply([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    apply([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+def change_recipe(recipe_id, old_amounts):
+    """Переносит правку ингредиентов рецепта во все списки покупок."""
+    deltas = recipe_amounts(recipe_id)
+    deltas.subtract(old_amounts)
+    apply(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        ),
+        deltas,
+    )
+
+
+def recompute(user_ids=None):
+    """Итоги с нуля: {(id пользователя, id ингредиента): количество}."""
+    queryset = IngredientRecipe.objects.filter(
+        recipe__in_shopping_cart__isnull=False
+    )
+    if user_ids is not None:
+        queryset = queryset.filter(
+            recipe__in_shopping_cart__user_id__in=user_ids
+        )
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in queryset.order_by().values(
+            'recipe__in_shopping_cart__user_id', 'ingredient_id'
+        ).annotate(total=Sum('amount')).values_list(
+            'recipe__in_shopping_cart__user_id', 'ingredient_id', 'total'
+        ).iterator()
+    }
+
+
+def stored(user_ids=None):
+    queryset = ShoppingCartTotal.objects.order_by()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in queryset.values_list(
+            'user_id', 'ingredient_id', 'amount'
+        ).iterator()
+    }
+
+
+def mismatched_users():
+    """Пользователи, чьи сохранённые итоги расходятся с пересчётом."""
+    expected, actual = recompute(), stored()
+    return {
+        user_id
+        for user_id, ingredient_id in expected.keys() | actual.keys()
+        if expected.get((user_id, ingredient_id))
+        != actual.get((user_id, ingredient_id))
+    }
+
+
+def rebuild(user_ids=None):
+    totals = recompute(user_ids)
+    queryset = ShoppingCartTotal.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        queryset.delete()
+        ShoppingCartTotal.objects.bulk_create(
+            (
+                ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id,
+                                  amount=amount)
+                for (user_id, ingredient_id), amount in totals.items()
+            ),
+            batch_size=1000,
+        )
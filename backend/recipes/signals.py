@@ -0,0 +1,187 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from foodgram.settings import (TRENDING_FAVORITE_WEIGHT,
+                               TRENDING_SHOPPING_CART_WEIGHT)
+from users.models import Follow, User
+
+from .changes import log, unlogged
+from .models import (FAVORITE, INGREDIENT, RECIPE, SHOPPING_CART, TAG,
+                     AuthorSummary, Favourites, Ingredient, IngredientRecipe,
+                     Recipe, ShoppingCart, Tag, TagRecipe, TrendingScore)
+from .shopping_cart import add_recipe, remove_recipe
+from .summary import change, recipe_author, update_top_tags
+from .trending import bump
+
+
+def touch_recipes(queryset):
+    """Сдвигает updated_at, чтобы сбросить ETag/Last-Modified рецептов.
+
+    Заодно рецепты попадают в журнал изменений для ?since=.
+    """
+    log(RECIPE, queryset.values_list('pk', flat=True))
+    queryset.update(updated_at=timezone.now())
+
+
+def touch_recipe_ids(ids):
+    """touch_recipes по известным id без лишних запросов.
+
+    Рецепты, уже попавшие в журнал в этой транзакции, пропускаются:
+    их updated_at в ней уже сдвинут.
+    """
+    ids = unlogged(RECIPE, ids)
+    if ids:
+        log(RECIPE, ids)
+        Recipe.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_on_m2m_change(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_recipe_ids([instance.pk])
+    elif pk_set:
+        touch_recipe_ids(pk_set)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+def touch_on_recipe_relation_change(sender, instance, **kwargs):
+    touch_recipe_ids([instance.recipe_id])
+
+
+@receiver(post_save, sender=Favourites)
+@receiver(post_delete, sender=Favourites)
+def log_favourite_change(sender, instance, **kwargs):
+    # is_favorited меняется только у самого пользователя: ни общий журнал
+    # рецептов, ни updated_at не трогаются, иначе каждый клик сбрасывал
+    # бы ETag и синхронизацию всем. Флаг входит в ETag как состояние
+    # зрителя.
+    log(FAVORITE, [instance.favorite_recipe_id], instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def log_shopping_cart_change(sender, instance, **kwargs):
+    log(SHOPPING_CART, [instance.recipe_id], instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+def touch_on_tag_change(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_on_ingredient_change(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def log_tag_change(sender, instance, **kwargs):
+    log(TAG, [instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def log_ingredient_change(sender, instance, **kwargs):
+    log(INGREDIENT, [instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def log_recipe_change(sender, instance, **kwargs):
+    log(RECIPE, [instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def create_trending_score(sender, instance, created, **kwargs):
+    if created:
+        TrendingScore.objects.get_or_create(recipe=instance)
+
+
+@receiver(post_save, sender=Favourites)
+def bump_trending_on_favourite(sender, instance, created, **kwargs):
+    if created:
+        bump(instance.favorite_recipe_id, TRENDING_FAVORITE_WEIGHT,
+             instance.created)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def bump_trending_on_shopping_cart(sender, instance, created, **kwargs):
+    if created:
+        bump(instance.recipe_id, TRENDING_SHOPPING_CART_WEIGHT,
+             instance.created)
+
+
+@receiver(post_save, sender=User)
+def create_author_summary(sender, instance, created, **kwargs):
+    if created:
+        AuthorSummary.objects.get_or_create(author=instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_followers(sender, instance, created=False, **kwargs):
+    if instance.author_id is None or (
+        kwargs['signal'] is post_save and not created
+    ):
+        return
+    change(instance.author_id, followers_count=1 if created else -1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def count_recipes(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_delete:
+        change(instance.author_id, recipes_count=-1)
+        update_top_tags(instance.author_id)
+    elif created:
+        change(instance.author_id, recipes_count=1)
+
+
+@receiver(post_save, sender=Favourites)
+@receiver(post_delete, sender=Favourites)
+def count_favorites(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_save and not created:
+        return
+    change(
+        recipe_author(instance.favorite_recipe_id),
+        favorites_count=1 if created else -1
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_author_top_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        update_top_tags(instance.author_id)
+    else:
+        for author_id in set(Recipe.objects.filter(
+            pk__in=pk_set or ()
+        ).values_list('author_id', flat=True)):
+            update_top_tags(author_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_cart_totals(sender, instance, created, **kwargs):
+    if created:
+        add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_cart_totals(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты ещё
+    # на месте, а в post_delete их уже может не быть.
+    remove_recipe(instance.user_id, instance.recipe_id)
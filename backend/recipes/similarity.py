@@ -0,0 +1,94 @@
+import math
+
+from django.db import transaction
+from django.db.models import Count
+
+from foodgram.settings import SIMILAR_RECIPES_LIMIT, SIMILAR_RECIPES_METRIC
+
+from .models import IngredientRecipe, SimilarRecipe
+
+
+def similarity(common, size, other_size, metric=SIMILAR_RECIPES_METRIC):
+    """Сходство наборов ингредиентов по размерам и пересечению."""
+    if not common:
+        return 0.0
+    if metric == 'cosine':
+        return common / math.sqrt(size * other_size)
+    return common / (size + other_size - common)
+
+
+def top_neighbours(scores, limit=SIMILAR_RECIPES_LIMIT):
+    return sorted(
+        scores.items(), key=lambda item: (-item[1], item[0])
+    )[:limit]
+
+
+def store_neighbours(neighbours):
+    """Полностью заменяет таблицу похожих рецептов."""
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        SimilarRecipe.objects.bulk_create(
+            (
+                SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                              score=score)
+                for recipe_id, items in neighbours.items()
+                for similar_id, score in items
+            ),
+            batch_size=1000,
+        )
+
+
+def _trim(recipe_id, limit=SIMILAR_RECIPES_LIMIT):
+    extra = SimilarRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('pk', flat=True)[limit:]
+    SimilarRecipe.objects.filter(pk__in=list(extra)).delete()
+
+
+def update_similar_recipes(recipe_id):
+    """Пересчитывает соседей одного рецепта после изменения ингредиентов.
+
+    Кандидаты ищутся только среди рецептов с общими ингредиентами.
+    Обратные связи обновляются для найденных соседей; полную точность
+    восстанавливает команда similar_recipes.
+    """
+    ingredient_ids = set(
+        IngredientRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', flat=True)
+    )
+    common = dict(
+        IngredientRecipe.objects.filter(
+            ingredient_id__in=ingredient_ids
+        ).exclude(
+            recipe_id=recipe_id
+        ).order_by().values('recipe_id').annotate(
+            common=Count('ingredient_id', distinct=True)
+        ).values_list('recipe_id', 'common')
+    )
+    sizes = dict(
+        IngredientRecipe.objects.filter(
+            recipe_id__in=list(common)
+        ).order_by().values('recipe_id').annotate(
+            size=Count('ingredient_id', distinct=True)
+        ).values_list('recipe_id', 'size')
+    )
+    neighbours = top_neighbours({
+        recipe_id: similarity(count, len(ingredient_ids), sizes[recipe_id])
+        for recipe_id, count in common.items()
+    })
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score)
+            for similar_id, score in neighbours
+        )
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=similar_id, similar_id=recipe_id,
+                          score=score)
+            for similar_id, score in neighbours
+        )
+        for similar_id, _ in neighbours:
+            _trim(similar_id)
@@ -0,0 +1,55 @@
+import hashlib
+import os
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+IMAGE_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+
+
+class DirectUploadError(ValueError):
+    pass
+
+
+# Одно и то же изображение должно получать одно имя, откуда бы ни пришло.
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+
+def hashed_name(chunks, extension):
+    """Имя файла по sha256 содержимого: ab/abcdef....jpg."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    extension = extension.lower()
+    hexdigest = digest.hexdigest()
+    return (
+        f'{hexdigest[:2]}/{hexdigest}'
+        f'{EXTENSION_ALIASES.get(extension, extension)}'
+    )
+
+
+class ContentAddressedMixin:
+    """Сохраняет файл под sha256 от содержимого.
+
+    Одинаковые файлы хранятся один раз: если файл с таким хешем уже
+    есть, возвращается его имя без повторной записи.
+    """
+
+    def get_hashed_name(self, name, content):
+        name = hashed_name(content.chunks(), os.path.splitext(name)[1])
+        content.seek(0)
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    pass
@@ -0,0 +1,102 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Subquery
+
+from foodgram.settings import AUTHOR_TOP_TAGS_LIMIT
+from users.models import Follow, User
+
+from .models import AuthorSummary, Favourites, Recipe, TagRecipe
+
+
+def change(author_id, **deltas):
+    """Сдвигает счётчики сводки одним UPDATE: change(1, recipes_count=1).
+
+    author_id может быть подзапросом (см. recipe_author), тогда автор
+    вычисляется в базе без отдельного запроса. Отсутствующая сводка
+    пересчитывается только при увеличении счётчиков: уменьшение без
+    строки бывает при каскадном удалении пользователя, когда его сводка
+    уже удалена, а сам пользователь ещё нет.
+    """
+    updated = AuthorSummary.objects.filter(author_id=author_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+    if (
+        not updated
+        and isinstance(author_id, int)
+        and all(delta > 0 for delta in deltas.values())
+    ):
+        rebuild([author_id])
+
+
+def top_tags(author_ids=None):
+    """{id автора: [[id тега, число рецептов], ...]} по убыванию числа."""
+    queryset = TagRecipe.objects.order_by()
+    if author_ids is not None:
+        queryset = queryset.filter(recipe__author_id__in=author_ids)
+    counters = defaultdict(Counter)
+    for author_id, tag_id, count in queryset.values_list(
+        'recipe__author_id', 'tag_id'
+    ).annotate(count=Count('pk')).iterator():
+        counters[author_id][tag_id] = count
+    return {
+        author_id: [
+            [tag_id, count] for tag_id, count in sorted(
+                counter.items(), key=lambda item: (-item[1], item[0])
+            )[:AUTHOR_TOP_TAGS_LIMIT]
+        ]
+        for author_id, counter in counters.items()
+    }
+
+
+def update_top_tags(author_id):
+    AuthorSummary.objects.filter(author_id=author_id).update(
+        top_tags=top_tags([author_id]).get(author_id, [])
+    )
+
+
+def _counts(queryset, field, author_ids):
+    if author_ids is not None:
+        queryset = queryset.filter(**{f'{field}__in': author_ids})
+    return dict(
+        queryset.order_by().values(field).annotate(
+            count=Count('pk')
+        ).values_list(field, 'count')
+    )
+
+
+def rebuild(author_ids=None):
+    """Полный пересчёт сводок; author_ids ограничивает набор авторов."""
+    followers = _counts(Follow.objects.all(), 'author_id', author_ids)
+    recipes = _counts(Recipe.objects.all(), 'author_id', author_ids)
+    favorites = _counts(
+        Favourites.objects.all(), 'favorite_recipe__author_id', author_ids
+    )
+    tags = top_tags(author_ids)
+    users = User.objects.order_by()
+    summaries = AuthorSummary.objects.all()
+    if author_ids is not None:
+        users = users.filter(pk__in=author_ids)
+        summaries = summaries.filter(author_id__in=author_ids)
+    with transaction.atomic():
+        summaries.delete()
+        AuthorSummary.objects.bulk_create(
+            (
+                AuthorSummary(
+                    author_id=author_id,
+                    followers_count=followers.get(author_id, 0),
+                    recipes_count=recipes.get(author_id, 0),
+                    favorites_count=favorites.get(author_id, 0),
+                    top_tags=tags.get(author_id, []),
+                )
+                for author_id in users.values_list(
+                    'pk', flat=True
+                ).iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+def recipe_author(recipe_id):
+    """Подзапрос с автором рецепта для change()."""
+    return Subquery(Recipe.objects.filter(pk=recipe_id).values('author_id'))
@@ -0,0 +1,8 @@
+from tasks.queue import task
+
+from . import similarity
+
+
+@task
+def update_similar_recipes(recipe_id):
+    similarity.update_similar_recipes(recipe_id)
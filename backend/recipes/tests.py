@@ -0,0 +1,600 @@
+import math
+from datetime import datetime, timedelta, timezone
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase
+from moto import mock_s3
+from PIL import Image
+
+from foodgram.settings import MAX_AMOUNT, S3_UPLOAD_PREFIX
+from users.models import Follow, User
+
+from .changes import changes_since, compact, decode_token, encode_token, log
+from .dedup import find_duplicates, merge_duplicates
+from .models import (FAVORITE, NO_TRENDING_SCORE, RECIPE, SHOPPING_CART, TAG,
+                     AuthorSummary, Change, Favourites, Ingredient,
+                     IngredientRecipe, Recipe, ShoppingCart, SimilarRecipe,
+                     Tag, TrendingScore)
+from .partitioning import (get_constraints, get_indexes, get_partitions,
+                           is_partitioned)
+from .s3 import S3ContentAddressedStorage
+from .similarity import similarity, top_neighbours, update_similar_recipes
+from .storage import DirectUploadError, hashed_name
+from .trending import bump, event_score, log_add, rebuild
+
+
+def create_png():
+    image = BytesIO()
+    Image.new('RGB', (2, 2), '#E26C2D').save(image, 'PNG')
+    return image.getvalue()
+
+
+PNG = create_png()
+
+
+def create_user(username):
+    return User.objects.create(
+        email=f'{username}@foodgram.test', username=username,
+        first_name='Имя', last_name='Фамилия'
+    )
+
+
+class AuthorSummaryTests(TestCase):
+
+    def setUp(self):
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        tag = Tag.objects.create(name='Завтрак', slug='breakfast',
+                                 color='#E26C2D')
+        ingredient = Ingredient.objects.create(name='Соль',
+                                               measurement_unit='г')
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=5, image='recipe.png'
+            )
+            recipe.tags.set([tag])
+            IngredientRecipe.objects.create(recipe=recipe,
+                                            ingredient=ingredient, amount=1)
+            Favourites.objects.create(user=self.reader,
+                                      favorite_recipe=recipe)
+            ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+
+    def test_delete_author_with_recipes(self):
+        self.author.delete()
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(
+            AuthorSummary.objects.filter(author_id=self.author.pk).exists()
+        )
+        summary = AuthorSummary.objects.get(author=self.reader)
+        self.assertEqual(summary.followers_count, 0)
+
+    def test_delete_reader(self):
+        self.reader.delete()
+        summary = AuthorSummary.objects.get(author=self.author)
+        self.assertEqual(
+            (summary.recipes_count, summary.followers_count,
+             summary.favorites_count),
+            (2, 0, 0)
+        )
+
+
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('reader')
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.user, name=f'Рецепт {number}', text='Текст',
+                cooking_time=5, image='recipe.png'
+            )
+            for number in range(2)
+        ]
+
+    def get_score(self, recipe):
+        return TrendingScore.objects.get(recipe=recipe).score
+
+    def test_new_recipe_has_no_score(self):
+        self.assertEqual(self.get_score(self.recipes[0]), NO_TRENDING_SCORE)
+
+    def test_bump_adds_weights_in_log_space(self):
+        when = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        bump(self.recipes[0].pk, 1.0, when)
+        bump(self.recipes[0].pk, 2.0, when)
+        self.assertAlmostEqual(
+            self.get_score(self.recipes[0]),
+            math.log(3.0) + event_score(1.0, when)
+        )
+
+    def test_far_future_does_not_overflow(self):
+        when = datetime(2100, 1, 1, tzinfo=timezone.utc)
+        bump(self.recipes[0].pk, 1.0, when)
+        bump(self.recipes[1].pk, 1.0, when)
+        bump(self.recipes[1].pk, 1.0, when)
+        self.assertTrue(math.isfinite(self.get_score(self.recipes[1])))
+        self.assertGreater(self.get_score(self.recipes[1]),
+                           self.get_score(self.recipes[0]))
+
+    def test_rebuild_matches_bumps(self):
+        Favourites.objects.create(user=self.user,
+                                  favorite_recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[0])
+        bumped = self.get_score(self.recipes[0])
+        rebuild()
+        self.assertAlmostEqual(self.get_score(self.recipes[0]), bumped)
+        self.assertEqual(self.get_score(self.recipes[1]), NO_TRENDING_SCORE)
+
+    def test_log_add(self):
+        self.assertAlmostEqual(log_add(math.log(2), math.log(3)),
+                               math.log(5))
+        self.assertEqual(log_add(NO_TRENDING_SCORE, 1.5), 1.5)
+
+
+class ChangesTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('recipes.changes.SYNC_SETTLE_SECONDS', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = create_user('reader')
+
+    def log(self, kind, ids, user_id=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            log(kind, ids, user_id)
+
+    def last(self):
+        return Change.objects.order_by('pk').last().pk
+
+    def test_collapses_and_orders_by_last_change(self):
+        self.log(RECIPE, [1, 2, 3])
+        since = self.last()
+        self.log(RECIPE, [1, 2])
+        self.log(RECIPE, [1])
+        self.assertEqual(changes_since(RECIPE, 0), ([3, 2, 1], self.last(),
+                                                    False))
+        self.assertEqual(changes_since(RECIPE, since)[0], [2, 1])
+        self.assertEqual(changes_since(RECIPE, self.last())[0], [])
+        self.assertEqual(changes_since(TAG, 0)[0], [])
+
+    def test_pages(self):
+        self.log(RECIPE, [1, 2, 3])
+        ids, last, has_more = changes_since(RECIPE, 0, limit=2)
+        self.assertEqual((ids, has_more), ([1, 2], True))
+        self.assertEqual(changes_since(RECIPE, last, limit=2)[::2],
+                         ([3], False))
+
+    def test_settle_window(self):
+        with mock.patch('recipes.changes.SYNC_SETTLE_SECONDS', 2):
+            self.log(RECIPE, [1])
+            self.assertEqual(changes_since(RECIPE, 0), ([], 0, False))
+            Change.objects.update(
+                created=F('created') - timedelta(seconds=3)
+            )
+            self.assertEqual(changes_since(RECIPE, 0)[0], [1])
+
+    def test_user_changes_are_personal(self):
+        other = create_user('other')
+        self.log(FAVORITE, [1], self.user.pk)
+        self.log(SHOPPING_CART, [2], other.pk)
+        self.assertEqual(changes_since(RECIPE, 0)[0], [])
+        self.assertEqual(changes_since(RECIPE, 0, user_id=self.user.pk)[0],
+                         [1])
+        self.assertEqual(changes_since(RECIPE, 0, user_id=other.pk)[0], [2])
+        self.assertEqual(changes_since(TAG, 0, user_id=self.user.pk)[0], [])
+
+    def test_toggles_do_not_log_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=create_user('author'), name='Рецепт', text='Текст',
+                cooking_time=5, image='recipe.png'
+            )
+        since = self.last()
+        with self.captureOnCommitCallbacks(execute=True):
+            Favourites.objects.create(user=self.user, favorite_recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.assertEqual(changes_since(RECIPE, since)[0], [])
+        self.assertEqual(
+            changes_since(RECIPE, since, user_id=self.user.pk)[0],
+            [recipe.pk]
+        )
+        self.assertEqual(set(Change.objects.filter(pk__gt=since).values_list(
+            'kind', 'user_id'
+        )), {(FAVORITE, self.user.pk), (SHOPPING_CART, self.user.pk)})
+
+    def test_compact_keeps_latest_per_object_and_user(self):
+        other = create_user('other')
+        self.log(RECIPE, [1, 2])
+        since = self.last()
+        self.log(RECIPE, [1])
+        self.log(FAVORITE, [2], self.user.pk)
+        self.log(FAVORITE, [2], other.pk)
+        self.log(FAVORITE, [2], self.user.pk)
+        before = {
+            user_id: changes_since(RECIPE, since, user_id=user_id)
+            for user_id in (None, self.user.pk, other.pk)
+        }
+        self.assertEqual(compact(), 2)
+        self.assertEqual(compact(), 0)
+        self.assertEqual(sorted(Change.objects.values_list(
+            'kind', 'object_id', 'user_id'
+        )), [
+            (FAVORITE, 2, self.user.pk), (FAVORITE, 2, other.pk),
+            (RECIPE, 1, None), (RECIPE, 2, None),
+        ])
+        for user_id, changes in before.items():
+            with self.subTest(user_id=user_id):
+                self.assertEqual(
+                    changes_since(RECIPE, since, user_id=user_id), changes
+                )
+
+    def test_decode_token(self):
+        self.assertEqual(decode_token(''), 0)
+        self.assertEqual(decode_token(encode_token(42)), 42)
+        token = encode_token(42)
+        with self.assertRaises(signing.BadSignature):
+            decode_token(token[:-1] + ('A' if token[-1] != 'A' else 'B'))
+        with self.assertRaises(signing.BadSignature):
+            decode_token(signing.dumps(42, salt='other'))
+        with mock.patch('recipes.changes.SYNC_TOKEN_MAX_AGE', -1):
+            with self.assertRaises(signing.SignatureExpired):
+                decode_token(token)
+
+
+class SimilarityTests(TestCase):
+
+    def setUp(self):
+        author = create_user('author')
+        ingredients = {
+            name: Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in 'abcde'
+        }
+        self.recipes = []
+        for number, names in enumerate(('abc', 'abc', 'abd', 'a', 'e')):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=5, image='recipe.png'
+            )
+            for name in names:
+                IngredientRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredients[name], amount=1
+                )
+            self.recipes.append(recipe.pk)
+
+    def get_neighbours(self, recipe_id):
+        return [
+            (similar_id, round(score, 6))
+            for similar_id, score in SimilarRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).order_by('-score', 'similar_id').values_list(
+                'similar_id', 'score'
+            )
+        ]
+
+    def test_similarity(self):
+        self.assertEqual(similarity(0, 3, 3), 0.0)
+        self.assertEqual(similarity(2, 3, 3, 'jaccard'), 0.5)
+        self.assertAlmostEqual(similarity(2, 3, 3, 'cosine'), 2 / 3)
+        self.assertAlmostEqual(similarity(1, 1, 4, 'cosine'), 0.5)
+
+    def test_top_neighbours_breaks_ties_by_id(self):
+        self.assertEqual(
+            top_neighbours({5: 0.5, 3: 0.5, 4: 1.0, 2: 0.1}, limit=3),
+            [(4, 1.0), (3, 0.5), (5, 0.5)]
+        )
+
+    def test_update_ranks_neighbours(self):
+        first, second, third, fourth, fifth = self.recipes
+        update_similar_recipes(first)
+        self.assertEqual(self.get_neighbours(first), [
+            (second, 1.0), (third, 0.5), (fourth, round(1 / 3, 6))
+        ])
+        self.assertEqual(self.get_neighbours(third), [(first, 0.5)])
+        self.assertEqual(self.get_neighbours(fifth), [])
+
+    def test_command_rebuild(self):
+        first, second, third, fourth, fifth = self.recipes
+        SimilarRecipe.objects.create(recipe_id=fifth, similar_id=first,
+                                     score=1.0)
+        call_command('similar_recipes', stdout=StringIO())
+        self.assertEqual(self.get_neighbours(first), [
+            (second, 1.0), (third, 0.5), (fourth, round(1 / 3, 6))
+        ])
+        self.assertEqual(self.get_neighbours(fourth), [
+            (first, round(1 / 3, 6)), (second, round(1 / 3, 6)),
+            (third, round(1 / 3, 6)),
+        ])
+        self.assertEqual(self.get_neighbours(fifth), [])
+        rebuilt = self.get_neighbours(first)
+        update_similar_recipes(first)
+        self.assertEqual(self.get_neighbours(first), rebuilt)
+
+    def test_command_options(self):
+        first, second, third, *_ = self.recipes
+        call_command('similar_recipes', '--metric', 'cosine', '--limit', '1',
+                     stdout=StringIO())
+        self.assertEqual(self.get_neighbours(first), [(second, 1.0)])
+        self.assertEqual(self.get_neighbours(third),
+                         [(first, round(2 / 3, 6))])
+
+    def test_command_lsh_finds_identical_recipes(self):
+        first, second, *_ = self.recipes
+        output = StringIO()
+        call_command('similar_recipes', '--lsh', stdout=output)
+        self.assertIn('LSH', output.getvalue())
+        self.assertEqual(self.get_neighbours(first)[0], (second, 1.0))
+
+    def test_str(self):
+        first, second, *_ = self.recipes
+        similar = SimilarRecipe.objects.create(
+            recipe_id=first, similar_id=second, score=1.0
+        )
+        self.assertEqual(str(similar), 'Рецепт 1 похож на Рецепт 0')
+        self.assertEqual(str(TrendingScore.objects.get(recipe_id=first)),
+                         f'Рецепт 0: {NO_TRENDING_SCORE}')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'секционирование PostgreSQL')
+class PartitioningTests(TestCase):
+
+    def setUp(self):
+        self.tables = [model._meta.db_table
+                       for model in (Favourites, ShoppingCart)]
+        self.user = create_user('reader')
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.user, name=f'Рецепт {number}', text='Текст',
+                cooking_time=5, image='recipe.png'
+            )
+            for number in range(3)
+        ]
+        for recipe in self.recipes[:2]:
+            Favourites.objects.create(user=self.user, favorite_recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def get_schema(self):
+        with connection.cursor() as cursor:
+            return {
+                table: (
+                    is_partitioned(cursor, table),
+                    get_constraints(cursor, table),
+                    get_indexes(cursor, table),
+                )
+                for table in self.tables
+            }
+
+    def assert_valid(self):
+        with connection.cursor() as cursor:
+            for table in self.tables:
+                relations = [table, *get_partitions(cursor, table)]
+                cursor.execute(
+                    'SELECT count(*) FROM pg_index '
+                    'WHERE indrelid = ANY(%s::regclass[]) '
+                    'AND NOT (indisvalid AND indisready)', [relations]
+                )
+                self.assertEqual(cursor.fetchone()[0], 0, table)
+                cursor.execute(
+                    'SELECT count(*) FROM pg_constraint '
+                    'WHERE conrelid = ANY(%s::regclass[]) '
+                    'AND NOT convalidated', [relations]
+                )
+                self.assertEqual(cursor.fetchone()[0], 0, table)
+
+    def assert_data(self):
+        self.assertEqual(Favourites.objects.count(), 2)
+        self.assertEqual(ShoppingCart.objects.count(), 2)
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            Favourites.objects.create(user=self.user,
+                                      favorite_recipe=self.recipes[0])
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            ShoppingCart.objects.create(user=self.user,
+                                        recipe=self.recipes[0])
+        # Последовательности id продолжают работать.
+        favourite = Favourites.objects.create(
+            user=self.user, favorite_recipe=self.recipes[2]
+        )
+        self.assertGreater(favourite.pk, 2)
+        favourite.delete()
+
+    def test_partition_and_revert(self):
+        before = self.get_schema()
+        call_command('partition_user_tables', '--partitions', '4',
+                     '--samples', '1', stdout=StringIO())
+        with connection.cursor() as cursor:
+            for table in self.tables:
+                self.assertTrue(is_partitioned(cursor, table))
+                self.assertEqual(len(get_partitions(cursor, table)), 4)
+        partitioned = self.get_schema()
+        for table in self.tables:
+            self.assertEqual(
+                [name for name, *_ in partitioned[table][1]],
+                [name for name, *_ in before[table][1]]
+            )
+            self.assertEqual(
+                [name for name, _ in partitioned[table][2]],
+                [name for name, _ in before[table][2]]
+            )
+        self.assert_valid()
+        self.assert_data()
+        migration = import_module(
+            'recipes.migrations.0018_partition_user_tables'
+        )
+        migration.unpartition_user_tables(
+            apps, mock.Mock(connection=connection)
+        )
+        self.assertEqual(self.get_schema(), before)
+        self.assert_valid()
+        self.assert_data()
+
+
+class DedupTests(TestCase):
+
+    def setUp(self):
+        author = create_user('author')
+        self.salt = Ingredient.objects.create(name='Соль',
+                                              measurement_unit='г')
+        self.duplicates = [
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('  соль', 'г'), ('СОЛЬ', ' Г'))
+        ]
+        self.recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=5, image='recipe.png'
+            )
+            for number in range(3)
+        ]
+
+    def add(self, recipe, ingredient, amount):
+        IngredientRecipe.objects.create(recipe=recipe, ingredient=ingredient,
+                                        amount=amount)
+
+    def get_rows(self):
+        return sorted(IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id', 'amount'
+        ))
+
+    def merge(self):
+        return merge_duplicates(Ingredient, IngredientRecipe,
+                                find_duplicates(Ingredient))
+
+    def test_find_duplicates(self):
+        self.assertEqual(find_duplicates(Ingredient), {
+            self.salt.pk: [ingredient.pk for ingredient in self.duplicates]
+        })
+        self.assertEqual(find_duplicates(Ingredient, exact=True), {})
+
+    def test_folds_duplicates(self):
+        first, second, third = self.recipes
+        self.add(first, self.salt, 5)
+        self.add(first, self.duplicates[0], 7)
+        self.add(first, self.duplicates[1], 1)
+        self.add(second, self.duplicates[1], 3)
+        self.add(third, self.salt, 2)
+        self.assertEqual(self.merge(), {first.pk, second.pk})
+        self.assertEqual(self.get_rows(), [
+            (first.pk, self.salt.pk, 13),
+            (second.pk, self.salt.pk, 3),
+            (third.pk, self.salt.pk, 2),
+        ])
+        self.assertEqual(list(Ingredient.objects.all()), [self.salt])
+
+    def test_amount_is_capped(self):
+        self.add(self.recipes[0], self.salt, MAX_AMOUNT - 1)
+        self.add(self.recipes[0], self.duplicates[0], MAX_AMOUNT)
+        self.merge()
+        self.assertEqual(self.get_rows(),
+                         [(self.recipes[0].pk, self.salt.pk, MAX_AMOUNT)])
+
+    def test_one_row_per_recipe_and_ingredient(self):
+        # Строки одного ингредиента в рецепте, в том числе повторы дубля,
+        # сливаются до переноса, иначе перенос дал бы пары-повторы.
+        for recipe in self.recipes:
+            self.add(recipe, self.duplicates[0], 1)
+            self.add(recipe, self.duplicates[0], 2)
+            self.add(recipe, self.duplicates[1], 4)
+        with mock.patch('recipes.dedup.MERGE_BATCH_SIZE', 1):
+            self.merge()
+        self.assertEqual(self.get_rows(), [
+            (recipe.pk, self.salt.pk, 7) for recipe in self.recipes
+        ])
+
+    def test_migration_merges_like_dedup(self):
+        migration = import_module(
+            'recipes.migrations.0013_merge_duplicate_ingredients'
+        )
+        first, second, _ = self.recipes
+        self.add(first, self.salt, MAX_AMOUNT)
+        self.add(first, self.duplicates[0], 7)
+        self.add(second, self.duplicates[1], 3)
+        self.add(second, self.duplicates[1], 4)
+        # Точных дублей не даёт ограничение unique_ingredient, поэтому
+        # группы подставляются, а проверяется слияние.
+        with mock.patch.object(migration, 'find_exact_duplicates',
+                               return_value=find_duplicates(Ingredient)):
+            migration.merge_exact_duplicates(apps, None)
+        self.assertEqual(self.get_rows(), [
+            (first.pk, self.salt.pk, MAX_AMOUNT),
+            (second.pk, self.salt.pk, 7),
+        ])
+        self.assertEqual(list(Ingredient.objects.all()), [self.salt])
+
+
+@mock_s3
+class DirectUploadTests(TestCase):
+
+    def setUp(self):
+        self.storage = S3ContentAddressedStorage(
+            bucket_name='foodgram', access_key='test', secret_key='test',
+            region_name='us-east-1', endpoint_url=None, custom_domain=None
+        )
+        self.storage.bucket.create()
+
+    def put(self, name, body):
+        self.storage.bucket.put_object(Key=name, Body=body,
+                                       ContentType='image/png')
+
+    def exists(self, name):
+        return self.storage.exists(name)
+
+    def test_create_upload(self):
+        upload = self.storage.create_upload(1, 'image/png')
+        self.assertTrue(upload['upload'].startswith(f'{S3_UPLOAD_PREFIX}1/'))
+        self.assertEqual(upload['fields']['key'], upload['upload'])
+        self.assertEqual(upload['fields']['Content-Type'], 'image/png')
+        self.assertIn('policy', upload['fields'])
+
+    def test_finalize_upload(self):
+        upload = self.storage.create_upload(1, 'image/png')['upload']
+        self.put(upload, PNG)
+        name = self.storage.finalize_upload(1, upload)
+        self.assertEqual(name, hashed_name([PNG], '.png'))
+        self.assertTrue(self.exists(name))
+        self.assertFalse(self.exists(upload))
+        self.assertEqual(
+            self.storage.bucket.Object(name).get()['Body'].read(), PNG
+        )
+
+    def test_same_name_as_server_side_save(self):
+        saved = self.storage.save('photo.PNG', ContentFile(PNG))
+        upload = self.storage.create_upload(1, 'image/png')['upload']
+        self.put(upload, PNG)
+        self.assertEqual(self.storage.finalize_upload(1, upload), saved)
+        self.assertEqual(
+            [obj.key for obj in self.storage.bucket.objects.all()], [saved]
+        )
+
+    def test_too_large(self):
+        upload = self.storage.create_upload(1, 'image/png')['upload']
+        self.put(upload, PNG)
+        with mock.patch('recipes.s3.RECIPE_IMAGE_MAX_SIZE', len(PNG) - 1):
+            with self.assertRaisesMessage(DirectUploadError, 'большое'):
+                self.storage.finalize_upload(1, upload)
+        self.assertFalse(self.exists(upload))
+
+    def test_not_an_image(self):
+        upload = self.storage.create_upload(1, 'image/png')['upload']
+        self.put(upload, b'<?php echo 1; ?>')
+        with self.assertRaisesMessage(DirectUploadError, 'не является'):
+            self.storage.finalize_upload(1, upload)
+        self.assertFalse(self.exists(upload))
+
+    def test_other_user_prefix(self):
+        upload = self.storage.create_upload(2, 'image/png')['upload']
+        self.put(upload, PNG)
+        for name in (upload, f'{S3_UPLOAD_PREFIX}1/../2/x',
+                     f'{S3_UPLOAD_PREFIX}1/missing'):
+            with self.subTest(name=name):
+                with self.assertRaisesMessage(DirectUploadError,
+                                              'не найдена'):
+                    self.storage.finalize_upload(1, name)
+        self.assertTrue(self.exists(upload))
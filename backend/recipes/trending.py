@@ -0,0 +1,88 @@
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from foodgram.settings import (TRENDING_EPOCH, TRENDING_FAVORITE_WEIGHT,
+                               TRENDING_HALF_LIFE_HOURS,
+                               TRENDING_SHOPPING_CART_WEIGHT)
+
+from .models import (NO_TRENDING_SCORE, Favourites, Recipe, ShoppingCart,
+                     TrendingScore)
+
+DECAY_RATE = math.log(2) / (TRENDING_HALF_LIFE_HOURS * 3600)
+# exp(-700) ещё представим в double, а 1 + exp(-700) == 1.
+MIN_EXPONENT = -700.0
+
+
+def event_score(weight, when=None):
+    """Логарифм веса события в шкале эпохи (forward decay).
+
+    Вместо того чтобы уменьшать старые очки, новые события получают
+    вес w·exp(λ·(t - эпоха)). Порядок по сумме весов от этого не
+    меняется, а прежние строки не нужно переписывать. Хранится логарифм
+    суммы: сами веса растут экспоненциально и через несколько лет
+    переполнили бы float, а логарифм растёт линейно.
+    """
+    when = when or timezone.now()
+    return math.log(weight) + DECAY_RATE * (
+        when - TRENDING_EPOCH
+    ).total_seconds()
+
+
+def log_add(first, second):
+    """log(exp(first) + exp(second)) без переполнения."""
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def bump(recipe_id, weight, when=None):
+    value = Value(event_score(weight, when), output_field=FloatField())
+    # То же, что log_add, одним UPDATE. PostgreSQL считает ошибкой
+    # исчезновение порядка в EXP, поэтому показатель ограничен снизу.
+    updated = TrendingScore.objects.filter(recipe_id=recipe_id).update(
+        score=Greatest(F('score'), value) + Ln(
+            Value(1.0, output_field=FloatField())
+            + Exp(Greatest(
+                -Abs(F('score') - value),
+                Value(MIN_EXPONENT, output_field=FloatField())
+            ))
+        )
+    )
+    if not updated:
+        TrendingScore.objects.get_or_create(
+            recipe_id=recipe_id, defaults={'score': value.value}
+        )
+
+
+def rebuild():
+    """Полный пересчёт очков по Favourites и ShoppingCart."""
+    scores = defaultdict(lambda: NO_TRENDING_SCORE)
+    sources = (
+        (Favourites.objects.values_list('favorite_recipe_id', 'created'),
+         TRENDING_FAVORITE_WEIGHT),
+        (ShoppingCart.objects.values_list('recipe_id', 'created'),
+         TRENDING_SHOPPING_CART_WEIGHT),
+    )
+    for queryset, weight in sources:
+        for recipe_id, created in queryset.order_by().iterator():
+            scores[recipe_id] = log_add(
+                scores[recipe_id], event_score(weight, created)
+            )
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            (
+                TrendingScore(recipe_id=recipe_id,
+                              score=scores.get(recipe_id,
+                                               NO_TRENDING_SCORE))
+                for recipe_id in Recipe.objects.values_list(
+                    'pk', flat=True
+                ).order_by().iterator()
+            ),
+            batch_size=1000,
+        )
+    return len(scores)
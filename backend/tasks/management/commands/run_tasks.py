@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from foodgram.settings import (TASKS_POLL_INTERVAL, TASKS_STALE_TIMEOUT,
+                               TASKS_THREADS)
+from tasks.queue import due_tasks, requeue_stale, run_task
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в базе данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=TASKS_THREADS)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи, готовые к запуску, и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        # Новая задача берётся, как только освободился поток: долгая
+        # задача не держит остальные до конца всей порции.
+        threads = options['threads']
+        running = {}
+        done = 0
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            while True:
+                ids = []
+                if len(running) < threads:
+                    requeue_stale(TASKS_STALE_TIMEOUT)
+                    ids = due_tasks(threads - len(running),
+                                    exclude=running.values())
+                for pk in ids:
+                    running[executor.submit(run_task, pk)] = pk
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(TASKS_POLL_INTERVAL)
+                    continue
+                finished, _ = wait(
+                    running, timeout=TASKS_POLL_INTERVAL,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in finished:
+                    del running[future]
+                    done += 1
+        self.stdout.write(f'Обработано задач: {done}.')
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.15 on 2026-10-19 11:01
+
+from django.db import migrations, models
+
+
+def delete_done_tasks(apps, schema_editor):
+    apps.get_model('tasks', 'Task').objects.filter(status='done').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_done_tasks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='task',
+            name='status',
+            field=models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,130 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import wraps
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from foodgram.settings import (TASKS_MAX_ATTEMPTS, TASKS_RETRY_DELAY,
+                               TASKS_RUN_IN_PROCESS, TASKS_THREADS)
+
+from .models import FAILED, PENDING, RUNNING, Task
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=TASKS_THREADS, thread_name_prefix='tasks'
+            )
+        return _executor
+
+
+def task(func=None, *, max_attempts=TASKS_MAX_ATTEMPTS):
+    """Делает функцию фоновой задачей: func.delay(*args, **kwargs).
+
+    Аргументы сохраняются в JSON, поэтому передавать нужно id, а не
+    объекты моделей.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def delay(*args, **kwargs):
+            enqueue(name, args, kwargs, max_attempts)
+
+        func.delay = delay
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(name, args=(), kwargs=None, max_attempts=TASKS_MAX_ATTEMPTS):
+    """Ставит задачу в очередь после коммита текущей транзакции."""
+    def create():
+        created = Task.objects.create(
+            name=name,
+            args=list(args),
+            kwargs=kwargs or {},
+            max_attempts=max_attempts,
+            run_at=timezone.now(),
+        )
+        if TASKS_RUN_IN_PROCESS:
+            get_executor().submit(run_task, created.pk)
+
+    transaction.on_commit(create)
+
+
+def claim(task_id):
+    """Атомарно переводит задачу в RUNNING; False, если её уже забрали."""
+    return bool(Task.objects.filter(
+        pk=task_id, status=PENDING, run_at__lte=timezone.now()
+    ).update(
+        status=RUNNING, attempts=F('attempts') + 1,
+        started_at=timezone.now()
+    ))
+
+
+def run_task(task_id):
+    try:
+        if not claim(task_id):
+            return
+        current = Task.objects.get(pk=task_id)
+        try:
+            import_string(current.name)(*current.args, **current.kwargs)
+        except Exception:
+            logger.exception('Задача %s завершилась ошибкой', current)
+            if current.attempts >= current.max_attempts:
+                status, run_at = FAILED, current.run_at
+            else:
+                status = PENDING
+                run_at = timezone.now() + timedelta(
+                    seconds=TASKS_RETRY_DELAY * 2 ** (current.attempts - 1)
+                )
+            Task.objects.filter(pk=task_id).update(
+                status=status, run_at=run_at,
+                last_error=traceback.format_exc()
+            )
+        else:
+            # Выполненные задачи не нужны, таблица хранит только очередь
+            # и ошибки.
+            Task.objects.filter(pk=task_id).delete()
+    finally:
+        connections.close_all()
+
+
+def requeue_stale(timeout):
+    """Возвращает в очередь задачи, зависшие после падения процесса.
+
+    Задачи, исчерпавшие попытки, помечаются FAILED: иначе задача, которая
+    роняет процесс, перезапускалась бы бесконечно.
+    """
+    stale = Task.objects.filter(
+        status=RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=timeout)
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=FAILED,
+        last_error='Процесс завершился, не закончив задачу.'
+    )
+    return stale.update(status=PENDING)
+
+
+def due_tasks(limit, exclude=()):
+    """id готовых к запуску задач, кроме уже отданных потокам exclude."""
+    return list(Task.objects.filter(
+        status=PENDING, run_at__lte=timezone.now()
+    ).exclude(pk__in=list(exclude)).values_list('pk', flat=True)[:limit])
@@ -0,0 +1,99 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .models import FAILED, PENDING, RUNNING, Task
+from .queue import requeue_stale, run_task
+
+
+def succeed():
+    pass
+
+
+def fail():
+    raise ValueError('Ошибка задачи')
+
+
+def create_task(name, **fields):
+    return Task.objects.create(
+        name=f'tasks.tests.{name}', max_attempts=2,
+        run_at=timezone.now(), **fields
+    )
+
+
+@mock.patch('tasks.queue.connections.close_all', mock.Mock())
+class QueueTests(TestCase):
+
+    def test_done_task_is_deleted(self):
+        task = create_task('succeed')
+        run_task(task.pk)
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+
+    def test_failed_task_is_kept(self):
+        task = create_task('fail', attempts=1)
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            run_task(task.pk)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (FAILED, 2))
+        self.assertIn('Ошибка задачи', task.last_error)
+
+    def test_requeue_stale(self):
+        started_at = timezone.now() - timedelta(seconds=120)
+        retry = create_task('succeed', status=RUNNING, attempts=1,
+                            started_at=started_at)
+        exhausted = create_task('succeed', status=RUNNING, attempts=2,
+                                started_at=started_at)
+        running = create_task('succeed', status=RUNNING, attempts=2,
+                              started_at=timezone.now())
+        self.assertEqual(requeue_stale(60), 1)
+        for task, status in (
+            (retry, PENDING), (exhausted, FAILED), (running, RUNNING)
+        ):
+            task.refresh_from_db()
+            self.assertEqual(task.status, status)
+
+
+class RunTasksTests(SimpleTestCase):
+    """Планирование run_tasks без базы: очередь и задачи подменены."""
+
+    def setUp(self):
+        self.pending = [1, 2, 3, 4, 5]
+        self.finished = []
+        self.lock = threading.Lock()
+        self.others_done = threading.Event()
+        for name, replacement in (
+            ('due_tasks', self.due_tasks),
+            ('run_task', self.run_task),
+            ('requeue_stale', mock.Mock()),
+        ):
+            patcher = mock.patch(
+                f'tasks.management.commands.run_tasks.{name}', replacement
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def due_tasks(self, limit, exclude=()):
+        exclude = set(exclude)
+        with self.lock:
+            return [pk for pk in self.pending if pk not in exclude][:limit]
+
+    def run_task(self, pk):
+        if pk == 1:
+            # Долгая задача ждёт, пока второй поток не выполнит остальные.
+            self.assertTrue(self.others_done.wait(5))
+        with self.lock:
+            self.pending.remove(pk)
+            self.finished.append(pk)
+            if len(self.finished) == 4:
+                self.others_done.set()
+
+    def test_long_task_does_not_block_queue(self):
+        output = StringIO()
+        call_command('run_tasks', '--once', '--threads', '2', stdout=output)
+        self.assertEqual(self.finished, [2, 3, 4, 5, 1])
+        self.assertIn('Обработано задач: 5.', output.getvalue())
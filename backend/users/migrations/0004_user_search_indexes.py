@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# Поиск пользователей по началу логина, имени или фамилии
+# (username__istartswith и т.п.) в PostgreSQL превращается в
+# UPPER(поле) LIKE 'ПРЕФИКС%', поэтому индексы функциональные и с
+# text_pattern_ops, как и для названий ингредиентов.
+SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX user_{field}_upper_idx ON users_user '
+            f'(UPPER({field}::text) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS user_{field}_upper_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_index_audit'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -69,6 +69,7 @@ class Follow(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='follower',
         verbose_name='Подписчик'
     )
@@ -77,6 +78,7 @@ class Follow(models.Model):
         blank=True,
         null=True,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='following',
         verbose_name='Автор'
     )
@@ -86,6 +88,12 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=('user', 'author'),
                                     name='unique follow'),
         ]
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx',
+            ),
+        )
         ordering = ('user__username', 'author__username')
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'